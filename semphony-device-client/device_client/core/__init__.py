@@ -3,7 +3,7 @@ Core infrastructure for hardware abstraction.
 """
 
 from .hardware_controller import HardwareController
-from .command_executor import CommandExecutor
+from .command_executor import CommandExecutor, CommandOutcome
 from .screenshot_manager import ScreenshotManager
 
-__all__ = ["HardwareController", "CommandExecutor", "ScreenshotManager"]
+__all__ = ["HardwareController", "CommandExecutor", "CommandOutcome", "ScreenshotManager"]
@@ -2,31 +2,266 @@
 Command execution and routing.
 
 Routes commands to appropriate handlers (screenshot manager, hardware controller).
+Commands can also be submitted to worker threads so that callers running on an
+asyncio event loop (the Reverb client) are never blocked by GUI automation,
+screenshot uploads or SDK round trips.
+
+Submitted commands are scheduled on two lanes:
+- "gui": a single worker that runs mouse/keyboard commands strictly in order.
+- "read": a small pool for read-only/telemetry commands (metrics, state, screenshots)
+  that must not wait behind slow GUI sequences.
+
+Each lane has a bounded queue; when it is full the command is rejected immediately
+with a "busy" outcome instead of piling up behind a hidden backlog. Emergency
+commands (e.g. clicking `stage_control_stop`, or `stage_stop`) jump to the front of the GUI lane
+and are never rejected.
 """
 
 from __future__ import annotations
 
+import heapq
+import itertools
 import logging
-from typing import Any, Dict, Optional, Tuple
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from .hardware_controller import HardwareController
 from .screenshot_manager import ScreenshotManager
 
 logger = logging.getLogger(__name__)
 
+LANE_GUI = "gui"
+LANE_READ = "read"
+
+PRIORITY_EMERGENCY = 0
+PRIORITY_NORMAL = 10
+
+SCREENSHOT_STREAM_START_COMMANDS = ("screenshot_stream_start", "screenshotStreamStart", "screenshot-stream-start")
+SCREENSHOT_STREAM_STOP_COMMANDS = ("screenshot_stream_stop", "screenshotStreamStop", "screenshot-stream-stop")
+METRICS_HISTORY_COMMANDS = ("get_metrics_history", "getMetricsHistory", "get-metrics-history")
+
+# Upper bound for history buckets per response.
+MAX_HISTORY_BUCKETS = 1000
+
+# Commands that never touch the mouse/keyboard (reads, telemetry, screen capture).
+READ_ONLY_COMMANDS = frozenset(
+    {
+        "get_metrics",
+        "getMetrics",
+        "get-metrics",
+        *METRICS_HISTORY_COMMANDS,
+        "get_state",
+        "getState",
+        "get-state",
+        "screenshot",
+        "getScreenshot",
+        "get_screenshot",
+        *SCREENSHOT_STREAM_START_COMMANDS,
+        *SCREENSHOT_STREAM_STOP_COMMANDS,
+    }
+)
+
+CLICK_COMMANDS = frozenset({"clickButton", "click_button"})
+
+# Buttons whose click must pre-empt any queued GUI work.
+EMERGENCY_BUTTONS = frozenset({"stage_control_stop"})
+
+# Commands that pre-empt queued GUI work regardless of payload.
+EMERGENCY_COMMANDS = frozenset({"stage_stop", "stageStop", "StgStop"})
+
+
+@dataclass(frozen=True)
+class CommandOutcome:
+    """Result of a command run on a worker, with timing information."""
+
+    ok: bool
+    message: str
+    result: Optional[Dict[str, Any]]
+    queue_ms: float
+    run_ms: float
+    lane: str = ""
+
+    def timing(self) -> Dict[str, Any]:
+        """Return lane, queue wait and run time as a JSON-friendly dict."""
+        return {"lane": self.lane, "queue_ms": self.queue_ms, "run_ms": self.run_ms}
+
+
+class _CommandLane:
+    """Bounded priority queue served by a fixed set of worker threads."""
+
+    def __init__(self, name: str, *, workers: int, max_depth: int):
+        self.name = name
+        self.max_depth = max(1, int(max_depth))
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[int, int, Future, Callable[[], CommandOutcome]]] = []
+        self._seq = itertools.count()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"command-{name}-{i}", daemon=True)
+            for i in range(max(1, int(workers)))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def try_submit(self, fn: Callable[[], CommandOutcome], *, priority: int) -> Optional["Future[CommandOutcome]"]:
+        """Queue `fn`; returns None if the lane is full (emergencies are always admitted)."""
+        fut: "Future[CommandOutcome]" = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"Command lane '{self.name}' is shut down")
+            if priority > PRIORITY_EMERGENCY and len(self._heap) >= self.max_depth:
+                return None
+            heapq.heappush(self._heap, (priority, next(self._seq), fut, fn))
+            self._cond.notify()
+        return fut
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._closed = True
+            pending = [item[2] for item in self._heap]
+            self._heap.clear()
+            self._cond.notify_all()
+        for fut in pending:
+            fut.cancel()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                _prio, _seq, fut, fn = heapq.heappop(self._heap)
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(fn())
+            except BaseException as e:  # pragma: no cover - execute() already traps errors
+                fut.set_exception(e)
+
 
 class CommandExecutor:
     """Executes commands by delegating to appropriate handlers."""
 
-    def __init__(self, hardware_controller: HardwareController):
+    def __init__(
+        self,
+        hardware_controller: HardwareController,
+        *,
+        gui_queue_max: int = 8,
+        read_queue_max: int = 16,
+        read_workers: int = 2,
+    ):
         """
         Initialize command executor.
 
         Args:
             hardware_controller: Hardware controller instance
+            gui_queue_max: Max queued (not yet running) commands on the GUI lane
+            read_queue_max: Max queued (not yet running) commands on the read lane
+            read_workers: Number of worker threads serving the read lane
         """
         self.hardware = hardware_controller
         self.screenshot_manager = ScreenshotManager(hardware_controller)
+        self._lanes: Dict[str, _CommandLane] = {
+            LANE_GUI: _CommandLane(LANE_GUI, workers=1, max_depth=gui_queue_max),
+            LANE_READ: _CommandLane(LANE_READ, workers=read_workers, max_depth=read_queue_max),
+        }
+
+    @staticmethod
+    def classify(command_name: str, payload: Dict[str, Any]) -> Tuple[str, int]:
+        """
+        Decide which lane and priority a command is scheduled with.
+
+        Returns:
+            Tuple of (lane name, priority) where a lower priority runs first
+        """
+        if command_name in READ_ONLY_COMMANDS:
+            return LANE_READ, PRIORITY_NORMAL
+        if command_name in EMERGENCY_COMMANDS:
+            return LANE_GUI, PRIORITY_EMERGENCY
+        if command_name in CLICK_COMMANDS and str(payload.get("button_name", "")) in EMERGENCY_BUTTONS:
+            return LANE_GUI, PRIORITY_EMERGENCY
+        return LANE_GUI, PRIORITY_NORMAL
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Return the number of queued (not yet running) commands per lane."""
+        return {name: lane.depth() for name, lane in self._lanes.items()}
+
+    def submit(
+        self,
+        command_name: str,
+        payload: Dict[str, Any],
+        screenshot_upload_url: str = "",
+        client_key: str = "",
+        insecure_ssl: bool = False,
+    ) -> "Future[CommandOutcome]":
+        """
+        Schedule a command on its lane.
+
+        Args:
+            command_name: Command identifier
+            payload: Command parameters
+            screenshot_upload_url: URL for screenshot upload (for screenshot command)
+            client_key: Client authentication key (for screenshot upload)
+            insecure_ssl: Whether to skip SSL verification (for screenshot upload)
+
+        Returns:
+            Future resolving to a CommandOutcome (never raises for command errors).
+            If the lane is full the future is already resolved with a "busy" outcome.
+        """
+        lane_name, priority = self.classify(command_name, payload)
+        lane = self._lanes[lane_name]
+        t_submit = time.perf_counter()
+
+        def run() -> CommandOutcome:
+            t_start = time.perf_counter()
+            ok, message, result = self.execute(
+                command_name,
+                payload,
+                screenshot_upload_url=screenshot_upload_url,
+                client_key=client_key,
+                insecure_ssl=insecure_ssl,
+            )
+            t_end = time.perf_counter()
+            return CommandOutcome(
+                ok=bool(ok),
+                message=message,
+                result=result,
+                queue_ms=round((t_start - t_submit) * 1000.0, 2),
+                run_ms=round((t_end - t_start) * 1000.0, 2),
+                lane=lane_name,
+            )
+
+        fut = lane.try_submit(run, priority=priority)
+        if fut is not None:
+            return fut
+
+        logger.warning("Rejecting command %s: %s lane is full (%s queued)", command_name, lane_name, lane.max_depth)
+        busy: "Future[CommandOutcome]" = Future()
+        busy.set_result(
+            CommandOutcome(
+                ok=False,
+                message=f"busy: {lane_name} command queue is full",
+                result={"busy": True, "lane": lane_name, "queue_depth": lane.depth(), "max_depth": lane.max_depth},
+                queue_ms=0.0,
+                run_ms=0.0,
+                lane=lane_name,
+            )
+        )
+        return busy
+
+    def shutdown(self) -> None:
+        """Stop accepting commands, cancel queued ones and release the worker threads."""
+        for lane in self._lanes.values():
+            lane.shutdown()
+        self.screenshot_manager.shutdown()
 
     def execute(
         self,
@@ -52,11 +287,26 @@ class CommandExecutor:
         try:
             # Common commands
             if command_name in ("get_metrics", "getMetrics", "get-metrics"):
-                metrics = self.hardware.get_metrics()
+                max_age_s = payload.get("max_age_s")
+                metrics = self.hardware.get_metrics(
+                    max_age_s=float(max_age_s) if max_age_s is not None else None
+                )
                 if not metrics.get("supported", False):
                     return False, str(metrics.get("message") or "metrics_not_supported"), metrics
                 return True, "ok", metrics
 
+            if command_name in METRICS_HISTORY_COMMANDS:
+                end = float(payload.get("end") or time.time())
+                start = float(payload.get("start") or end - float(payload.get("since_s") or 600.0))
+                buckets = max(1, min(MAX_HISTORY_BUCKETS, int(payload.get("buckets") or 120)))
+                fields = payload.get("fields")
+                history = self.hardware.get_metrics_history(
+                    start, end, buckets=buckets, fields=list(fields) if fields else None
+                )
+                if not history.get("supported", False):
+                    return False, str(history.get("message") or "metrics_history_not_supported"), history
+                return True, "ok", history
+
             if command_name in ("screenshot", "getScreenshot", "get_screenshot"):
                 if not screenshot_upload_url:
                     return False, "screenshot_upload_url not configured", None
@@ -68,6 +318,20 @@ class CommandExecutor:
                 )
                 return True, "ok", result
 
+            if command_name in SCREENSHOT_STREAM_START_COMMANDS:
+                if not screenshot_upload_url:
+                    return False, "screenshot_upload_url not configured", None
+                if not client_key:
+                    return False, "client_key not configured", None
+
+                result = self.screenshot_manager.start_stream(
+                    payload, screenshot_upload_url, client_key, insecure_ssl
+                )
+                return True, "ok", result
+
+            if command_name in SCREENSHOT_STREAM_STOP_COMMANDS:
+                return True, "ok", self.screenshot_manager.stop_stream(payload)
+
             # State management commands
             if command_name in ("get_state", "getState", "get-state"):
                 state = self.hardware.get_current_state()
@@ -0,0 +1,410 @@
+"""
+Acquisition output uploader.
+
+Watches configured acquisition folders (e.g. TESCAN image exports, EDAX
+spectra/maps) and uploads finished files to the control server's
+`POST client/files` endpoint.
+
+- A file counts as finished once its size and mtime have not changed for
+  `settle_s` seconds (instruments write large files incrementally).
+- Files are streamed from disk in fixed-size chunks (see
+  `http_transport.MultipartBody`), so memory use does not grow with file size.
+- Every file's sha256 is recorded in an append-only JSONL journal together with
+  the server's response. A file whose path and sha256 are already journaled as
+  uploaded is never sent again, also across restarts. Failed uploads are retried
+  with backoff until they succeed.
+- The server accepts whole files only, so a file interrupted mid-upload is
+  re-sent from its start; the journal makes the file the unit of resume.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .http_transport import post_multipart
+from .screenshot_manager import _ddev_auth_url_candidates
+
+logger = logging.getLogger(__name__)
+
+# Server-side limit in StoreClientFileRequest.
+DEFAULT_MAX_FILE_BYTES = 100 * 1024 * 1024
+
+# Editor/instrument scratch files that should never be uploaded.
+_IGNORED_PATTERNS = (".*", "~*", "*.tmp", "*.part", "*.lock")
+
+
+def _json_log(event: str, **fields: Any) -> None:
+    payload = {"event": event, **fields}
+    try:
+        logger.info("%s", json.dumps(payload, separators=(",", ":"), sort_keys=True))
+    except Exception:
+        logger.info("event=%s fields=%r", event, fields)
+
+
+def _sha256_file(path: Path, chunk_bytes: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_upload_journal_path() -> Path:
+    """
+    Path of the upload journal.
+
+    Override with env var `ACQUISITION_JOURNAL_PATH`.
+    """
+    raw = (os.getenv("ACQUISITION_JOURNAL_PATH") or "").strip()
+    if raw:
+        return Path(raw).expanduser()
+
+    # Default: <repo>/semphony-device-client/data/upload_journal.jsonl
+    repo_dir = Path(__file__).resolve().parents[2]
+    return repo_dir / "data" / "upload_journal.jsonl"
+
+
+@dataclass(frozen=True)
+class AcquisitionUploadConfig:
+    watch_dirs: Tuple[Path, ...]
+    patterns: Tuple[str, ...] = ("*",)
+    settle_s: float = 5.0
+    poll_s: float = 2.0
+    max_file_bytes: int = DEFAULT_MAX_FILE_BYTES
+    storage_configuration_id: Optional[int] = None
+    upload_existing: bool = False
+    journal_path: Optional[Path] = None
+
+    @staticmethod
+    def from_env() -> "AcquisitionUploadConfig":
+        """
+        Environment variables:
+        - ACQUISITION_WATCH_DIRS (optional): folders to watch, separated by os.pathsep (";" on Windows).
+          Uploading is disabled when empty.
+        - ACQUISITION_WATCH_PATTERNS (optional): ";"-separated glob patterns (default "*")
+        - ACQUISITION_SETTLE_SECONDS (optional): seconds a file must stay unchanged before upload (default 5)
+        - ACQUISITION_POLL_SECONDS (optional): folder scan interval (default 2)
+        - ACQUISITION_MAX_FILE_BYTES (optional): larger files are skipped (default 100 MiB, the server limit)
+        - ACQUISITION_STORAGE_CONFIGURATION_ID (optional): server storage configuration to upload into
+        - ACQUISITION_UPLOAD_EXISTING (optional): set to "1" to also upload files that already exist
+          when the journal is first created
+        - ACQUISITION_JOURNAL_PATH (optional): upload journal location
+        """
+        raw_dirs = (os.getenv("ACQUISITION_WATCH_DIRS") or "").strip()
+        watch_dirs = tuple(Path(d.strip()).expanduser() for d in raw_dirs.split(os.pathsep) if d.strip())
+        raw_patterns = (os.getenv("ACQUISITION_WATCH_PATTERNS") or "*").strip()
+        patterns = tuple(p.strip() for p in raw_patterns.split(";") if p.strip()) or ("*",)
+        storage_id = (os.getenv("ACQUISITION_STORAGE_CONFIGURATION_ID") or "").strip()
+        return AcquisitionUploadConfig(
+            watch_dirs=watch_dirs,
+            patterns=patterns,
+            settle_s=float(os.getenv("ACQUISITION_SETTLE_SECONDS", "5")),
+            poll_s=float(os.getenv("ACQUISITION_POLL_SECONDS", "2")),
+            max_file_bytes=int(os.getenv("ACQUISITION_MAX_FILE_BYTES", str(DEFAULT_MAX_FILE_BYTES))),
+            storage_configuration_id=int(storage_id) if storage_id else None,
+            upload_existing=(
+                os.getenv("ACQUISITION_UPLOAD_EXISTING", "").strip() in {"1", "true", "TRUE", "yes", "YES"}
+            ),
+            journal_path=get_upload_journal_path(),
+        )
+
+
+class UploadJournal:
+    """
+    Append-only JSONL record of upload attempts, keyed by absolute file path.
+
+    Each line is one state change (`uploaded`, `failed`, `skipped`, `preexisting`);
+    the last line for a path wins. Lines are flushed and fsynced before the
+    uploader moves on, so a crash never loses a completed upload. On open, the
+    file is compacted to one line per path, so it does not grow without bound
+    across restarts.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.created = not path.exists()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        lines = 0
+        if not self.created:
+            lines = self._load()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if lines > len(self._entries):
+            self._compact()
+        self._fh = path.open("a", encoding="utf-8")
+
+    def _load(self) -> int:
+        lines = 0
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry["path"]] = entry
+                except Exception:
+                    # A torn last line after a crash; everything before it is intact.
+                    continue
+        return lines
+
+    def _compact(self) -> None:
+        # Written aside and renamed over the journal: a crash leaves either file whole.
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry, separators=(",", ":"), sort_keys=True) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(path)
+
+    def record(self, path: str, state: str, **fields: Any) -> None:
+        entry = {"path": path, "state": state, "at": time.time(), **fields}
+        with self._lock:
+            self._entries[path] = entry
+            self._fh.write(json.dumps(entry, separators=(",", ":"), sort_keys=True) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+
+@dataclass
+class _Candidate:
+    size: int
+    mtime_ns: int
+    stable_since: float
+    retry_at: float = 0.0
+    attempts: int = 0
+
+
+class AcquisitionUploader:
+    """Polls the watch folders on a background thread and uploads finished files."""
+
+    def __init__(
+        self,
+        cfg: AcquisitionUploadConfig,
+        *,
+        upload_url: str,
+        client_key: str,
+        insecure_ssl: bool = False,
+    ):
+        self.cfg = cfg
+        self.upload_url = upload_url
+        self.client_key = client_key
+        self.insecure_ssl = insecure_ssl
+        self.journal = UploadJournal(cfg.journal_path or get_upload_journal_path())
+        self._candidates: Dict[str, _Candidate] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="acquisition-uploader", daemon=True)
+
+    def start(self) -> None:
+        _json_log(
+            "acquisition_uploader_started",
+            watch_dirs=[str(d) for d in self.cfg.watch_dirs],
+            patterns=list(self.cfg.patterns),
+            journal=str(self.journal.path),
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5.0)
+        self.journal.close()
+
+    def _matches(self, name: str) -> bool:
+        if any(fnmatch.fnmatch(name, pattern) for pattern in _IGNORED_PATTERNS):
+            return False
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.cfg.patterns)
+
+    def _scan(self) -> List[Tuple[str, os.stat_result]]:
+        found: List[Tuple[str, os.stat_result]] = []
+        for root in self.cfg.watch_dirs:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                for name in filenames:
+                    if not self._matches(name):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        found.append((os.path.abspath(path), os.stat(path)))
+                    except OSError:
+                        continue  # removed between listing and stat
+        return found
+
+    def _is_done(self, path: str, st: os.stat_result) -> bool:
+        entry = self.journal.get(path)
+        if entry is None:
+            return False
+        if entry["state"] in {"uploaded", "skipped", "preexisting"}:
+            # Only the same contents count as done; a rewritten file is uploaded again.
+            return entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns
+        return False
+
+    def _baseline_existing(self) -> None:
+        """On the very first run, don't upload whatever history already sits in the folders."""
+        if not self.journal.created or self.cfg.upload_existing:
+            return
+        count = 0
+        for path, st in self._scan():
+            self.journal.record(path, "preexisting", size=st.st_size, mtime_ns=st.st_mtime_ns)
+            count += 1
+        _json_log("acquisition_baseline_recorded", files=count)
+
+    def _run(self) -> None:
+        try:
+            self._baseline_existing()
+        except Exception:
+            logger.exception("Failed to record existing acquisition files")
+        while not self._stop.is_set():
+            try:
+                self._poll_once()
+            except Exception:
+                logger.exception("Acquisition folder scan failed")
+            self._stop.wait(self.cfg.poll_s)
+
+    def _poll_once(self) -> None:
+        now = time.monotonic()
+        seen = set()
+        for path, st in self._scan():
+            seen.add(path)
+            if self._is_done(path, st):
+                continue
+            cand = self._candidates.get(path)
+            if cand is None or cand.size != st.st_size or cand.mtime_ns != st.st_mtime_ns:
+                # New or still being written: restart the settle timer.
+                self._candidates[path] = _Candidate(
+                    size=st.st_size,
+                    mtime_ns=st.st_mtime_ns,
+                    stable_since=now,
+                    retry_at=cand.retry_at if cand else 0.0,
+                    attempts=cand.attempts if cand else 0,
+                )
+                continue
+            if now - cand.stable_since < self.cfg.settle_s or now < cand.retry_at:
+                continue
+            if self._stop.is_set():
+                return
+            self._upload(path, cand)
+
+        for path in list(self._candidates):
+            if path not in seen:
+                self._candidates.pop(path, None)
+
+    def _upload(self, path: str, cand: _Candidate) -> None:
+        if cand.size > self.cfg.max_file_bytes:
+            self.journal.record(path, "skipped", size=cand.size, mtime_ns=cand.mtime_ns, reason="too_large")
+            _json_log("acquisition_upload_skipped", path=path, bytes=cand.size, reason="too_large")
+            self._candidates.pop(path, None)
+            return
+
+        t0 = time.time()
+        try:
+            sha256 = _sha256_file(Path(path))
+            t_hash = time.time()
+            previous = self.journal.get(path)
+            if previous and previous["state"] == "uploaded" and previous.get("sha256") == sha256:
+                # Touched but not modified: the server already has these bytes.
+                kept = {k: v for k, v in previous.items() if k not in {"path", "state", "at"}}
+                self.journal.record(path, "uploaded", **{**kept, "size": cand.size, "mtime_ns": cand.mtime_ns})
+                self._candidates.pop(path, None)
+                return
+            resp_body, timings = self._post(path, cand)
+            server_sha = resp_body.get("sha256")
+            if server_sha and server_sha != sha256:
+                raise RuntimeError(f"Checksum mismatch (local {sha256}, server {server_sha})")
+            # The file might have been rewritten while uploading; only journal what we hashed.
+            st = os.stat(path)
+            if st.st_size != cand.size or st.st_mtime_ns != cand.mtime_ns:
+                raise RuntimeError("File changed during upload")
+        except Exception as e:
+            cand.attempts += 1
+            backoff = min(300.0, 2.0 ** min(cand.attempts, 8))
+            cand.retry_at = time.monotonic() + backoff
+            self.journal.record(
+                path, "failed", size=cand.size, mtime_ns=cand.mtime_ns, attempts=cand.attempts, error=str(e)
+            )
+            _json_log(
+                "acquisition_upload_failed",
+                path=path,
+                attempts=cand.attempts,
+                retry_in_s=backoff,
+                error=str(e),
+            )
+            return
+
+        self.journal.record(
+            path,
+            "uploaded",
+            size=cand.size,
+            mtime_ns=cand.mtime_ns,
+            sha256=sha256,
+            file_id=resp_body.get("id"),
+            status=resp_body.get("status"),
+        )
+        self._candidates.pop(path, None)
+        total_s = time.time() - t0
+        _json_log(
+            "acquisition_upload_done",
+            path=path,
+            bytes=cand.size,
+            file_id=resp_body.get("id"),
+            hash_ms=round((t_hash - t0) * 1000.0, 2),
+            mbps=round(cand.size * 8 / 1e6 / total_s, 2) if total_s > 0 else None,
+            **timings,
+        )
+
+    def _upload_name(self, path: str) -> str:
+        """
+        Name the server stores the file under: its path relative to the watch
+        folder, with "/" separators (e.g. `run1/image.tif`), so files with the
+        same name in different subfolders never overwrite each other.
+        """
+        roots = [os.path.abspath(d) for d in self.cfg.watch_dirs]
+        for root in roots:
+            rel = os.path.relpath(path, root)
+            if rel != os.pardir and not rel.startswith(os.pardir + os.sep):
+                if len(roots) > 1:
+                    # Several watch folders may hold the same relative path.
+                    rel = os.path.join(os.path.basename(root.rstrip(os.sep)) or "root", rel)
+                return rel.replace(os.sep, "/")
+        return os.path.basename(path)
+
+    def _post(self, path: str, cand: _Candidate) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        fields: Dict[str, str] = {"filename": self._upload_name(path)}
+        if self.cfg.storage_configuration_id is not None:
+            fields["storage_configuration_id"] = str(self.cfg.storage_configuration_id)
+
+        last_err: Optional[Exception] = None
+        for candidate_url in _ddev_auth_url_candidates(self.upload_url):
+            try:
+                resp = post_multipart(
+                    candidate_url,
+                    headers={"X-Client-Key": self.client_key},
+                    fields=fields,
+                    files={"file": (os.path.basename(path), Path(path), "application/octet-stream")},
+                    insecure_ssl=self.insecure_ssl,
+                    # Large files on slow links: the timeout is per socket operation, not per upload.
+                    timeout_s=120,
+                )
+                return resp.json(), resp.timings.as_dict()
+            except Exception as e:
+                last_err = e
+                continue
+        raise RuntimeError(f"File upload failed using {self.upload_url}: {last_err}") from last_err
@@ -9,7 +9,7 @@ and state management.
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 
 class HardwareController(ABC):
@@ -33,10 +33,14 @@ class HardwareController(ABC):
         pass
 
     @abstractmethod
-    def get_metrics(self) -> Dict[str, Any]:
+    def get_metrics(self, max_age_s: Optional[float] = None) -> Dict[str, Any]:
         """
         Retrieve hardware telemetry/metrics.
 
+        Args:
+            max_age_s: Oldest acceptable cached reading in seconds, for hardware
+                that samples in the background (None = hardware default, 0 = read now)
+
         Returns:
             Dict with 'supported' key (bool) and hardware-specific metrics.
             If not supported, returns {'supported': False, 'message': '...'}.
@@ -118,6 +122,57 @@ class HardwareController(ABC):
         """
         pass
 
+    def get_metrics_history(
+        self,
+        start: float,
+        end: float,
+        *,
+        buckets: int = 120,
+        fields: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Return downsampled metric history for a time range.
+        Can be overridden by hardware implementations that record history.
+
+        Args:
+            start: Range start (unix time)
+            end: Range end (unix time)
+            buckets: Number of min/max/mean buckets
+            fields: Dotted field names to include (default: all recorded)
+
+        Returns:
+            Dict with 'supported' key (bool) and the bucketed series.
+        """
+        return {
+            "hardware_mode": self.hardware_mode,
+            "supported": False,
+            "message": f"{self.hardware_name} does not record metrics history.",
+        }
+
+    def fetch_sem_image(
+        self,
+        *,
+        channel: Optional[int] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        bpp: Optional[int] = None,
+    ) -> Any:
+        """
+        Scan one frame directly from the instrument (not from the screen).
+        Can be overridden by hardware implementations with an image data channel.
+
+        Args:
+            channel: Detector channel (default: hardware-specific)
+            width: Image width in pixels (default: hardware-specific)
+            height: Image height in pixels (default: hardware-specific)
+            bpp: Bits per pixel, 8 or 16 (default: hardware-specific)
+
+        Returns:
+            Frame object with `width`, `height`, `bpp` and raw row-major `data`,
+            or None if the hardware has no image data channel.
+        """
+        return None
+
     def get_screenshot_config(self) -> Dict[str, Any]:
         """
         Return screenshot configuration (monitor number, etc.).
@@ -0,0 +1,508 @@
+"""
+Shared HTTP transport for calls to the control server.
+
+All HTTP requests made by the client (auth, meta, screenshot and file uploads)
+go through one `HttpTransport`, which keeps persistent keep-alive connections
+per origin instead of paying a TCP + TLS handshake for every request.
+
+- SSL contexts are built once (one verified, one for `insecure_ssl`).
+- Concurrency per origin is bounded; callers block (up to the timeout) for a slot.
+- Every response carries connect / TLS / TTFB / transfer timings.
+- Proxies are honoured like urllib does (`HTTP(S)_PROXY`, `NO_PROXY`, system
+  settings): https goes through a CONNECT tunnel, plain http is sent to the
+  proxy with an absolute URL.
+
+Configuration (env):
+- HTTP_MAX_CONNECTIONS_PER_ORIGIN (default 4)
+- HTTP_TIMEOUT_SECONDS (default 30)
+- HTTP_IDLE_TIMEOUT_SECONDS (default 60): idle pooled connections older than this are discarded
+"""
+
+from __future__ import annotations
+
+import base64
+import http.client
+import json
+import logging
+import os
+import socket
+import ssl
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import unquote, urlparse
+from urllib.request import getproxies, proxy_bypass
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean a pooled keep-alive connection was closed by the server while idle.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+class HttpError(RuntimeError):
+    """Non-2xx response from the server."""
+
+    def __init__(self, status: int, body: str):
+        self.status = status
+        self.body = body
+        super().__init__(f"HTTP error {status}: {body}")
+
+
+@dataclass(frozen=True)
+class _Proxy:
+    host: str
+    port: int
+    auth_header: Optional[str]  # Proxy-Authorization value, if the proxy URL has credentials
+
+
+def _parse_proxy(url: str) -> _Proxy:
+    # Like urllib, a bare "host:port" means an http proxy.
+    p = urlparse(url if "://" in url else "http://" + url)
+    if not p.hostname:
+        raise ValueError(f"Invalid proxy URL: {url}")
+    auth_header = None
+    if p.username is not None:
+        creds = f"{unquote(p.username)}:{unquote(p.password or '')}".encode("utf-8")
+        auth_header = "Basic " + base64.b64encode(creds).decode("ascii")
+    return _Proxy(host=p.hostname, port=p.port or 80, auth_header=auth_header)
+
+
+@dataclass(frozen=True)
+class HttpTimings:
+    """Per-request timings in milliseconds. connect/TLS are 0 on a reused connection."""
+
+    connect_ms: float
+    tls_ms: float
+    ttfb_ms: float
+    transfer_ms: float
+    total_ms: float
+    reused: bool
+
+    def as_dict(self, prefix: str = "") -> Dict[str, Any]:
+        return {
+            f"{prefix}connect_ms": self.connect_ms,
+            f"{prefix}tls_ms": self.tls_ms,
+            f"{prefix}ttfb_ms": self.ttfb_ms,
+            f"{prefix}transfer_ms": self.transfer_ms,
+            f"{prefix}total_ms": self.total_ms,
+            f"{prefix}reused": self.reused,
+        }
+
+
+@dataclass(frozen=True)
+class HttpResponse:
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    timings: HttpTimings
+
+    def json(self) -> Dict[str, Any]:
+        text = self.body.decode("utf-8", errors="replace")
+        return json.loads(text) if text else {}
+
+
+class _TimedConnection(http.client.HTTPConnection):
+    """
+    HTTP(S) connection that records how long TCP connect and the TLS handshake took.
+
+    With `set_tunnel()`, `host`/`port` are the proxy's and connect time includes the CONNECT exchange.
+    """
+
+    def __init__(self, host: str, port: int, *, timeout: float, ssl_context: Optional[ssl.SSLContext]):
+        super().__init__(host, port, timeout=timeout)
+        self._ssl_context = ssl_context
+        self.connect_ms = 0.0
+        self.tls_ms = 0.0
+        self.last_used = 0.0
+
+    def connect(self) -> None:
+        t0 = time.perf_counter()
+        sock = socket.create_connection((self.host, self.port), self.timeout, self.source_address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self._tunnel_host:
+            self.sock = sock
+            self._tunnel()
+        t1 = time.perf_counter()
+        if self._ssl_context is not None:
+            sock = self._ssl_context.wrap_socket(sock, server_hostname=self._tunnel_host or self.host)
+        t2 = time.perf_counter()
+        self.sock = sock
+        self.connect_ms = round((t1 - t0) * 1000.0, 2)
+        self.tls_ms = round((t2 - t1) * 1000.0, 2)
+
+
+@dataclass
+class _OriginPool:
+    slots: threading.BoundedSemaphore
+    idle: List[_TimedConnection] = field(default_factory=list)
+
+
+class HttpTransport:
+    """Thread-safe pool of keep-alive HTTP(S) connections, keyed by origin."""
+
+    def __init__(
+        self,
+        *,
+        max_connections_per_origin: int = 4,
+        timeout_s: float = 30.0,
+        idle_timeout_s: float = 60.0,
+    ):
+        self.max_connections_per_origin = max(1, max_connections_per_origin)
+        self.timeout_s = timeout_s
+        self.idle_timeout_s = idle_timeout_s
+        self._pools: Dict[Tuple[str, str, int, bool, Optional[_Proxy]], _OriginPool] = {}
+        self._lock = threading.Lock()
+        self._ssl_contexts: Dict[bool, ssl.SSLContext] = {}
+        # Read once, like urllib's default opener; NO_PROXY decisions are cached per host.
+        self._proxies = {k: v for k, v in getproxies().items() if k in {"http", "https"}}
+        self._bypass: Dict[str, bool] = {}
+
+    @classmethod
+    def from_env(cls) -> "HttpTransport":
+        return cls(
+            max_connections_per_origin=int(os.getenv("HTTP_MAX_CONNECTIONS_PER_ORIGIN", "4")),
+            timeout_s=float(os.getenv("HTTP_TIMEOUT_SECONDS", "30")),
+            idle_timeout_s=float(os.getenv("HTTP_IDLE_TIMEOUT_SECONDS", "60")),
+        )
+
+    def _ssl_context(self, insecure: bool) -> ssl.SSLContext:
+        with self._lock:
+            ctx = self._ssl_contexts.get(insecure)
+            if ctx is None:
+                ctx = ssl.create_default_context()
+                if insecure:
+                    ctx.check_hostname = False
+                    ctx.verify_mode = ssl.CERT_NONE
+                self._ssl_contexts[insecure] = ctx
+            return ctx
+
+    def _proxy_for(self, scheme: str, host: str) -> Optional[_Proxy]:
+        url = self._proxies.get(scheme)
+        if not url:
+            return None
+        with self._lock:
+            bypass = self._bypass.get(host)
+        if bypass is None:
+            bypass = bool(proxy_bypass(host))
+            with self._lock:
+                self._bypass[host] = bypass
+        return None if bypass else _parse_proxy(url)
+
+    def _pool(self, key: Tuple[str, str, int, bool, Optional[_Proxy]]) -> _OriginPool:
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = _OriginPool(slots=threading.BoundedSemaphore(self.max_connections_per_origin))
+                self._pools[key] = pool
+            return pool
+
+    def _checkout(self, pool: _OriginPool) -> Optional[_TimedConnection]:
+        now = time.monotonic()
+        with self._lock:
+            while pool.idle:
+                conn = pool.idle.pop()
+                if now - conn.last_used < self.idle_timeout_s:
+                    return conn
+                conn.close()
+        return None
+
+    def _checkin(self, pool: _OriginPool, conn: _TimedConnection) -> None:
+        conn.last_used = time.monotonic()
+        with self._lock:
+            pool.idle.append(conn)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[Dict[str, str]] = None,
+        body: Union[bytes, Iterable[Any], None] = None,
+        insecure_ssl: bool = False,
+        timeout_s: Optional[float] = None,
+    ) -> HttpResponse:
+        """
+        Send a request on a pooled connection and read the whole response.
+
+        Args:
+            method: HTTP method
+            url: Absolute http(s) URL
+            headers: Request headers
+            body: Request body; an iterable of bytes-like chunks is streamed and must
+                be re-iterable and come with a Content-Length header
+            insecure_ssl: Skip TLS certificate verification
+            timeout_s: Socket timeout (defaults to the transport timeout)
+
+        Returns:
+            HttpResponse with body and timings
+
+        Raises:
+            HttpError: On a non-2xx response
+            TimeoutError: If no connection slot frees up within the timeout
+        """
+        p = urlparse(url)
+        if p.scheme not in {"http", "https"} or not p.hostname:
+            raise ValueError(f"Unsupported URL: {url}")
+        https = p.scheme == "https"
+        port = p.port or (443 if https else 80)
+        insecure = bool(insecure_ssl and https)
+        timeout = self.timeout_s if timeout_s is None else timeout_s
+        target = p.path or "/"
+        if p.query:
+            target += "?" + p.query
+        headers = dict(headers or {})
+        proxy = self._proxy_for(p.scheme, p.hostname)
+        if proxy is not None and not https:
+            # A plain-http proxy gets the absolute URL and its credentials on every request.
+            target = f"http://{p.netloc.rpartition('@')[2]}{target}"
+            if proxy.auth_header:
+                headers["Proxy-Authorization"] = proxy.auth_header
+
+        pool = self._pool((p.scheme, p.hostname, port, insecure, proxy))
+        t0 = time.perf_counter()
+        if not pool.slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No free HTTP connection to {p.hostname}:{port} within {timeout}s")
+        try:
+            conn = self._checkout(pool)
+            reused = conn is not None
+            while True:
+                if conn is None:
+                    conn = _TimedConnection(
+                        proxy.host if proxy is not None else p.hostname,
+                        proxy.port if proxy is not None else port,
+                        timeout=timeout,
+                        ssl_context=self._ssl_context(insecure) if https else None,
+                    )
+                    if proxy is not None and https:
+                        tunnel_headers = {"Proxy-Authorization": proxy.auth_header} if proxy.auth_header else None
+                        conn.set_tunnel(p.hostname, port, headers=tunnel_headers)
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                try:
+                    t_send = time.perf_counter()
+                    conn.request(method, target, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    t_headers = time.perf_counter()
+                    data = resp.read()
+                    t_done = time.perf_counter()
+                    break
+                except _STALE_CONNECTION_ERRORS:
+                    conn.close()
+                    if not reused:
+                        raise
+                    # The server dropped the idle keep-alive connection; retry once on a fresh one.
+                    conn = None
+                    reused = False
+                except BaseException:
+                    conn.close()
+                    raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                self._checkin(pool, conn)
+        finally:
+            pool.slots.release()
+
+        timings = HttpTimings(
+            connect_ms=0.0 if reused else conn.connect_ms,
+            tls_ms=0.0 if reused else conn.tls_ms,
+            ttfb_ms=round((t_headers - t_send) * 1000.0, 2),
+            transfer_ms=round((t_done - t_headers) * 1000.0, 2),
+            total_ms=round((t_done - t0) * 1000.0, 2),
+            reused=reused,
+        )
+        logger.debug(
+            "http %s %s://%s%s -> %s (%s bytes) %s",
+            method, p.scheme, p.netloc, p.path, resp.status, len(data), timings.as_dict(),
+        )
+        if not 200 <= resp.status < 300:
+            raise HttpError(resp.status, data.decode("utf-8", errors="replace"))
+        return HttpResponse(
+            status=resp.status,
+            headers={k.lower(): v for k, v in resp.getheaders()},
+            body=data,
+            timings=timings,
+        )
+
+    def close(self) -> None:
+        """Close all idle pooled connections."""
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            with self._lock:
+                idle, pool.idle = pool.idle, []
+            for conn in idle:
+                conn.close()
+
+
+_default_transport: Optional[HttpTransport] = None
+_default_transport_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """Return the process-wide transport, creating it from env on first use."""
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = HttpTransport.from_env()
+        return _default_transport
+
+
+class MultipartBody:
+    """
+    Streaming multipart/form-data body with a precomputed Content-Length.
+
+    Iterating yields the part headers as small bytes objects and file contents as
+    zero-copy memoryviews (bytes-like content) or fixed-size chunks (paths and
+    binary file objects), so a large file is sent with constant memory. Each
+    iteration starts over, which lets the transport resend the body on a fresh
+    connection.
+    """
+
+    CHUNK_BYTES = 256 * 1024
+
+    def __init__(self, fields: Dict[str, str], files: Dict[str, Tuple[str, Any, str]]):
+        boundary = "----semphony-" + uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._segments: List[Any] = []
+        head = "".join(
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n"
+            for name, value in fields.items()
+        )
+        for name, (filename, content, content_type) in files.items():
+            head += (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f"Content-Type: {content_type}\r\n\r\n"
+            )
+            self._segments.append(head.encode("utf-8"))
+            self._segments.append(_FileSource(content))
+            head = "\r\n"
+        self._segments.append(f"{head}--{boundary}--\r\n".encode("utf-8"))
+        self.content_length = sum(len(segment) for segment in self._segments)
+
+    def __iter__(self) -> Iterator[Any]:
+        for segment in self._segments:
+            if isinstance(segment, _FileSource):
+                yield from segment.chunks(self.CHUNK_BYTES)
+            else:
+                yield segment
+
+
+class _FileSource:
+    """File part content: bytes-like, a path, or a seekable binary file object."""
+
+    def __init__(self, content: Any):
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            self._view: Optional[memoryview] = memoryview(content).cast("B")
+            self._size = self._view.nbytes
+        elif isinstance(content, os.PathLike):
+            self._view = None
+            self._path = os.fspath(content)
+            self._size = os.path.getsize(self._path)
+        else:
+            self._view = None
+            self._path = ""
+            self._file = content
+            self._start = content.tell()
+            self._size = os.fstat(content.fileno()).st_size - self._start
+
+    def __len__(self) -> int:
+        return self._size
+
+    def chunks(self, chunk_bytes: int) -> Iterator[Any]:
+        if self._view is not None:
+            yield self._view
+            return
+        if self._path:
+            with open(self._path, "rb") as f:
+                yield from self._read(f, chunk_bytes)
+        else:
+            self._file.seek(self._start)
+            yield from self._read(self._file, chunk_bytes)
+
+    def _read(self, f: Any, chunk_bytes: int) -> Iterator[bytes]:
+        remaining = self._size
+        while remaining > 0:
+            chunk = f.read(min(chunk_bytes, remaining))
+            if not chunk:
+                raise IOError("File shrank while uploading")
+            remaining -= len(chunk)
+            yield chunk
+
+
+def post_json(
+    url: str,
+    headers: Dict[str, str],
+    payload: Dict[str, Any],
+    *,
+    insecure_ssl: bool = False,
+    timeout_s: Optional[float] = None,
+) -> HttpResponse:
+    return get_transport().request(
+        "POST",
+        url,
+        headers={"Content-Type": "application/json", "Accept": "application/json", **headers},
+        body=json.dumps(payload).encode("utf-8"),
+        insecure_ssl=insecure_ssl,
+        timeout_s=timeout_s,
+    )
+
+
+def get_json(
+    url: str,
+    headers: Dict[str, str],
+    *,
+    insecure_ssl: bool = False,
+    timeout_s: Optional[float] = None,
+) -> HttpResponse:
+    return get_transport().request(
+        "GET",
+        url,
+        headers={"Accept": "application/json", **headers},
+        insecure_ssl=insecure_ssl,
+        timeout_s=timeout_s,
+    )
+
+
+def post_multipart(
+    url: str,
+    headers: Dict[str, str],
+    *,
+    fields: Dict[str, str],
+    files: Dict[str, Tuple[str, Any, str]],
+    insecure_ssl: bool = False,
+    timeout_s: Optional[float] = None,
+) -> HttpResponse:
+    """
+    POST multipart/form-data, streaming the body.
+
+    `files` maps field names to (filename, content, content_type), where content
+    is bytes-like, an `os.PathLike` path or a seekable binary file object.
+    """
+    body = MultipartBody(fields, files)
+    return get_transport().request(
+        "POST",
+        url,
+        headers={
+            "Content-Type": body.content_type,
+            "Content-Length": str(body.content_length),
+            "Accept": "application/json",
+            **headers,
+        },
+        body=body,
+        insecure_ssl=insecure_ssl,
+        timeout_s=timeout_s,
+    )
@@ -0,0 +1,103 @@
+"""
+JSON codec for WebSocket framing (cloud connection and LAN relay).
+
+Uses orjson or msgspec when installed, otherwise the standard library. Output
+is always compact JSON text. Choose explicitly with env var `JSON_CODEC`
+(`auto`, `orjson`, `msgspec` or `stdlib`; default `auto`).
+
+A value the fast backend cannot encode (e.g. an integer beyond 64 bits, a lone
+surrogate) is encoded by the standard library instead, so every backend
+accepts what `json.dumps` accepts.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Callable, Optional, Tuple, Union
+
+# json.dumps() builds a new encoder for every call with non-default arguments.
+_stdlib_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def _stdlib_dumps(obj: Any) -> str:
+    return _stdlib_encoder.encode(obj)
+
+
+def _load_orjson() -> Optional[Tuple[Callable[[Any], str], Callable[[Any], Any]]]:
+    try:
+        import orjson  # type: ignore
+    except ImportError:
+        return None
+    encode = orjson.dumps
+    opts = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> str:
+        try:
+            return encode(obj, option=opts).decode("utf-8")
+        except TypeError:
+            return _stdlib_dumps(obj)
+
+    # orjson.JSONDecodeError is a ValueError, like json.JSONDecodeError.
+    return dumps, orjson.loads
+
+
+def _load_msgspec() -> Optional[Tuple[Callable[[Any], str], Callable[[Any], Any]]]:
+    try:
+        import msgspec  # type: ignore
+    except ImportError:
+        return None
+    encode = msgspec.json.Encoder().encode
+    decode = msgspec.json.Decoder().decode
+    decode_error = msgspec.DecodeError
+
+    def dumps(obj: Any) -> str:
+        try:
+            return encode(obj).decode("utf-8")
+        except (TypeError, ValueError, OverflowError, UnicodeError):
+            return _stdlib_dumps(obj)
+
+    def loads(data: Union[str, bytes, bytearray]) -> Any:
+        try:
+            return decode(data)
+        except decode_error as e:
+            raise ValueError(str(e)) from e
+
+    return dumps, loads
+
+
+def _select(name: str) -> Tuple[str, Callable[[Any], str], Callable[[Any], Any]]:
+    loaders = {"orjson": _load_orjson, "msgspec": _load_msgspec}
+    for candidate in ("orjson", "msgspec") if name == "auto" else (name,):
+        loader = loaders.get(candidate)
+        codec = loader() if loader is not None else None
+        if codec is not None:
+            return (candidate, *codec)
+    return "stdlib", _stdlib_dumps, json.loads
+
+
+# dumps(obj) -> str: compact JSON text.
+# loads(data) -> Any: decode JSON text or UTF-8 bytes; raises ValueError if invalid.
+# Bound straight to the backend functions: these run for every frame.
+BACKEND, dumps, loads = _select((os.getenv("JSON_CODEC") or "auto").strip().lower())
+
+
+class FrameHead:
+    """
+    Pre-encoded start of a Pusher frame whose event (and channel) never change.
+
+    `encode(data)` only encodes `data` and appends it, instead of encoding the
+    whole envelope for every heartbeat or result.
+    """
+
+    def __init__(self, event: str, channel: Optional[str] = None):
+        head = '{"event":' + dumps(event)
+        if channel is not None:
+            head += ',"channel":' + dumps(channel)
+        self._head = head + ',"data":'
+
+    def encode(self, data: Any) -> str:
+        # Pusher carries `data` as a JSON string inside the frame.
+        if not isinstance(data, str):
+            data = dumps(data)
+        return self._head + dumps(data) + "}"
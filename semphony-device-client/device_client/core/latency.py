@@ -0,0 +1,38 @@
+"""
+Rolling latency windows for lightweight percentile reporting in logs.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+
+class LatencyWindow:
+    """Thread-safe fixed-size window of latency samples (milliseconds)."""
+
+    def __init__(self, size: int = 256):
+        self._samples: Deque[float] = deque(maxlen=max(1, int(size)))
+        self._lock = threading.Lock()
+
+    def add(self, ms: float) -> None:
+        with self._lock:
+            self._samples.append(float(ms))
+
+    def percentiles(self, prefix: str) -> Dict[str, float]:
+        """
+        Return nearest-rank p50/p90/p99 over the window as log fields.
+
+        Example: percentiles("grab_ms") -> {"grab_ms_p50": ..., "grab_ms_p90": ..., "grab_ms_p99": ...}
+        """
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return {}
+        out: Dict[str, float] = {}
+        n = len(ordered)
+        for p in (50, 90, 99):
+            idx = min(n - 1, max(0, -(-p * n // 100) - 1))
+            out[f"{prefix}_p{p}"] = round(ordered[idx], 2)
+        return out
@@ -0,0 +1,149 @@
+"""
+In-process metrics history.
+
+`MetricsHistory` keeps a fixed number of samples in a ring buffer stored as one
+`array('d')` column per field (plus a timestamp column), about 8 bytes per
+value instead of a dict per sample. `query()` downsamples a time range into
+min/max/mean buckets so a dashboard chart needs one small response.
+
+Samples are ordered by `time.monotonic()`, which never steps backwards, so an
+NTP correction or a manual clock change cannot unsort the buffer. Queries use
+unix time and are mapped onto the monotonic clock with the current offset
+between the two clocks.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+
+def _numeric_leaves(metrics: Mapping[str, Any], fields: Sequence[str]) -> List[float]:
+    out = []
+    for path in fields:
+        value: Any = metrics
+        for key in path.split("."):
+            value = value.get(key) if isinstance(value, Mapping) else None
+        # bools become 0/1; anything missing or non-numeric is NaN.
+        out.append(float(value) if isinstance(value, (int, float)) else math.nan)
+    return out
+
+
+class _Ordered:
+    """Chronological view over a ring-buffer column, for bisect."""
+
+    def __init__(self, column: array, start: int, size: int, capacity: int):
+        self._column = column
+        self._start = start
+        self._size = size
+        self._capacity = capacity
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, i: int) -> float:
+        return self._column[(self._start + i) % self._capacity]
+
+
+class MetricsHistory:
+    """Fixed-capacity, thread-safe ring buffer of numeric metric samples."""
+
+    def __init__(self, fields: Sequence[str], capacity: int = 36000):
+        self.fields = tuple(fields)
+        self.capacity = max(1, capacity)
+        zeros = bytes(8 * self.capacity)
+        self._ts = array("d", zeros)
+        self._columns = [array("d", zeros) for _ in self.fields]
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def append(self, ts: float, metrics: Mapping[str, Any]) -> None:
+        """
+        Record one sample; `fields` are dotted paths into `metrics` (e.g. `stage.x`).
+
+        Args:
+            ts: `time.monotonic()` when the sample was taken
+            metrics: Metrics dict of the sample
+        """
+        values = _numeric_leaves(metrics, self.fields)
+        with self._lock:
+            i = self._next
+            self._ts[i] = ts
+            for column, value in zip(self._columns, values):
+                column[i] = value
+            self._next = (i + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def query(
+        self,
+        start: float,
+        end: float,
+        *,
+        buckets: int = 120,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Downsample samples taken between `start` and `end` (unix time) into equal-width time buckets.
+
+        Returns:
+            Columnar dict: `t` (bucket start times), `count` per bucket and, per
+            field, `min`/`max`/`mean` lists aligned with `t` (None for empty buckets)
+        """
+        names = [f for f in (fields or self.fields) if f in self.fields]
+        buckets = max(1, buckets)
+        width = (end - start) / buckets if end > start else 1.0
+        counts = [0] * buckets
+        stats = {name: ([math.inf] * buckets, [-math.inf] * buckets, [0.0] * buckets, [0] * buckets) for name in names}
+
+        # Unix time = monotonic time + offset, as of now.
+        offset = time.time() - time.monotonic()
+        start_mono = start - offset
+
+        with self._lock:
+            first = (self._next - self._size) % self.capacity
+            ts = _Ordered(self._ts, first, self._size, self.capacity)
+            lo = bisect_left(ts, start_mono)
+            hi = bisect_right(ts, end - offset)
+            columns = [
+                (stats[name], _Ordered(self._columns[self.fields.index(name)], first, self._size, self.capacity))
+                for name in names
+            ]
+            for i in range(lo, hi):
+                b = min(buckets - 1, int((ts[i] - start_mono) / width))
+                counts[b] += 1
+                for (mins, maxs, sums, ns), column in columns:
+                    v = column[i]
+                    if v != v:  # NaN: field missing in this sample
+                        continue
+                    if v < mins[b]:
+                        mins[b] = v
+                    if v > maxs[b]:
+                        maxs[b] = v
+                    sums[b] += v
+                    ns[b] += 1
+
+        series: Dict[str, Dict[str, List[Optional[float]]]] = {}
+        for name in names:
+            mins, maxs, sums, ns = stats[name]
+            series[name] = {
+                "min": [mins[b] if ns[b] else None for b in range(buckets)],
+                "max": [maxs[b] if ns[b] else None for b in range(buckets)],
+                "mean": [sums[b] / ns[b] if ns[b] else None for b in range(buckets)],
+            }
+        return {
+            "start": start,
+            "end": end,
+            "bucket_s": width,
+            "samples": hi - lo,
+            "t": [start + b * width for b in range(buckets)],
+            "count": counts,
+            "series": series,
+        }
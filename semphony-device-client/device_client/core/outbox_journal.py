@@ -0,0 +1,314 @@
+"""
+Durable journal behind the local->cloud relay outbox.
+
+Queued relay messages are appended to segment files (`outbox-<n>.jsonl`) as
+`put` records; a message that reached the cloud gets an `ack` record. On
+startup, every put without an ack is replayed in order.
+
+Each record is written straight to the OS (so a crash of this process loses
+nothing), while fsync runs on a background thread at most every
+`fsync_interval_s`: one fsync covers every record written since the last, so
+a burst of messages costs one disk flush, and a power cut loses at most that
+interval.
+
+A segment is deleted once all its messages are acked. The oldest segment is
+compacted when mostly acked: its few remaining messages are copied to the
+active segment first. Segments are only ever removed oldest-first, so an ack
+record is never lost while the put it cancels still exists.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from . import json_codec
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024
+DEFAULT_FSYNC_INTERVAL_S = 0.05
+
+_SEGMENT_RE = re.compile(r"^outbox-(\d+)\.jsonl$")
+_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0)
+
+
+def get_outbox_journal_dir() -> Path:
+    """
+    Directory of the relay outbox journal.
+
+    Override with env var `RELAY_OUTBOX_JOURNAL_DIR`.
+    """
+    raw = (os.getenv("RELAY_OUTBOX_JOURNAL_DIR") or "").strip()
+    if raw:
+        return Path(raw).expanduser()
+
+    # Default: <repo>/semphony-device-client/data/outbox
+    repo_dir = Path(__file__).resolve().parents[2]
+    return repo_dir / "data" / "outbox"
+
+
+@dataclass(frozen=True)
+class JournaledMessage:
+    seq: int
+    client_id: str
+    msg_id: str
+    frame: Dict[str, Any]
+
+
+@dataclass
+class _Segment:
+    number: int
+    path: Path
+    size: int = 0
+    live: Set[int] = field(default_factory=set)
+    live_bytes: int = 0
+
+
+class OutboxJournal:
+    """
+    Append-only, segmented journal of queued relay messages.
+
+    Not thread-safe: `append`, `ack` and `replay` are called from the event loop
+    only. The fsync thread only touches the active file descriptor.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        fsync_interval_s: float = DEFAULT_FSYNC_INTERVAL_S,
+    ):
+        self.directory = directory
+        self.segment_bytes = max(4096, int(segment_bytes))
+        self.fsync_interval_s = max(0.001, float(fsync_interval_s))
+
+        self._segments: Dict[int, _Segment] = {}  # insertion order == age
+        self._index: Dict[int, Tuple[int, int, int]] = {}  # seq -> (segment, offset, length) of its put
+        self._next_seq = 1
+        self._active: Optional[_Segment] = None
+        self._fd: Optional[int] = None
+        # Guards `_fd` against the fsync thread while a segment is sealed.
+        self._fd_lock = threading.Lock()
+        self._written = 0  # records written; compared with `_synced` by the fsync thread
+        self._synced = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- startup --------------------------------------------------------------
+
+    def replay(self) -> List[JournaledMessage]:
+        """
+        Load the journal and open a fresh active segment.
+
+        Returns:
+            Messages that were queued but never acked, oldest first
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        numbers = sorted(
+            int(m.group(1)) for m in (_SEGMENT_RE.match(p.name) for p in self.directory.iterdir()) if m
+        )
+        pending: Dict[int, JournaledMessage] = {}
+        for number in numbers:
+            seg = _Segment(number=number, path=self._segment_path(number))
+            self._segments[number] = seg
+            with seg.path.open("rb") as f:
+                data = f.read()
+            seg.size = len(data)
+            offset = 0
+            for line in data.splitlines(keepends=True):
+                start, offset = offset, offset + len(line)
+                try:
+                    rec = json_codec.loads(line)
+                    seq = int(rec["seq"])
+                    if rec["op"] == "put":
+                        msg = JournaledMessage(seq, str(rec["client_id"]), str(rec["msg_id"]), rec["frame"])
+                    elif rec["op"] == "ack":
+                        msg = None
+                    else:
+                        continue
+                except Exception:
+                    # A torn last line after a crash; everything before it is intact.
+                    continue
+                self._next_seq = max(self._next_seq, seq + 1)
+                if msg is None:
+                    self._forget(seq)
+                    pending.pop(seq, None)
+                    continue
+                # A compacted put can appear twice; the newest copy is the live one.
+                self._forget(seq)
+                pending[seq] = msg
+                self._index[seq] = (number, start, len(line))
+                seg.live.add(seq)
+                seg.live_bytes += len(line)
+
+        # Never append after a possibly torn line: always start a new segment.
+        self._open_segment((numbers[-1] + 1) if numbers else 1)
+        self._compact()
+        self._thread = threading.Thread(target=self._fsync_loop, name="outbox-journal-fsync", daemon=True)
+        self._thread.start()
+        return [pending[seq] for seq in sorted(pending)]
+
+    # -- writes ---------------------------------------------------------------
+
+    def append(self, client_id: str, msg_id: str, frame: Dict[str, Any]) -> int:
+        """
+        Record a queued message.
+
+        Returns:
+            Sequence number to pass to `ack`
+
+        Raises:
+            OSError: If the record cannot be written (e.g. disk full)
+        """
+        seq = self._next_seq
+        self._next_seq += 1
+        line = self._encode({"op": "put", "seq": seq, "client_id": client_id, "msg_id": msg_id, "frame": frame})
+        offset = self._write(line)
+        seg = self._active
+        assert seg is not None
+        self._index[seq] = (seg.number, offset, len(line))
+        seg.live.add(seq)
+        seg.live_bytes += len(line)
+        self._maybe_rotate()
+        return seq
+
+    def ack(self, seq: int) -> None:
+        """Record that message `seq` was delivered (or discarded); it will not be replayed."""
+        if seq not in self._index:
+            return
+        self._write(self._encode({"op": "ack", "seq": seq}))
+        self._forget(seq)
+        self._maybe_rotate()
+        self._compact()
+
+    def _encode(self, rec: Dict[str, Any]) -> bytes:
+        return (json_codec.dumps(rec) + "\n").encode("utf-8")
+
+    def _write(self, line: bytes) -> int:
+        seg = self._active
+        if seg is None or self._fd is None:
+            raise OSError("outbox journal is closed")
+        offset = seg.size
+        view = memoryview(line)
+        while view:
+            n = os.write(self._fd, view)
+            view = view[n:]
+        seg.size += len(line)
+        self._written += 1
+        return offset
+
+    def _forget(self, seq: int) -> None:
+        loc = self._index.pop(seq, None)
+        if loc is None:
+            return
+        seg = self._segments.get(loc[0])
+        if seg is not None:
+            seg.live.discard(seq)
+            seg.live_bytes -= loc[2]
+
+    # -- segments -------------------------------------------------------------
+
+    def _segment_path(self, number: int) -> Path:
+        return self.directory / f"outbox-{number:08d}.jsonl"
+
+    def _open_segment(self, number: int) -> None:
+        seg = _Segment(number=number, path=self._segment_path(number))
+        fd = os.open(seg.path, _OPEN_FLAGS, 0o644)
+        with self._fd_lock:
+            old_fd, self._fd = self._fd, fd
+            if old_fd is not None:
+                # Sealing is rare (once per segment), so fsync it inline.
+                os.fsync(old_fd)
+                os.close(old_fd)
+        self._segments[number] = seg
+        self._active = seg
+
+    def _maybe_rotate(self) -> None:
+        seg = self._active
+        if seg is not None and seg.size >= self.segment_bytes:
+            self._open_segment(seg.number + 1)
+
+    def _compact(self) -> None:
+        while True:
+            seg = next(iter(self._segments.values()))
+            if seg is self._active:
+                return
+            if seg.live:
+                # Copying costs up to a quarter segment; below that the space is worth it.
+                if seg.live_bytes * 4 > seg.size:
+                    return
+                self._relocate(seg)
+            try:
+                seg.path.unlink()
+            except FileNotFoundError:
+                pass
+            del self._segments[seg.number]
+
+    def _relocate(self, seg: _Segment) -> None:
+        """Copy the live puts of `seg` to the active segment, durably."""
+        with seg.path.open("rb") as f:
+            data = f.read()
+        for seq in sorted(seg.live):
+            _, offset, length = self._index[seq]
+            line = data[offset : offset + length]
+            active = self._active
+            assert active is not None
+            new_offset = self._write(line)
+            self._index[seq] = (active.number, new_offset, length)
+            active.live.add(seq)
+            active.live_bytes += length
+        seg.live.clear()
+        seg.live_bytes = 0
+        # The copies must be on disk before the original goes away.
+        with self._fd_lock:
+            if self._fd is not None:
+                os.fsync(self._fd)
+        self._maybe_rotate()
+
+    # -- fsync ----------------------------------------------------------------
+
+    def _fsync_loop(self) -> None:
+        while not self._stop.wait(self.fsync_interval_s):
+            self._sync()
+        self._sync()
+
+    def _sync(self) -> None:
+        written = self._written
+        if written == self._synced:
+            return
+        with self._fd_lock:
+            if self._fd is None:
+                return
+            try:
+                os.fsync(self._fd)
+            except OSError as e:
+                logger.warning("Outbox journal fsync failed: %s", e)
+                return
+        self._synced = written
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._index),
+            "segments": len(self._segments),
+            "bytes": sum(s.size for s in self._segments.values()),
+        }
+
+    def close(self) -> None:
+        """Flush outstanding records to disk and close the active segment."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        with self._fd_lock:
+            if self._fd is not None:
+                try:
+                    os.fsync(self._fd)
+                finally:
+                    os.close(self._fd)
+                    self._fd = None
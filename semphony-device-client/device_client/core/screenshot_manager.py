@@ -1,5 +1,32 @@
 """
 Screenshot capture and upload management.
+
+Screen grabbing uses long-lived `mss` sessions (one per worker thread and monitor)
+so monitor enumeration and the platform grab buffers are reused between captures.
+The cached monitor geometry is re-validated periodically and the session is
+rebuilt only when the display layout changes (or a grab fails).
+
+Besides one-shot captures, a monitor can be streamed continuously: a capture loop
+runs at the requested fps until stopped or its TTL expires, with uploads
+pipelined behind the capture so no per-frame command round trip is needed.
+
+Frames identical to the last uploaded frame of a monitor (compared via per-band
+crc32 signatures of the raw buffer) are neither encoded nor uploaded. Streams
+compare with the last frame they queued for upload instead, so an unchanged
+screen is not re-encoded while the previous upload is still in flight.
+
+JPEG encoding uses named presets: "live" (fast: no Huffman optimization pass,
+4:2:0 chroma, optional downscale) and "archival" (optimized, full resolution).
+Streams encode on a worker pool so encoding overlaps with the next grab.
+
+Callers may restrict a capture to a region of interest (pixels, or a named
+button/panel `bbox` from the hardware button config) and downscale it with
+`max_width`/`scale`, so only the area and resolution the dashboard needs is
+grabbed, encoded and uploaded.
+
+With `source: "sem"` the frame is scanned by the instrument itself (e.g. over the
+SharkSEM data channel) instead of grabbed from the screen, and goes through the
+same change detection, encoding, upload and streaming path.
 """
 
 from __future__ import annotations
@@ -7,13 +34,20 @@ from __future__ import annotations
 import io
 import logging
 import os
+import queue
+import threading
 import time
-from typing import Any, Dict, Optional
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
 import mss
 from PIL import Image
 
 from .hardware_controller import HardwareController
+from .http_transport import HttpResponse, post_multipart
+from .latency import LatencyWindow
 
 logger = logging.getLogger(__name__)
 
@@ -28,57 +62,6 @@ def _json_log(event: str, **fields: Any) -> None:
         logger.info("event=%s fields=%r", event, fields)
 
 
-def _http_post_multipart(
-    url: str,
-    headers: Dict[str, str],
-    fields: Dict[str, str],
-    files: Dict[str, tuple],
-    insecure_ssl: bool = False,
-) -> Dict[str, Any]:
-    """POST multipart/form-data request."""
-    import urllib.request
-    import ssl
-    from urllib.parse import urlparse
-
-    boundary = "----WebKitFormBoundary" + "".join([str(i) for i in range(10)])
-    body_parts = []
-
-    # Add fields
-    for key, value in fields.items():
-        body_parts.append(f"--{boundary}\r\n".encode())
-        body_parts.append(f'Content-Disposition: form-data; name="{key}"\r\n\r\n'.encode())
-        body_parts.append(f"{value}\r\n".encode())
-
-    # Add files
-    for key, (filename, file_data, content_type) in files.items():
-        body_parts.append(f"--{boundary}\r\n".encode())
-        body_parts.append(
-            f'Content-Disposition: form-data; name="{key}"; filename="{filename}"\r\n'.encode()
-        )
-        body_parts.append(f"Content-Type: {content_type}\r\n\r\n".encode())
-        body_parts.append(file_data)
-        body_parts.append("\r\n".encode())
-
-    body_parts.append(f"--{boundary}--\r\n".encode())
-    body = b"".join(body_parts)
-
-    req = urllib.request.Request(url, data=body, headers=headers)
-    req.add_header("Content-Type", f"multipart/form-data; boundary={boundary}")
-    req.add_header("Content-Length", str(len(body)))
-
-    ctx = None
-    if insecure_ssl:
-        p = urlparse(url)
-        if p.scheme == "https":
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-
-    with urllib.request.urlopen(req, context=ctx) as resp:
-        import json
-        return json.loads(resp.read().decode("utf-8"))
-
-
 def _ddev_auth_url_candidates(url: str) -> list[str]:
     """Generate DDEV URL candidates for auth endpoints."""
     from urllib.parse import urlparse, urlunparse
@@ -99,6 +82,139 @@ def _ddev_auth_url_candidates(url: str) -> list[str]:
     return candidates
 
 
+def _layout_signature(monitors: List[Dict[str, int]]) -> Tuple[Tuple[int, int, int, int], ...]:
+    return tuple(
+        (int(m["left"]), int(m["top"]), int(m["width"]), int(m["height"])) for m in monitors
+    )
+
+
+@dataclass(frozen=True)
+class EncodePreset:
+    """JPEG encoder settings; `subsampling` uses Pillow's values (0=4:4:4, 2=4:2:0, -1=default)."""
+
+    name: str
+    optimize: bool
+    subsampling: int
+    max_width: int = 0  # 0 keeps the native width
+
+
+def _encode_presets(live_max_width: int) -> Dict[str, EncodePreset]:
+    return {
+        # Skipping the optimize pass roughly halves encode time on large frames.
+        "live": EncodePreset(name="live", optimize=False, subsampling=2, max_width=live_max_width),
+        # Matches the historical one-shot screenshot settings.
+        "archival": EncodePreset(name="archival", optimize=True, subsampling=-1),
+    }
+
+
+# Rows per band used for change detection. Small enough to localize changes,
+# large enough that hashing stays a handful of crc32 calls per frame.
+_SIGNATURE_BAND_ROWS = 16
+
+
+def _frame_signature(raw: Any, row_bytes: int, height: int) -> Tuple[int, ...]:
+    """
+    Hash a frame as horizontal bands of `_SIGNATURE_BAND_ROWS` rows.
+
+    crc32 runs at memory speed and the bands are zero-copy memoryview slices,
+    so this is a small fraction of the JPEG encode it lets us skip.
+    """
+    view = memoryview(raw)
+    band_bytes = row_bytes * _SIGNATURE_BAND_ROWS
+    total = row_bytes * height
+    return tuple(zlib.crc32(view[off : off + band_bytes]) for off in range(0, total, band_bytes))
+
+
+def _changed_ratio(previous: Optional[Tuple[int, ...]], current: Tuple[int, ...]) -> float:
+    """Fraction of bands that differ (1.0 if there is nothing comparable)."""
+    if not previous or len(previous) != len(current):
+        return 1.0
+    changed = sum(1 for a, b in zip(previous, current) if a != b)
+    return round(changed / len(current), 4)
+
+
+class _MonitorGrabber:
+    """
+    Long-lived `mss` session bound to one monitor.
+
+    `mss` instances are not shareable across threads on every platform, so each
+    worker thread owns its own grabbers (see `ScreenshotManager._grabber`).
+    """
+
+    def __init__(self, monitor_nr: int, layout_check_s: float):
+        self.monitor_nr = monitor_nr
+        self.layout_check_s = layout_check_s
+        self.monitor: Dict[str, int] = {}
+        self._sct: Any = None
+        self._layout: Tuple[Tuple[int, int, int, int], ...] = ()
+        self._checked_at = 0.0
+        self._open(mss.mss())
+
+    def _open(self, sct: Any) -> None:
+        self.close()
+        monitors = sct.monitors
+        if self.monitor_nr < 0 or self.monitor_nr >= len(monitors):
+            sct.close()
+            raise ValueError(
+                f"Monitor {self.monitor_nr} not available ({len(monitors) - 1} monitors detected)"
+            )
+        self._sct = sct
+        self.monitor = dict(monitors[self.monitor_nr])
+        self._layout = _layout_signature(monitors)
+        self._checked_at = time.monotonic()
+
+    def _check_layout(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.layout_check_s:
+            return
+        probe = mss.mss()
+        if _layout_signature(probe.monitors) != self._layout:
+            _json_log("screenshot_layout_changed", monitor_nr=self.monitor_nr)
+            # Adopt the probe as the new session instead of enumerating twice.
+            self._open(probe)
+            return
+        probe.close()
+        self._checked_at = now
+
+    def _box(self, region: Optional[Tuple[int, int, int, int]]) -> Dict[str, int]:
+        """Translate a monitor-relative region into an absolute grab box clipped to the monitor."""
+        if region is None:
+            return self.monitor
+        left, top, width, height = region
+        x1 = max(0, left)
+        y1 = max(0, top)
+        x2 = min(self.monitor["width"], left + width)
+        y2 = min(self.monitor["height"], top + height)
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"Region {region} lies outside monitor {self.monitor_nr}")
+        return {
+            "left": self.monitor["left"] + x1,
+            "top": self.monitor["top"] + y1,
+            "width": x2 - x1,
+            "height": y2 - y1,
+        }
+
+    def grab(self, region: Optional[Tuple[int, int, int, int]] = None) -> Any:
+        self._check_layout()
+        try:
+            return self._sct.grab(self._box(region))
+        except ValueError:
+            raise
+        except Exception as e:
+            # Stale handles after a resolution change / display sleep: rebuild once.
+            _json_log("screenshot_grabber_rebuild", monitor_nr=self.monitor_nr, error=str(e))
+            self._open(mss.mss())
+            return self._sct.grab(self._box(region))
+
+    def close(self) -> None:
+        if self._sct is not None:
+            try:
+                self._sct.close()
+            except Exception:
+                pass
+            self._sct = None
+
+
 class ScreenshotManager:
     """Manages screenshot capture and upload."""
 
@@ -110,6 +226,272 @@ class ScreenshotManager:
             hardware_controller: Hardware controller for configuration access
         """
         self.hardware = hardware_controller
+        self._layout_check_s = float(os.getenv("SCREENSHOT_LAYOUT_CHECK_SECONDS", "10"))
+        self._local = threading.local()
+        self._latencies: Dict[Tuple[str, int], LatencyWindow] = {}
+        self._latency_lock = threading.Lock()
+        self._presets = _encode_presets(int(os.getenv("SCREENSHOT_LIVE_MAX_WIDTH", "0")))
+        self._default_preset = (os.getenv("SCREENSHOT_PRESET") or "archival").strip().lower()
+        self._encode_pool = ThreadPoolExecutor(
+            max_workers=max(1, int(os.getenv("SCREENSHOT_ENCODE_WORKERS", "2"))),
+            thread_name_prefix="screenshot-encode",
+        )
+        self._stream_max_fps = float(os.getenv("SCREENSHOT_STREAM_MAX_FPS", "10"))
+        self._stream_max_ttl_s = float(os.getenv("SCREENSHOT_STREAM_MAX_TTL_SECONDS", "600"))
+        self._streams: Dict[int, "_ScreenshotStream"] = {}
+        # Unchanged frames are still re-uploaded this often so the server's taken_at stays fresh.
+        self._unchanged_max_age_s = float(os.getenv("SCREENSHOT_UNCHANGED_MAX_AGE_SECONDS", "60"))
+        self._last_uploaded: Dict["_CaptureSpec", "_UploadedFrame"] = {}
+        # Stream upload threads write `_last_uploaded` while captures read it.
+        self._uploaded_lock = threading.Lock()
+        self._streams_lock = threading.Lock()
+
+    def _grabber(self, monitor_nr: int) -> _MonitorGrabber:
+        """Return this thread's persistent grabber for `monitor_nr`, creating it on first use."""
+        grabbers: Optional[Dict[int, _MonitorGrabber]] = getattr(self._local, "grabbers", None)
+        if grabbers is None:
+            grabbers = {}
+            self._local.grabbers = grabbers
+        grabber = grabbers.get(monitor_nr)
+        if grabber is None:
+            grabber = _MonitorGrabber(monitor_nr, self._layout_check_s)
+            grabbers[monitor_nr] = grabber
+        return grabber
+
+    def close_thread_grabbers(self) -> None:
+        """
+        Close this thread's grabbers (mss sessions with their display handles).
+
+        Must be called by every short-lived thread that captured, before it exits;
+        long-lived worker threads keep theirs for reuse.
+        """
+        grabbers: Optional[Dict[int, _MonitorGrabber]] = getattr(self._local, "grabbers", None)
+        if not grabbers:
+            return
+        self._local.grabbers = {}
+        for grabber in grabbers.values():
+            grabber.close()
+
+    def _forget_stream(self, stream: "_ScreenshotStream") -> None:
+        with self._streams_lock:
+            if self._streams.get(stream.monitor_nr) is stream:
+                self._streams.pop(stream.monitor_nr, None)
+
+    def _latency(self, kind: str, monitor_nr: int) -> LatencyWindow:
+        key = (kind, monitor_nr)
+        with self._latency_lock:
+            window = self._latencies.get(key)
+            if window is None:
+                window = LatencyWindow()
+                self._latencies[key] = window
+            return window
+
+    def _latency_fields(self, monitor_nr: int) -> Dict[str, float]:
+        return {
+            **self._latency("grab_ms", monitor_nr).percentiles("grab_ms"),
+            **self._latency("encode_ms", monitor_nr).percentiles("encode_ms"),
+        }
+
+    def _preset(self, name: Any, default: str) -> EncodePreset:
+        key = str(name or default).strip().lower()
+        preset = self._presets.get(key)
+        if preset is None:
+            raise ValueError(f"Unknown encode preset: {key}. Available presets: {sorted(self._presets)}")
+        return preset
+
+    def _resolve_region(self, monitor_nr: int, region: Any) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Resolve a payload `region` into monitor-relative (left, top, width, height).
+
+        `region` is either a dict of monitor-relative pixels (`x`, `y`, `width`,
+        `height`) or the name of a button/panel in the hardware button config,
+        whose `bbox` is in desktop coordinates (the same ones used for clicks).
+        """
+        if region is None or region == "":
+            return None
+        if isinstance(region, dict):
+            resolved = (
+                int(region.get("x", 0)),
+                int(region.get("y", 0)),
+                int(region["width"]),
+                int(region["height"]),
+            )
+        else:
+            name = str(region)
+            buttons = self.hardware.get_button_config().get("buttons", {})
+            bbox = (buttons.get(name) or {}).get("bbox")
+            if not bbox:
+                raise ValueError(f"Unknown screenshot region: {name}")
+            origin = self._grabber(monitor_nr).monitor
+            resolved = (
+                int(bbox["x1"]) - int(origin["left"]),
+                int(bbox["y1"]) - int(origin["top"]),
+                int(bbox["x2"]) - int(bbox["x1"]),
+                int(bbox["y2"]) - int(bbox["y1"]),
+            )
+        if resolved[2] <= 0 or resolved[3] <= 0:
+            raise ValueError(f"Screenshot region must have a positive size: {region}")
+        return resolved
+
+    def _capture_spec(self, payload: Dict[str, Any], monitor_nr: int) -> "_CaptureSpec":
+        """Build the capture spec (region and downscale) requested by a command payload."""
+        scale = float(payload.get("scale") or 1.0)
+        if not 0.0 < scale <= 1.0:
+            raise ValueError("scale must be in (0, 1]")
+        source = str(payload.get("source") or "screen").strip().lower()
+        sem = None
+        if source == "sem":
+            if payload.get("region"):
+                raise ValueError("region is only supported for screen captures")
+            sem = tuple(
+                None if payload.get(key) in (None, "") else int(payload[key])
+                for key in ("channel", "width", "height", "bpp")
+            )
+        elif source != "screen":
+            raise ValueError(f"Unknown capture source: {source}")
+        return _CaptureSpec(
+            monitor_nr=monitor_nr,
+            sem=sem,
+            region=None if sem else self._resolve_region(monitor_nr, payload.get("region")),
+            max_width=max(0, int(payload.get("max_width") or 0)),
+            scale=scale,
+        )
+
+    def _last_upload(self, spec: "_CaptureSpec") -> Optional["_UploadedFrame"]:
+        with self._uploaded_lock:
+            return self._last_uploaded.get(spec)
+
+    def _grab_frame(
+        self, spec: "_CaptureSpec", *, force: bool = False, baseline: Optional["_UploadedFrame"] = None
+    ) -> "_GrabbedFrame":
+        """
+        Grab the area described by `spec` and compare it with the last uploaded frame.
+
+        Unless `force` is set, a frame whose content matches the last frame
+        uploaded for the same spec (or `baseline`, if given) is marked
+        `not_modified`, so callers can skip encoding and uploading it.
+        """
+        monitor_nr = spec.monitor_nr
+        t_grab0 = time.time()
+        if spec.sem is not None:
+            channel, sem_width, sem_height, bpp = spec.sem
+            sem_frame = self.hardware.fetch_sem_image(channel=channel, width=sem_width, height=sem_height, bpp=bpp)
+            if sem_frame is None:
+                raise ValueError(f"{self.hardware.hardware_name} does not provide SEM image data")
+            raw = sem_frame.data
+            width, height = int(sem_frame.width), int(sem_frame.height)
+            mode = "L" if sem_frame.bpp == 8 else "I;16"
+            row_bytes = width * (sem_frame.bpp // 8)
+        else:
+            sct_img = self._grabber(monitor_nr).grab(spec.region)
+            # `raw` is mss' own BGRA buffer; `bgra`/`rgb` would each make another copy.
+            raw = sct_img.raw
+            width = int(sct_img.size.width)
+            height = int(sct_img.size.height)
+            mode = "BGRX"
+            row_bytes = width * 4
+        t_grab1 = time.time()
+        grab_ms = (t_grab1 - t_grab0) * 1000.0
+        self._latency("grab_ms", monitor_nr).add(grab_ms)
+
+        t_diff0 = time.time()
+        signature = _frame_signature(raw, row_bytes, height)
+        t_diff1 = time.time()
+
+        previous = baseline if baseline is not None else self._last_upload(spec)
+        changed_ratio = _changed_ratio(previous.signature if previous else None, signature)
+        not_modified = (
+            not force
+            and previous is not None
+            and changed_ratio == 0.0
+            and time.monotonic() - previous.uploaded_at < self._unchanged_max_age_s
+        )
+        return _GrabbedFrame(
+            spec=spec,
+            raw=raw,
+            width=width,
+            height=height,
+            mode=mode,
+            grab_ms=round(grab_ms, 2),
+            diff_ms=round((t_diff1 - t_diff0) * 1000.0, 2),
+            signature=signature,
+            changed_ratio=changed_ratio,
+            not_modified=not_modified,
+        )
+
+    def _encode_frame(self, grabbed: "_GrabbedFrame", quality: int, preset: EncodePreset) -> "_CapturedFrame":
+        """Encode a grabbed frame as JPEG using `preset`. Safe to run on the encode pool."""
+        t_enc0 = time.time()
+        size = (grabbed.width, grabbed.height)
+        if grabbed.mode == "L":
+            img = Image.frombuffer("L", size, grabbed.raw, "raw", "L", 0, 1)
+        elif grabbed.mode == "I;16":
+            # JPEG is 8-bit: keep the high byte of each little-endian 16-bit pixel.
+            img = Image.frombytes("L", size, bytes(memoryview(grabbed.raw)[1::2]))
+        else:
+            # Decoding BGRA directly avoids mss' Python-side RGB copy.
+            img = Image.frombytes("RGB", size, grabbed.raw, "raw", "BGRX")
+        target_width = grabbed.spec.target_width(img.width, preset)
+        if target_width < img.width:
+            target = (target_width, max(1, round(img.height * target_width / img.width)))
+            img = img.resize(target, Image.BILINEAR, reducing_gap=2.0)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality, optimize=preset.optimize, subsampling=preset.subsampling)
+        t_enc1 = time.time()
+        encode_ms = (t_enc1 - t_enc0) * 1000.0
+        self._latency("encode_ms", grabbed.spec.monitor_nr).add(encode_ms)
+
+        return _CapturedFrame(
+            spec=grabbed.spec,
+            jpeg=buf.getvalue(),
+            width=int(img.width),
+            height=int(img.height),
+            grab_ms=grabbed.grab_ms,
+            encode_ms=round(encode_ms, 2),
+            diff_ms=grabbed.diff_ms,
+            signature=grabbed.signature,
+            changed_ratio=grabbed.changed_ratio,
+            preset=preset.name,
+        )
+
+    def _remember_upload(self, frame: "_CapturedFrame", upload_resp: Dict[str, Any]) -> None:
+        """Record the frame the server now holds, as the baseline for change detection."""
+        uploaded = _UploadedFrame(
+            signature=frame.signature,
+            uploaded_at=time.monotonic(),
+            artifact_id=upload_resp.get("id"),
+        )
+        with self._uploaded_lock:
+            self._last_uploaded[frame.spec] = uploaded
+
+    def _upload_frame(
+        self,
+        frame: "_CapturedFrame",
+        upload_url: str,
+        client_key: str,
+        insecure_ssl: bool,
+    ) -> HttpResponse:
+        """Upload an encoded frame as the monitor's latest screenshot."""
+        upload_resp: Optional[HttpResponse] = None
+        last_upload_err: Optional[Exception] = None
+        for candidate_url in _ddev_auth_url_candidates(upload_url):
+            try:
+                upload_resp = post_multipart(
+                    candidate_url,
+                    headers={"X-Client-Key": client_key},
+                    fields={"monitor_nr": str(frame.spec.monitor_nr)},
+                    files={"image": ("latest.jpg", frame.jpeg, "image/jpeg")},
+                    insecure_ssl=insecure_ssl,
+                )
+                break
+            except Exception as e:
+                last_upload_err = e
+                continue
+
+        if upload_resp is None:
+            raise RuntimeError(f"Screenshot upload failed using {upload_url}") from last_upload_err
+        self._remember_upload(frame, upload_resp.json())
+        return upload_resp
 
     def capture_and_upload(
         self,
@@ -122,7 +504,9 @@ class ScreenshotManager:
         Capture screenshot and upload to server.
 
         Args:
-            payload: Command payload with optional monitor_nr, format, quality
+            payload: Command payload with optional monitor_nr, format, quality, preset, force,
+                region (pixels dict or button name), max_width, scale, and source
+                ("screen" or "sem" with channel, width, height, bpp)
             upload_url: URL to upload screenshot to
             client_key: Client authentication key
             insecure_ssl: Whether to skip SSL verification
@@ -138,6 +522,9 @@ class ScreenshotManager:
         quality = int(payload.get("quality") or config["jpeg_quality"])
         quality = max(1, min(100, quality))
 
+        preset = self._preset(payload.get("preset"), self._default_preset)
+        spec = self._capture_spec(payload, monitor_nr)
+
         fmt = str(payload.get("format") or "jpeg").strip().lower()
         if fmt not in {"jpeg", "jpg", "image/jpeg"}:
             raise ValueError("Only JPEG screenshots are supported")
@@ -148,43 +535,39 @@ class ScreenshotManager:
             monitor_nr=monitor_nr,
             format="jpeg",
             quality=quality,
+            preset=preset.name,
+            source="sem" if spec.sem else "screen",
+            region=spec.region,
+            max_width=spec.max_width,
+            scale=spec.scale,
         )
 
-        # Capture screenshot
-        with mss.mss() as sct:
-            monitor = sct.monitors[monitor_nr]
-            t_grab0 = time.time()
-            sct_img = sct.grab(monitor)
-            t_grab1 = time.time()
-
-            # Convert to PIL Image and encode as JPEG
-            img = Image.frombytes("RGB", sct_img.size, sct_img.rgb)
-            buf = io.BytesIO()
-            t_enc0 = time.time()
-            img.save(buf, format="JPEG", quality=quality, optimize=True)
-            t_enc1 = time.time()
-            img_bytes = buf.getvalue()
-            mime = "image/jpeg"
-
-        # Upload screenshot
-        upload_resp: Optional[Dict[str, Any]] = None
-        last_upload_err: Optional[Exception] = None
-        for candidate_url in _ddev_auth_url_candidates(upload_url):
-            try:
-                upload_resp = _http_post_multipart(
-                    candidate_url,
-                    headers={"X-Client-Key": client_key},
-                    fields={"monitor_nr": str(monitor_nr)},
-                    files={"image": ("latest.jpg", img_bytes, "image/jpeg")},
-                    insecure_ssl=insecure_ssl,
-                )
-                break
-            except Exception as e:
-                last_upload_err = e
-                continue
-
-        if upload_resp is None:
-            raise RuntimeError(f"Screenshot upload failed using {upload_url}") from last_upload_err
+        grabbed = self._grab_frame(spec, force=bool(payload.get("force")))
+        if grabbed.not_modified:
+            previous = self._last_upload(spec)
+            _json_log(
+                "screenshot_not_modified",
+                monitor_nr=monitor_nr,
+                grab_ms=grabbed.grab_ms,
+                diff_ms=grabbed.diff_ms,
+                total_ms=round((time.time() - t0) * 1000.0, 2),
+            )
+            return {
+                "artifact_id": previous.artifact_id if previous else None,
+                "not_modified": True,
+                "mime": "image/jpeg",
+                "format": "jpeg",
+                "quality": quality,
+                "preset": preset.name,
+                "bytes": 0,
+                "monitor_nr": monitor_nr,
+                "region": spec.region_dict(),
+                "size": {"width": grabbed.width, "height": grabbed.height},
+            }
+
+        frame = self._encode_frame(grabbed, quality, preset)
+        upload_resp = self._upload_frame(frame, upload_url, client_key, insecure_ssl)
+        upload_body = upload_resp.json()
 
         t1 = time.time()
         _json_log(
@@ -192,20 +575,362 @@ class ScreenshotManager:
             monitor_nr=monitor_nr,
             format="jpeg",
             quality=quality,
-            bytes=len(img_bytes),
-            width=int(sct_img.size.width),
-            height=int(sct_img.size.height),
-            grab_ms=round((t_grab1 - t_grab0) * 1000.0, 2),
-            encode_ms=round((t_enc1 - t_enc0) * 1000.0, 2),
+            preset=preset.name,
+            bytes=len(frame.jpeg),
+            width=frame.width,
+            height=frame.height,
+            grab_ms=frame.grab_ms,
+            diff_ms=frame.diff_ms,
+            encode_ms=frame.encode_ms,
+            changed_ratio=frame.changed_ratio,
+            **upload_resp.timings.as_dict("upload_"),
             total_ms=round((t1 - t0) * 1000.0, 2),
+            **self._latency_fields(monitor_nr),
         )
 
         return {
-            "artifact_id": upload_resp.get("id"),
-            "mime": mime,
+            "artifact_id": upload_body.get("id"),
+            "not_modified": False,
+            "mime": "image/jpeg",
             "format": "jpeg",
             "quality": quality,
-            "bytes": len(img_bytes),
+            "preset": preset.name,
+            "bytes": len(frame.jpeg),
             "monitor_nr": monitor_nr,
-            "size": {"width": int(sct_img.size.width), "height": int(sct_img.size.height)},
+            "region": spec.region_dict(),
+            "size": {"width": frame.width, "height": frame.height},
         }
+
+    def start_stream(
+        self,
+        payload: Dict[str, Any],
+        upload_url: str,
+        client_key: str,
+        insecure_ssl: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Start (or refresh) a continuous visual-feed stream for one monitor.
+
+        Sending start again for a running monitor updates fps/quality and extends
+        the TTL, so the dashboard can keep a stream alive with periodic starts.
+
+        Args:
+            payload: Command payload with optional monitor_nr, fps, ttl_s, quality, preset,
+                region, max_width, scale, source (see capture_and_upload)
+            upload_url: URL to upload frames to
+            client_key: Client authentication key
+            insecure_ssl: Whether to skip SSL verification
+
+        Returns:
+            Dict describing the running stream
+        """
+        config = self.hardware.get_screenshot_config()
+        monitor_nr = int(payload.get("monitor_nr") or config["monitor_number"])
+        quality = max(1, min(100, int(payload.get("quality") or config["jpeg_quality"])))
+        fps = max(0.1, min(self._stream_max_fps, float(payload.get("fps") or 2.0)))
+        ttl_s = max(1.0, min(self._stream_max_ttl_s, float(payload.get("ttl_s") or 60.0)))
+        preset = self._preset(payload.get("preset"), "live")
+        spec = self._capture_spec(payload, monitor_nr)
+
+        with self._streams_lock:
+            stream = self._streams.get(monitor_nr)
+            if stream is not None and stream.is_alive():
+                stream.update(fps=fps, quality=quality, preset=preset, spec=spec, ttl_s=ttl_s)
+                refreshed = True
+            else:
+                stream = _ScreenshotStream(
+                    self,
+                    spec=spec,
+                    fps=fps,
+                    quality=quality,
+                    preset=preset,
+                    ttl_s=ttl_s,
+                    upload_url=upload_url,
+                    client_key=client_key,
+                    insecure_ssl=insecure_ssl,
+                )
+                self._streams[monitor_nr] = stream
+                stream.start()
+                refreshed = False
+
+        _json_log(
+            "screenshot_stream_started",
+            monitor_nr=monitor_nr,
+            fps=fps,
+            quality=quality,
+            preset=preset.name,
+            region=spec.region,
+            ttl_s=ttl_s,
+            refreshed=refreshed,
+        )
+        return {"streaming": True, "refreshed": refreshed, **stream.describe()}
+
+    def stop_stream(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Stop the stream for `payload["monitor_nr"]`, or all streams if not given.
+
+        Returns:
+            Dict with the final stats of each stopped stream
+        """
+        monitor_nr = payload.get("monitor_nr")
+        with self._streams_lock:
+            if monitor_nr is None or monitor_nr == "":
+                stopped = list(self._streams.values())
+                self._streams.clear()
+            else:
+                stream = self._streams.pop(int(monitor_nr), None)
+                stopped = [stream] if stream is not None else []
+        for stream in stopped:
+            stream.stop("stop_command")
+        return {"stopped": [stream.describe() for stream in stopped]}
+
+    def shutdown(self) -> None:
+        """Stop all running streams and the encode pool."""
+        self.stop_stream({})
+        self._encode_pool.shutdown(wait=False, cancel_futures=True)
+
+
+@dataclass(frozen=True)
+class _CaptureSpec:
+    """
+    What to grab and how far to downscale it.
+
+    Also the key for change detection, so frames are only compared with earlier
+    frames of the same region and size.
+    """
+
+    monitor_nr: int
+    region: Optional[Tuple[int, int, int, int]] = None  # monitor-relative left, top, width, height
+    # SEM scan (channel, width, height, bpp; None = hardware default) instead of a screen grab.
+    sem: Optional[Tuple[Optional[int], ...]] = None
+    max_width: int = 0  # 0 = no limit
+    scale: float = 1.0
+
+    def target_width(self, width: int, preset: EncodePreset) -> int:
+        target = max(1, round(width * self.scale))
+        for limit in (self.max_width, preset.max_width):
+            if limit:
+                target = min(target, limit)
+        return min(width, target)
+
+    def region_dict(self) -> Optional[Dict[str, int]]:
+        if self.region is None:
+            return None
+        x, y, width, height = self.region
+        return {"x": x, "y": y, "width": width, "height": height}
+
+
+@dataclass(frozen=True)
+class _GrabbedFrame:
+    spec: _CaptureSpec
+    raw: Any
+    width: int
+    height: int
+    mode: str  # "BGRX" (screen), "L" or "I;16" (SEM)
+    grab_ms: float
+    diff_ms: float
+    signature: Tuple[int, ...]
+    changed_ratio: float
+    not_modified: bool
+
+
+@dataclass(frozen=True)
+class _CapturedFrame:
+    spec: _CaptureSpec
+    jpeg: bytes
+    width: int
+    height: int
+    grab_ms: float
+    encode_ms: float
+    diff_ms: float = 0.0
+    signature: Tuple[int, ...] = ()
+    changed_ratio: float = 1.0
+    preset: str = ""
+
+
+@dataclass(frozen=True)
+class _UploadedFrame:
+    signature: Tuple[int, ...]
+    uploaded_at: float
+    artifact_id: Any
+
+
+class _ScreenshotStream:
+    """
+    Capture loop for one monitor at a target fps, with a TTL.
+
+    Capture and upload run on separate threads joined by a one-slot queue, and
+    encoding runs on the manager's encode pool, so the next frame is grabbed while
+    the previous one is encoded and the one before it uploads. If uploads fall
+    behind, the pending frame is replaced by the newer one (latest frame wins;
+    the server only keeps `latest.jpg` anyway).
+
+    Change detection compares with the last frame queued for upload, per spec:
+    the last uploaded frame lags behind while uploads are in flight (or keep
+    failing), and comparing with it would re-encode every unchanged frame.
+    """
+
+    def __init__(
+        self,
+        manager: ScreenshotManager,
+        *,
+        spec: _CaptureSpec,
+        fps: float,
+        quality: int,
+        preset: EncodePreset,
+        ttl_s: float,
+        upload_url: str,
+        client_key: str,
+        insecure_ssl: bool,
+    ):
+        self._manager = manager
+        self.monitor_nr = spec.monitor_nr
+        self.spec = spec
+        self.fps = fps
+        self.quality = quality
+        self.preset = preset
+        self.expires_at = time.monotonic() + ttl_s
+        self._upload_url = upload_url
+        self._client_key = client_key
+        self._insecure_ssl = insecure_ssl
+        self._stop = threading.Event()
+        self._capture_done = threading.Event()
+        self._pending: "queue.Queue[Future[_CapturedFrame]]" = queue.Queue(maxsize=1)
+        # Capture thread only. Counted as uploaded when queued; a failed upload is
+        # retried as is (see `_upload_loop`).
+        self._last_enqueued: Dict[_CaptureSpec, _UploadedFrame] = {}
+        self._stop_reason = ""
+        self.frames_captured = 0
+        self.frames_uploaded = 0
+        self.frames_dropped = 0
+        self.frames_unchanged = 0
+        self.upload_errors = 0
+        self._capture_thread = threading.Thread(
+            target=self._capture_loop, name=f"screenshot-stream-{self.monitor_nr}", daemon=True
+        )
+        self._upload_thread = threading.Thread(
+            target=self._upload_loop, name=f"screenshot-upload-{self.monitor_nr}", daemon=True
+        )
+
+    def start(self) -> None:
+        self._capture_thread.start()
+        self._upload_thread.start()
+
+    def is_alive(self) -> bool:
+        return not self._stop.is_set() and self._capture_thread.is_alive()
+
+    def update(
+        self, *, fps: float, quality: int, preset: EncodePreset, spec: _CaptureSpec, ttl_s: float
+    ) -> None:
+        self.fps = fps
+        self.spec = spec
+        self.quality = quality
+        self.preset = preset
+        self.expires_at = time.monotonic() + ttl_s
+
+    def stop(self, reason: str) -> None:
+        if not self._stop_reason:
+            self._stop_reason = reason
+        self._stop.set()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "monitor_nr": self.monitor_nr,
+            "fps": self.fps,
+            "quality": self.quality,
+            "preset": self.preset.name,
+            "region": self.spec.region_dict(),
+            "expires_in_s": round(max(0.0, self.expires_at - time.monotonic()), 1),
+            "frames_captured": self.frames_captured,
+            "frames_uploaded": self.frames_uploaded,
+            "frames_dropped": self.frames_dropped,
+            "frames_unchanged": self.frames_unchanged,
+            "upload_errors": self.upload_errors,
+        }
+
+    def _enqueue(self, frame: "Future[_CapturedFrame]") -> None:
+        try:
+            self._pending.put_nowait(frame)
+        except queue.Full:
+            # Replace the frame still waiting for upload with the newer one.
+            try:
+                self._pending.get_nowait()
+                self.frames_dropped += 1
+            except queue.Empty:
+                pass
+            self._pending.put_nowait(frame)
+
+    def _capture_loop(self) -> None:
+        try:
+            next_at = time.monotonic()
+            while not self._stop.is_set():
+                if time.monotonic() >= self.expires_at:
+                    self.stop("ttl_expired")
+                    break
+                spec = self.spec
+                grabbed = self._manager._grab_frame(spec, baseline=self._last_enqueued.get(spec))
+                self.frames_captured += 1
+                if grabbed.not_modified:
+                    self.frames_unchanged += 1
+                else:
+                    self._last_enqueued[spec] = _UploadedFrame(
+                        signature=grabbed.signature, uploaded_at=time.monotonic(), artifact_id=None
+                    )
+                    self._enqueue(
+                        self._manager._encode_pool.submit(
+                            self._manager._encode_frame, grabbed, self.quality, self.preset
+                        )
+                    )
+
+                next_at += 1.0 / self.fps
+                delay = next_at - time.monotonic()
+                if delay < 0:
+                    # Running behind: don't try to catch up with a burst.
+                    next_at = time.monotonic()
+                    delay = 0.0
+                self._stop.wait(delay)
+        except Exception as e:
+            logger.exception("Screenshot stream for monitor %s failed", self.monitor_nr)
+            self.stop(f"error: {e}")
+        finally:
+            # A new capture thread is started for every stream; don't leak its mss session.
+            self._manager.close_thread_grabbers()
+            self._capture_done.set()
+            self._manager._forget_stream(self)
+
+    def _upload_loop(self) -> None:
+        # The last frame whose upload failed. Unchanged frames are not queued again,
+        # so it is re-sent (without re-encoding) whenever nothing newer is queued.
+        retry: Optional[_CapturedFrame] = None
+        while True:
+            pending: "Optional[Future[_CapturedFrame]]"
+            try:
+                pending = self._pending.get(timeout=0.25)
+            except queue.Empty:
+                if self._capture_done.is_set():
+                    break
+                if retry is None:
+                    continue
+                pending = None
+            if self._stop.is_set() and self._stop_reason == "stop_command":
+                # Explicit stop: don't push stale frames after the user turned the feed off.
+                break
+            frame = retry
+            try:
+                if pending is not None:
+                    frame = pending.result()
+                assert frame is not None
+                self._manager._upload_frame(frame, self._upload_url, self._client_key, self._insecure_ssl)
+                self.frames_uploaded += 1
+                retry = None
+            except Exception as e:
+                self.upload_errors += 1
+                retry = frame
+                _json_log("screenshot_stream_upload_failed", monitor_nr=self.monitor_nr, error=str(e))
+
+        _json_log(
+            "screenshot_stream_stopped",
+            reason=self._stop_reason,
+            **self.describe(),
+            **self._manager._latency_fields(self.monitor_nr),
+        )
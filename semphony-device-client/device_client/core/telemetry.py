@@ -0,0 +1,121 @@
+"""
+Change detection for pushed telemetry.
+
+`TelemetryTracker` decides when a metrics snapshot is worth publishing as a
+`client-telemetry` event: numeric fields must move by more than their deadband,
+any other field (beam on/off, pump status, ...) on any change. The snapshot last
+published is the baseline for the next comparison; heartbeats that carry the
+latest snapshot also reset it, so a quiet microscope produces no extra events.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+# Absolute deadbands per field path. A top-level name applies to every numeric
+# leaf below it without a deadband of its own. Units are whatever the hardware
+# reports (SharkSEM: stage mm, WD m, kV, A); `working_distance` carries the WD
+# in m but also the stage Z in mm, so its leaves have separate deadbands.
+DEFAULT_DEADBANDS: Dict[str, float] = {
+    "stage": 0.001,
+    "working_distance.wd": 1e-6,
+    "working_distance.z": 0.001,
+    "beam_kv": 0.05,
+    "beam_current_a": 1e-7,
+}
+
+# Bookkeeping fields that change on every read and must not trigger a publish.
+_IGNORED_FIELDS = frozenset({"sampled_at", "age_s", "staleness_s", "last_error", "source", "supported", "connection"})
+
+
+def parse_deadbands(raw: str) -> Dict[str, float]:
+    """
+    Parse `field=value,field=value` overrides on top of `DEFAULT_DEADBANDS`.
+
+    Overriding a field also replaces the defaults of the leaves below it, so
+    `working_distance=0.01` applies to both `working_distance.wd` and `.z`.
+    """
+    overrides: Dict[str, float] = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        overrides[name.strip()] = float(value)
+    deadbands = {
+        path: value
+        for path, value in DEFAULT_DEADBANDS.items()
+        if not any(path.startswith(f"{name}.") for name in overrides)
+    }
+    deadbands.update(overrides)
+    return deadbands
+
+
+def _flatten(metrics: Mapping[str, Any], prefix: str = "") -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for key, value in metrics.items():
+        if not prefix and key in _IGNORED_FIELDS:
+            continue
+        path = f"{prefix}{key}"
+        if isinstance(value, Mapping):
+            out.update(_flatten(value, f"{path}."))
+        else:
+            out[path] = value
+    return out
+
+
+class TelemetryTracker:
+    """Thread-safe deadband filter over successive metrics snapshots."""
+
+    def __init__(self, deadbands: Optional[Dict[str, float]] = None):
+        self.deadbands = dict(DEFAULT_DEADBANDS if deadbands is None else deadbands)
+        self._sent: Dict[str, Any] = {}
+        self._latest: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TelemetryTracker":
+        return cls(parse_deadbands(os.getenv("TELEMETRY_DEADBANDS") or ""))
+
+    def _deadband(self, path: str) -> float:
+        return self.deadbands.get(path, self.deadbands.get(path.split(".", 1)[0], 0.0))
+
+    def _changed(self, flat: Dict[str, Any]) -> List[str]:
+        changed = []
+        for path, value in flat.items():
+            if path not in self._sent:
+                changed.append(path)
+                continue
+            previous = self._sent[path]
+            numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if numeric and isinstance(previous, (int, float)) and not isinstance(previous, bool):
+                if abs(value - previous) > self._deadband(path):
+                    changed.append(path)
+            elif value != previous:
+                changed.append(path)
+        return changed
+
+    def observe(self, metrics: Dict[str, Any]) -> Tuple[bool, List[str]]:
+        """
+        Record a new snapshot.
+
+        Returns:
+            Tuple of (publish: bool, changed field paths). When `publish` is True
+            the snapshot becomes the new baseline.
+        """
+        flat = _flatten(metrics)
+        with self._lock:
+            self._latest = metrics
+            changed = self._changed(flat)
+            if changed:
+                self._sent = flat
+            return bool(changed), changed
+
+    def take_latest(self) -> Optional[Dict[str, Any]]:
+        """Return the latest snapshot for a heartbeat and make it the published baseline."""
+        with self._lock:
+            if self._latest is None:
+                return None
+            self._sent = _flatten(self._latest)
+            return self._latest
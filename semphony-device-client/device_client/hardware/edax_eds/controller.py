@@ -45,7 +45,7 @@ class EdaxEdsController(BaseHardwareController):
         logger.info("EDAX EDS controller initialized (GUI automation mode)")
         self._current_state = self.state_config.get_default_state()
 
-    def get_metrics(self) -> Dict[str, Any]:
+    def get_metrics(self, max_age_s: Optional[float] = None) -> Dict[str, Any]:
         """
         Get EDAX EDS metrics.
 
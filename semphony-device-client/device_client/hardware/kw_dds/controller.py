@@ -42,7 +42,7 @@ class KwDdsController(BaseHardwareController):
         logger.info("KW-DDS controller initialized (GUI automation mode)")
         self._current_state = self.state_config.get_default_state()
 
-    def get_metrics(self) -> Dict[str, Any]:
+    def get_metrics(self, max_age_s: Optional[float] = None) -> Dict[str, Any]:
         """
         Get KW-DDS metrics.
 
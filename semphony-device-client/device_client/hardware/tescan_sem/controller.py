@@ -8,16 +8,25 @@ import logging
 import os
 import pyautogui
 import time
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from ..base import BaseHardwareController
 from .buttons import TescanButtonConfig
 from .states import TescanStateConfig
+from .images import TescanImageReader
 from .metrics import TescanMetricsReader
+from .sdk_client import SharkSemError
+from .sdk_commands import TescanSdkCommands
 from ...utils.button_utils import ButtonValidationError
 
 logger = logging.getLogger(__name__)
 
+# SDK commands with a GUI button that does the same, clicked when SharkSEM is unavailable.
+# The GUI only has a beam toggle, which cannot guarantee beam_on / beam_off.
+GUI_FALLBACK_BUTTONS: Dict[str, str] = {
+    "stage_stop": "stage_control_stop",
+}
+
 
 class TescanSemController(BaseHardwareController):
     """TESCAN SEM hardware controller."""
@@ -28,6 +37,8 @@ class TescanSemController(BaseHardwareController):
         self.button_config = TescanButtonConfig()
         self.state_config = TescanStateConfig()
         self.metrics_reader = TescanMetricsReader()
+        self.image_reader = TescanImageReader()
+        self.sdk_commands = TescanSdkCommands()
         # Initialize to default state
         self._current_state = self.state_config.get_default_state()
         self._state_config_dict = self.state_config.get_config()
@@ -54,12 +65,37 @@ class TescanSemController(BaseHardwareController):
                 logger.info("TESCAN SDK connectivity check passed")
             else:
                 logger.warning("TESCAN SDK connectivity check failed (continuing in GUI-only mode)")
+            # Record history from startup, not from the first metrics request;
+            # the poller keeps retrying while the SEM is unreachable.
+            self.metrics_reader.start()
         
         self._current_state = self.state_config.get_default_state()
 
-    def get_metrics(self) -> Dict[str, Any]:
-        """Get TESCAN SEM metrics via SDK."""
-        return self.metrics_reader.get_metrics()
+    def get_metrics(self, max_age_s: Optional[float] = None) -> Dict[str, Any]:
+        """Get TESCAN SEM metrics via SDK (served from the background poller's snapshot)."""
+        return self.metrics_reader.get_metrics(max_age_s=max_age_s)
+
+    def get_metrics_history(
+        self,
+        start: float,
+        end: float,
+        *,
+        buckets: int = 120,
+        fields: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Return downsampled TESCAN metrics recorded by the background poller."""
+        return self.metrics_reader.get_history(start, end, buckets=buckets, fields=fields)
+
+    def fetch_sem_image(
+        self,
+        *,
+        channel: Optional[int] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        bpp: Optional[int] = None,
+    ) -> Any:
+        """Scan one frame over the SharkSEM data channel."""
+        return self.image_reader.fetch(channel=channel, width=width, height=height, bpp=bpp)
 
     def get_button_config(self) -> Dict[str, Any]:
         """Return merged button configuration (for backward compatibility)."""
@@ -118,6 +154,41 @@ class TescanSemController(BaseHardwareController):
             state = self.get_current_state()
         return self.button_config.validate_button(button_name, state)
 
+    def _click_button(
+        self,
+        button_name: str,
+        *,
+        duration: float = 0.3,
+        clicks: int = 1,
+        interval: float = 0.1,
+        button: str = "left",
+        confirmation_wait: float = 1.0,
+    ) -> None:
+        """Click a configured GUI button with the mouse, confirming with Enter if it asks."""
+        # For TESCAN, all buttons are in the default state, so no state checking needed
+        button_info, center = self.validate_button(button_name)
+        pyautogui.moveTo(center["x"], center["y"], duration=duration)
+        pyautogui.click(center["x"], center["y"], clicks=clicks, interval=interval, button=button)
+
+        # Check if button requires confirmation
+        if button_info.get("requires_confirmation", False):
+            time.sleep(confirmation_wait)
+            pyautogui.press("enter")
+
+    def _sdk_or_gui(
+        self, action: str, sdk_call: Callable[[], Dict[str, Any]]
+    ) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """Run a typed SDK command; if SharkSEM is unavailable, click its GUI button instead."""
+        try:
+            return True, "ok", sdk_call()
+        except SharkSemError as e:
+            button_name = GUI_FALLBACK_BUTTONS.get(action)
+            if button_name is None:
+                return False, f"TESCAN SDK command failed (no GUI equivalent for {action}): {e}", None
+            logger.info("SDK command %s unavailable, clicking %s instead: %s", action, button_name, e)
+            self._click_button(button_name)
+            return True, "ok", {"transport": "gui", "button_name": button_name, "sdk_error": str(e)}
+
     def execute_command(self, command_name: str, payload: Dict[str, Any]) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
         """
         Execute TESCAN-specific commands.
@@ -147,15 +218,28 @@ class TescanSemController(BaseHardwareController):
                 button = str(payload.get("button", "left"))
                 confirmation_wait = float(payload.get("confirmation_wait", 1.0))
 
-                # For TESCAN, all buttons are in the default state, so no state checking needed
-                button_info, center = self.validate_button(button_name)
-                pyautogui.moveTo(center["x"], center["y"], duration=duration)
-                pyautogui.click(center["x"], center["y"], clicks=clicks, interval=interval, button=button)
-
-                # Check if button requires confirmation
-                if button_info.get("requires_confirmation", False):
-                    time.sleep(confirmation_wait)
-                    pyautogui.press("enter")
+                # Validate before taking either path, so unknown buttons fail the same way.
+                self.validate_button(button_name)
+
+                # Fast path: buttons with a SharkSEM equivalent skip the mouse entirely.
+                # One SDK action stands for one click; multi-clicks go to the GUI as asked.
+                sdk_result = None
+                if clicks == 1:
+                    try:
+                        sdk_result = self.sdk_commands.press_button(button_name)
+                    except SharkSemError as e:
+                        logger.info("SDK action for %s unavailable, clicking instead: %s", button_name, e)
+                if sdk_result is not None:
+                    return True, "ok", sdk_result
+
+                self._click_button(
+                    button_name,
+                    duration=duration,
+                    clicks=clicks,
+                    interval=interval,
+                    button=button,
+                    confirmation_wait=confirmation_wait,
+                )
 
                 # For TESCAN, no state switching is needed (only default state exists)
 
@@ -180,10 +264,49 @@ class TescanSemController(BaseHardwareController):
                 pyautogui.press(key)
                 return True, "ok", None
 
+            if command_name in ("beam_on", "beamOn", "HVBeamOn"):
+                return self._sdk_or_gui("beam_on", self.sdk_commands.beam_on)
+
+            if command_name in ("beam_off", "beamOff", "HVBeamOff"):
+                return self._sdk_or_gui("beam_off", self.sdk_commands.beam_off)
+
+            if command_name in ("stage_move_to", "stageMoveTo", "StgMoveTo"):
+                x, y = float(payload["x"]), float(payload["y"])
+                z, r, t = (None if payload.get(axis) is None else float(payload[axis]) for axis in ("z", "r", "t"))
+                queued = bool(payload.get("queued", False))
+                return self._sdk_or_gui(
+                    "stage_move_to", lambda: self.sdk_commands.stage_move_to(x, y, z, r, t, queued=queued)
+                )
+
+            if command_name in ("stage_stop", "stageStop", "StgStop"):
+                return self._sdk_or_gui("stage_stop", self.sdk_commands.stage_stop)
+
+            if command_name in ("set_working_distance", "setWorkingDistance", "SetWD"):
+                wd = float(payload["wd"])
+                return self._sdk_or_gui("set_working_distance", lambda: self.sdk_commands.set_working_distance(wd))
+
+            if command_name in ("select_detector", "selectDetector", "DtSelect"):
+                channel, detector = int(payload.get("channel", 0)), int(payload["detector"])
+                return self._sdk_or_gui(
+                    "select_detector", lambda: self.sdk_commands.select_detector(channel, detector)
+                )
+
+            if command_name in ("acquire_sem_image", "acquireSemImage", "acquire-sem-image"):
+                frame = self.image_reader.fetch(
+                    channel=payload.get("channel"),
+                    width=payload.get("width"),
+                    height=payload.get("height"),
+                    bpp=payload.get("bpp"),
+                )
+                path = self.image_reader.save(frame, payload.get("name"))
+                return True, "ok", {**self.image_reader.describe(frame), "path": str(path)}
+
             return False, f"Unknown command: {command_name}", None
 
         except ButtonValidationError as e:
             return False, e.message, None
+        except SharkSemError as e:
+            return False, f"TESCAN SDK command failed: {e}", None
         except Exception as e:
             logger.exception("Error executing TESCAN command %s", command_name)
             return False, str(e), None
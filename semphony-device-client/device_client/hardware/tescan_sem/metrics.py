@@ -6,11 +6,14 @@ from __future__ import annotations
 
 import logging
 import os
+import threading
 import time
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from .sdk_client import SharkSemClient, SharkSemError
+from ...core.metrics_history import MetricsHistory
+from .sdk_client import SharkSemCall, SharkSemClient
+from .supervisor import SharkSemSupervisor
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +36,30 @@ def _pump_status_label(code: int) -> str:
     }.get(int(code), f"unknown({int(code)})")
 
 
+# Queries per metric group, in response order. A group is always read as a
+# whole, so its fields share one timestamp; groups can be read at different rates.
+_METRIC_GROUPS: Dict[str, Tuple[SharkSemCall, ...]] = {
+    "beam": (
+        SharkSemCall("HVGetVoltage", ["float"]),
+        SharkSemCall("HVGetEmission", ["float"]),
+        SharkSemCall("HVGetBeam", ["int"]),
+    ),
+    "stage": (
+        # Stage position: x, y, z, rot, tilt
+        SharkSemCall("StgGetPosition", ["float", "float", "float", "float", "float"]),
+        SharkSemCall("GetWD", ["float"]),
+    ),
+    "vacuum": (SharkSemCall("VacGetStatus", ["int"]),),
+}
+
+# Top-level metric fields filled by each group.
+_GROUP_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "beam": ("beam_kv", "beam_current_a", "beam_on"),
+    "stage": ("stage", "working_distance"),
+    "vacuum": ("pump",),
+}
+
+
 @dataclass
 class TescanMira3MetricsReader:
     """Reader for TESCAN MIRA 3 metrics via SharkSEM SDK."""
@@ -40,70 +67,248 @@ class TescanMira3MetricsReader:
     host: str
     port: int
     timeout_s: float = 2.0
-    reconnect_backoff_s: float = 1.0
-
-    _client: Optional[SharkSemClient] = None
-    _last_connect_attempt_s: float = 0.0
+    pipeline: bool = True
+    keepalive_s: float = 5.0
+    reconnect_max_s: float = 10.0
 
-    def _ensure_connected(self) -> SharkSemClient:
-        """Ensure SDK client is connected, reconnecting if necessary."""
-        now = time.time()
-        if self._client is not None and self._client.is_connected():
-            return self._client
+    supervisor: Optional[SharkSemSupervisor] = None
 
-        # Avoid tight reconnect loops if the SEM is offline.
-        if now - self._last_connect_attempt_s < self.reconnect_backoff_s:
-            raise SharkSemError("TESCAN SDK not connected (backoff)")
+    def __post_init__(self) -> None:
+        if self.supervisor is None:
+            # Keeps the connection alive and reconnects in the background after a SEM restart.
+            self.supervisor = SharkSemSupervisor(
+                self.host,
+                self.port,
+                self.timeout_s,
+                name="metrics",
+                keepalive_s=self.keepalive_s,
+                backoff_max_s=self.reconnect_max_s,
+            )
 
-        self._last_connect_attempt_s = now
-        c = SharkSemClient(host=self.host, port=self.port, timeout_s=self.timeout_s)
-        c.connect()
-        self._client = c
-        return c
+    def _read_snapshot(self, c: SharkSemClient, calls: Sequence[SharkSemCall]) -> List[List[object]]:
+        """Issue the metric queries, pipelined into one round trip unless disabled."""
+        if self.pipeline:
+            return c.batch(calls)
+        return [c.recv(call.fn_name, call.ret, args=call.args) for call in calls]
 
-    def get_metrics(self) -> Dict[str, Any]:
-        """Retrieve metrics from TESCAN SDK."""
-        c = self._ensure_connected()
-
-        # High voltage + emission current
-        hv_v = float(c.recv_float("HVGetVoltage"))
-        hv_kv = float(_kv_from_voltage(hv_v))
-        emission_a = float(c.recv_float("HVGetEmission"))
-
-        # Beam state
-        beam_state = int(c.recv_int("HVGetBeam"))
-        beam_on = bool(beam_state != 0)
-
-        # Stage position: x, y, z, rot, tilt
-        x, y, z, r, t = c.recv("StgGetPosition", ["float", "float", "float", "float", "float"])
+    def get_metrics(self, groups: Iterable[str] = tuple(_METRIC_GROUPS)) -> Dict[str, Any]:
+        """
+        Retrieve metrics from TESCAN SDK.
 
-        # Working distance
-        wd = float(c.recv_float("GetWD"))
+        Args:
+            groups: Metric groups to read (`beam`, `stage`, `vacuum`); only their
+                fields are included
 
-        # Vacuum / pump status
-        vac_code = int(c.recv_int("VacGetStatus"))
+        Returns:
+            Dict with the fields of the requested groups
+        """
+        assert self.supervisor is not None
+        wanted = [name for name in _METRIC_GROUPS if name in set(groups)]
+        calls = [call for name in wanted for call in _METRIC_GROUPS[name]]
+        results = iter(self.supervisor.call(lambda c: self._read_snapshot(c, calls)))
 
-        return {
+        out: Dict[str, Any] = {
             "sem_mode": "tescan_mira3",
             "source": {"transport": "sharksem", "host": self.host, "port": self.port},
-            "beam_kv": hv_kv,
-            "beam_current_a": emission_a,
-            "beam_on": beam_on,
-            "stage": {"x": float(x), "y": float(y), "z": float(z), "r": float(r), "t": float(t)},
-            "working_distance": {"wd": wd, "z": float(z)},
-            "pump": {"status": _pump_status_label(vac_code), "status_code": vac_code},
         }
+        if "beam" in wanted:
+            (hv_v,), (emission_a,), (beam_state,) = next(results), next(results), next(results)
+            # High voltage + emission current
+            out["beam_kv"] = float(_kv_from_voltage(float(hv_v)))
+            out["beam_current_a"] = float(emission_a)
+            # Beam state
+            out["beam_on"] = bool(int(beam_state) != 0)
+        if "stage" in wanted:
+            (x, y, z, r, t), (wd,) = next(results), next(results)
+            out["stage"] = {"x": float(x), "y": float(y), "z": float(z), "r": float(r), "t": float(t)}
+            # Working distance
+            out["working_distance"] = {"wd": float(wd), "z": float(z)}
+        if "vacuum" in wanted:
+            # Vacuum / pump status
+            (vac_code,) = next(results)
+            vac_code = int(vac_code)
+            out["pump"] = {"status": _pump_status_label(vac_code), "status_code": vac_code}
+        return out
+
+
+# Numeric fields recorded in the metrics history.
+_HISTORY_FIELDS = (
+    "beam_kv",
+    "beam_current_a",
+    "beam_on",
+    "stage.x",
+    "stage.y",
+    "stage.z",
+    "stage.r",
+    "stage.t",
+    "working_distance.wd",
+    "pump.status_code",
+)
 
 
 class TescanMetricsReader:
-    """Wrapper for TESCAN metrics reader with environment-based configuration."""
+    """
+    Wrapper for TESCAN metrics reader with environment-based configuration.
+
+    A background poller samples the SEM at a fixed rate into a timestamped
+    snapshot, and `get_metrics` serves from it. However many dashboards or REST
+    callers ask, the microscope sees one query per poll interval; only callers
+    asking for fresher data than the snapshot (`max_age_s`) trigger a direct read.
+
+    Beam and stage are polled every interval; the slowly changing vacuum status
+    less often. Each group keeps its own read time, reported per field in
+    `staleness_s`.
+    """
 
     def __init__(self):
         """Initialize metrics reader with environment configuration."""
         host = (os.getenv("TESCAN_SDK_HOST") or "127.0.0.1").strip()
         port = int(os.getenv("TESCAN_SDK_PORT") or "8300")
         timeout_s = float(os.getenv("TESCAN_SDK_TIMEOUT_S") or "2.0")
-        self.reader = TescanMira3MetricsReader(host=host, port=port, timeout_s=timeout_s)
+        # Set TESCAN_SDK_PIPELINE=0 to fall back to one round trip per query.
+        pipeline = (os.getenv("TESCAN_SDK_PIPELINE") or "1").strip() not in {"0", "false", "FALSE", "no", "NO"}
+        self.reader = TescanMira3MetricsReader(
+            host=host,
+            port=port,
+            timeout_s=timeout_s,
+            pipeline=pipeline,
+            keepalive_s=float(os.getenv("TESCAN_SDK_KEEPALIVE_SECONDS") or "5.0"),
+            reconnect_max_s=float(os.getenv("TESCAN_SDK_RECONNECT_MAX_SECONDS") or "10.0"),
+        )
+        # 0 disables the poller: every get_metrics then reads the SEM directly.
+        self.poll_interval_s = float(os.getenv("TESCAN_METRICS_POLL_SECONDS") or "1.0")
+        self.vacuum_poll_interval_s = float(os.getenv("TESCAN_METRICS_VACUUM_POLL_SECONDS") or "5.0")
+        self.default_max_age_s = float(os.getenv("TESCAN_METRICS_MAX_AGE_SECONDS") or "2.0")
+        self.history = MetricsHistory(
+            _HISTORY_FIELDS, capacity=int(os.getenv("TESCAN_METRICS_HISTORY_SIZE") or "36000")
+        )
+        # The SharkSEM socket carries one request/response at a time; serialize
+        # callers now that read-only commands run on a parallel worker pool.
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_at = 0.0  # time.monotonic() of the last successful read
+        self._snapshot_wall = 0.0
+        self._group_at: Dict[str, float] = {}  # time.monotonic() of each group's last read
+        self._last_error = ""
+        self._poller: Optional[threading.Thread] = None
+        self._poller_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _group_interval(self, group: str) -> float:
+        return self.vacuum_poll_interval_s if group == "vacuum" else self.poll_interval_s
+
+    def _stale_groups(self, max_age_s: Optional[float]) -> List[str]:
+        """
+        Groups that must be read before serving a caller.
+
+        Without an explicit `max_age_s`, a group may be up to twice its poll
+        interval old, so slowly polled groups don't turn every call into a read.
+        """
+        now = time.monotonic()
+        stale = []
+        for group in _METRIC_GROUPS:
+            at = self._group_at.get(group)
+            if max_age_s is None:
+                limit = max(self.default_max_age_s, 2.0 * self._group_interval(group))
+            else:
+                limit = max_age_s
+            if self._snapshot is None or at is None or now - at > limit:
+                stale.append(group)
+        return stale
+
+    def _read(self, groups: Iterable[str] = tuple(_METRIC_GROUPS)) -> Dict[str, Any]:
+        """Read `groups` from the SEM now and merge them into the snapshot. Caller holds `_lock`."""
+        try:
+            metrics = self.reader.get_metrics(groups)
+        except Exception as e:
+            self._last_error = str(e)
+            raise
+        now = time.monotonic()
+        snapshot = {**(self._snapshot or {}), **metrics}
+        self._snapshot = snapshot
+        self._snapshot_at = now
+        self._snapshot_wall = time.time()
+        # Only the groups just read: fields of the others are NaN in this sample,
+        # so a stale value is never recorded again under a new timestamp.
+        self.history.append(now, metrics)
+        for group, fields in _GROUP_FIELDS.items():
+            if fields[0] in metrics:
+                self._group_at[group] = now
+        self._last_error = ""
+        return snapshot
+
+    def _poll_loop(self) -> None:
+        while not self._stop.is_set():
+            now = time.monotonic()
+            # Half a tick of slack, so a group due "just after" this tick isn't delayed a whole tick.
+            due = [
+                group
+                for group in _METRIC_GROUPS
+                if now - self._group_at.get(group, float("-inf")) + self.poll_interval_s / 2
+                >= self._group_interval(group)
+            ]
+            try:
+                if due:
+                    with self._lock:
+                        self._read(due)
+            except Exception as e:
+                logger.debug("TESCAN metrics poll failed: %s", e)
+            self._stop.wait(self.poll_interval_s)
+
+    def start(self) -> None:
+        """Start the background poller (no-op if already running or disabled)."""
+        if self.poll_interval_s <= 0 or self._poller is not None:
+            return
+        with self._poller_lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, name="tescan-metrics-poller", daemon=True)
+                self._poller.start()
+
+    def stop(self) -> None:
+        """Stop the background poller and the connection supervisor."""
+        self._stop.set()
+        if self.reader.supervisor is not None:
+            self.reader.supervisor.close()
+
+    def connection_state(self) -> Dict[str, Any]:
+        """Return the SharkSEM connection state (see `SharkSemSupervisor.state`)."""
+        assert self.reader.supervisor is not None
+        return self.reader.supervisor.state()
+
+    def _with_freshness(self, metrics: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.monotonic()
+        out = dict(metrics)
+        out["supported"] = True
+        out["sampled_at"] = self._snapshot_wall
+        out["age_s"] = round(now - self._snapshot_at, 3)
+        out["staleness_s"] = {
+            name: round(now - at, 3)
+            for group, at in self._group_at.items()
+            for name in _GROUP_FIELDS[group]
+        }
+        out["connection"] = self.connection_state()
+        if self._last_error:
+            # Served from the last good snapshot while the latest poll failed.
+            out["last_error"] = self._last_error
+        return out
+
+    def get_history(
+        self,
+        start: float,
+        end: float,
+        *,
+        buckets: int = 120,
+        fields: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Return min/max/mean buckets of recorded samples between `start` and `end` (unix time).
+
+        Samples are recorded by every SEM read, i.e. once per poll interval.
+        """
+        self.start()
+        result = self.history.query(start, end, buckets=buckets, fields=fields)
+        result.update({"sem_mode": "tescan_mira3", "supported": True, "fields": list(result["series"])})
+        return result
 
     def check_connectivity(self) -> bool:
         """
@@ -113,26 +318,42 @@ class TescanMetricsReader:
             True if connected successfully, False otherwise
         """
         try:
-            self.reader.get_metrics()
+            with self._lock:
+                self._read()
             return True
         except Exception as e:
             logger.warning("TESCAN SDK connectivity check failed: %s", e)
             return False
 
-    def get_metrics(self) -> Dict[str, Any]:
+    def get_metrics(self, max_age_s: Optional[float] = None) -> Dict[str, Any]:
         """
         Get metrics from TESCAN SDK.
 
+        Args:
+            max_age_s: Oldest acceptable value in seconds, for every field
+                (default TESCAN_METRICS_MAX_AGE_SECONDS, or twice the poll
+                interval of a slower group); 0 forces a fresh read.
+
         Returns:
-            Dict with metrics or error information
+            Dict with metrics plus `sampled_at`, `age_s` and per-field
+            `staleness_s`, or error information
         """
+        self.start()
+        max_age = None if max_age_s is None else max(0.0, float(max_age_s))
         try:
-            metrics = self.reader.get_metrics()
-            metrics["supported"] = True
-            return metrics
+            snapshot = self._snapshot
+            if snapshot is not None and not self._stale_groups(max_age):
+                return self._with_freshness(snapshot)
+            with self._lock:
+                # Another caller may have refreshed while we waited for the lock.
+                stale = self._stale_groups(max_age)
+                snapshot = self._read(stale) if stale else self._snapshot
+                assert snapshot is not None
+                return self._with_freshness(snapshot)
         except Exception as e:
             return {
                 "sem_mode": "tescan_mira3",
                 "supported": False,
                 "message": f"Failed to read metrics from TESCAN SDK: {e}",
+                "connection": self.connection_state(),
             }
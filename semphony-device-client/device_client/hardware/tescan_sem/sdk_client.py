@@ -1,28 +1,63 @@
 """
 Minimal client for TESCAN SharkSEM remote control protocol.
 
-This is intended for **read-only** telemetry (metrics), not image streaming.
+Used for telemetry (metrics) and for fetching scan frames.
 
 Protocol basics (as seen in TESCAN's Python examples):
 - TCP control channel on (host, port)
 - TCP data channel on (host, port+1), registered via TcpRegDataPort(local_port)
 
-We keep the data socket connected because many servers expect it, even if we
-don't actively read image data.
+Image data arrives on the data channel as `ScData` messages (frame id, detector
+channel, byte offset, bits per pixel, pixel bytes). `fetch_image()` reads them
+with `recv_into` straight into a preallocated frame buffer.
+
+The server answers requests in order, so `batch()` can pipeline several calls:
+all requests are written back to back and the responses read afterwards, which
+costs one round trip instead of one per call.
+
+Both channels receive into one reusable buffer per socket (`_RecvBuffer`) and
+parse headers and values in place with precompiled `struct.Struct` formats, so
+polling does not allocate per message.
+
+The client is blocking and is never called from the event loop: metrics are
+read by the poller thread (`TescanMetricsReader`), telemetry reads them via
+`asyncio.to_thread`, and SEM commands run on the command executor's worker
+threads.
 """
 
 from __future__ import annotations
 
+import re
+import select
 import socket
 import struct
+import time
 from dataclasses import dataclass
-from typing import Iterable, List, Optional, Sequence, Tuple
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
 
 
 class SharkSemError(RuntimeError):
     pass
 
 
+# Compiled once: every message goes through these.
+_MESSAGE_HEADER = struct.Struct("<16sIIHHI")  # fn name, body_size, id, flags, queue, reserved
+_INT = struct.Struct("<i")
+_UINT = struct.Struct("<I")
+_SCDATA_FIELDS = struct.Struct("<IIIII")  # frame_id, channel, index, bpp, data length
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+# Header `flags` bit: hold the request in the server's queue until the wait
+# conditions in the header `queue` field are clear, instead of running it now.
+FLAG_WAIT = 0x0008
+# Wait conditions for FLAG_WAIT requests (header `queue` field).
+WAIT_SCAN = 0x0001
+WAIT_STAGE = 0x0002
+WAIT_OPTICS = 0x0004
+WAIT_AUTO = 0x0008  # automatic procedures (focus, brightness/contrast, ...)
+
+
 def _pad4(n: int) -> int:
     return ((n + 3) // 4) * 4
 
@@ -35,61 +70,240 @@ def _encode_fn_name(fn_name: str) -> bytes:
     return b.ljust(16, b"\x00")
 
 
-def _recv_fully(sock: socket.socket, size: int) -> bytes:
-    chunks: List[bytes] = []
-    remaining = size
-    while remaining > 0:
-        part = sock.recv(remaining)
-        if not part:
+def _recv_into_fully(sock: socket.socket, view: memoryview) -> None:
+    """Fill `view` from the socket without intermediate bytes objects."""
+    while view.nbytes:
+        n = sock.recv_into(view)
+        if n == 0:
             raise SharkSemError("Socket closed while receiving data")
-        chunks.append(part)
-        remaining -= len(part)
-    return b"".join(chunks)
+        view = view[n:]
 
 
 def _pack_int(value: int) -> bytes:
-    return struct.pack("<i", int(value))
+    return _INT.pack(int(value))
 
 
 def _pack_uint(value: int) -> bytes:
-    return struct.pack("<I", int(value))
+    return _UINT.pack(int(value))
+
+
+_NUL_PADDING = (b"", b"\x00\x00\x00", b"\x00\x00", b"\x00")
 
 
 def _pack_float(value: float) -> bytes:
     # SharkSEM represents floats as length-prefixed padded ASCII strings.
-    s = str(float(value)).encode("ascii", errors="replace")
-    l = _pad4(len(s))
-    s = s.ljust(l, b"\x00")
-    return struct.pack("<I", l) + s
+    s = repr(float(value)).encode("ascii")
+    pad = _NUL_PADDING[len(s) & 3]
+    return _UINT.pack(len(s) + len(pad)) + s + pad
 
 
-def _unpack_int(body: bytes, offset: int) -> Tuple[int, int]:
-    (v,) = struct.unpack_from("<i", body, offset)
+def _unpack_int(body: Buffer, offset: int) -> Tuple[int, int]:
+    (v,) = _INT.unpack_from(body, offset)
     return v, offset + 4
 
 
-def _unpack_uint(body: bytes, offset: int) -> Tuple[int, int]:
-    (v,) = struct.unpack_from("<I", body, offset)
+def _unpack_uint(body: Buffer, offset: int) -> Tuple[int, int]:
+    (v,) = _UINT.unpack_from(body, offset)
     return v, offset + 4
 
 
-def _unpack_float(body: bytes, offset: int) -> Tuple[float, int]:
-    (l,) = struct.unpack_from("<I", body, offset)
-    offset += 4
-    raw = body[offset : offset + l]
-    offset += l
-    # Trim at first NUL.
-    raw = raw.split(b"\x00", 1)[0]
-    try:
-        return float(raw.decode("ascii", errors="replace")), offset
-    except Exception as e:
-        raise SharkSemError(f"Failed to parse float from {raw!r}") from e
+# A float value: a run of printable bytes. NUL padding and the length prefixes
+# (small numbers, so control bytes) separate the values.
+_FLOAT_TOKEN = re.compile(rb"[^\x00-\x20]+")
+
+
+def _unpack_floats(body: Buffer, count: int, offset: int = 0, *, to_end: bool = False) -> Tuple[List[float], int]:
+    """
+    Decode `count` consecutive length-prefixed float strings starting at `offset`.
+
+    Parsed in place, without copying the body. If the floats run to the end of
+    the body (`to_end`), one regex scan over it yields exactly the values and
+    no per-field work is needed; otherwise, or if the scan finds anything
+    unexpected, fields are walked by their length prefix and each value is
+    handed to float() as a slice with its NUL padding cut off by index.
+    """
+    if to_end:
+        fields = _FLOAT_TOKEN.findall(body, offset)
+        if len(fields) == count:
+            try:
+                return list(map(float, fields)), len(body)
+            except ValueError:
+                pass  # fall through to the per-field walk for a precise error
+
+    view = body if isinstance(body, memoryview) else memoryview(body)
+    unpack_len = _UINT.unpack_from
+    out: List[float] = []
+    for _ in range(count):
+        (l,) = unpack_len(view, offset)
+        start = offset + 4
+        offset = end = start + l
+        while end > start and view[end - 1] == 0:
+            end -= 1
+        try:
+            out.append(float(view[start:end]))
+        except ValueError:
+            # Anything after the NUL terminator is padding; only a malformed field pays for this copy.
+            raw = bytes(view[start:offset])
+            try:
+                out.append(float(raw.split(b"\x00", 1)[0]))
+            except ValueError as e:
+                raise SharkSemError(f"Failed to parse float from {raw!r}") from e
+    return out, offset
+
+
+def _unpack_float(body: Buffer, offset: int) -> Tuple[float, int]:
+    (v,), offset = _unpack_floats(body, 1, offset)
+    return v, offset
+
+
+class _RecvBuffer:
+    """
+    Reusable receive buffer for one socket.
+
+    `recv_into` fills a preallocated bytearray with whatever the socket has
+    (several pipelined responses usually arrive in one read), and `take` hands out
+    memoryview slices of it for in-place parsing. A slice stays valid until the
+    next `take`.
+    """
+
+    def __init__(self, sock: socket.socket, size: int = 64 * 1024):
+        self._sock = sock
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+    def buffered(self) -> int:
+        return self._end - self._start
+
+    def _fill(self, n: int) -> None:
+        """Make at least `n` bytes available from `_start`."""
+        if self._start + n > len(self._buf):
+            pending = self._end - self._start
+            if n > len(self._buf):
+                grown = bytearray(max(n, 2 * len(self._buf)))
+                grown[:pending] = self._view[self._start : self._end]
+                self._buf = grown
+                self._view = memoryview(grown)
+            else:
+                self._buf[:pending] = self._view[self._start : self._end]
+            self._start, self._end = 0, pending
+        while self._end - self._start < n:
+            got = self._sock.recv_into(self._view[self._end :])
+            if got == 0:
+                raise SharkSemError("Socket closed while receiving data")
+            self._end += got
+
+    def take(self, n: int) -> memoryview:
+        self._fill(n)
+        out = self._view[self._start : self._start + n]
+        self._start += n
+        if self._start == self._end:
+            self._start = self._end = 0
+        return out
+
+    def read_into(self, target: memoryview) -> None:
+        """Copy already-buffered bytes into `target`, then receive the rest directly."""
+        have = min(self.buffered(), target.nbytes)
+        if have:
+            target[:have] = self._view[self._start : self._start + have]
+            self._start += have
+            if self._start == self._end:
+                self._start = self._end = 0
+        if have < target.nbytes:
+            _recv_into_fully(self._sock, target[have:])
+
+    def skip(self, n: int) -> None:
+        have = min(self.buffered(), n)
+        self._start += have
+        if self._start == self._end:
+            self._start = self._end = 0
+        n -= have
+        while n > 0:
+            # Bounded by the buffer size; large skips go through in pieces.
+            step = min(n, len(self._buf))
+            _recv_into_fully(self._sock, self._view[:step])
+            n -= step
+
+    def read_message(self) -> Tuple[bytes, int]:
+        """Read one message header; returns (function name, body size)."""
+        fn_name, body_size, _id, _flags, _queue, _reserved = _MESSAGE_HEADER.unpack_from(
+            self.take(_MESSAGE_HEADER.size)
+        )
+        return fn_name.split(b"\x00", 1)[0], body_size
+
+
+@dataclass
+class SemFrame:
+    """One scanned image: row-major pixels, little-endian when `bpp` is 16."""
+
+    frame_id: int
+    channel: int
+    width: int
+    height: int
+    bpp: int
+    data: bytearray
+    fetch_ms: float = 0.0
 
 
 Arg = Tuple[str, object]
 RetType = str  # "int" | "uint" | "float"
 
 
+@dataclass(frozen=True)
+class SharkSemCall:
+    """One request in a pipelined batch."""
+
+    fn_name: str
+    ret: Sequence[RetType]
+    args: Sequence[Arg] = ()
+
+
+def _encode_request(fn_name: str, args: Sequence[Arg], *, flags: int = 0, wait: int = 0) -> bytes:
+    body = b""
+    for t, v in args:
+        if t == "int":
+            body += _pack_int(int(v))  # type: ignore[arg-type]
+        elif t == "uint":
+            body += _pack_uint(int(v))  # type: ignore[arg-type]
+        elif t == "float":
+            body += _pack_float(float(v))  # type: ignore[arg-type]
+        else:
+            raise SharkSemError(f"Unsupported arg type: {t}")
+
+    # Header format: <IIHHI> (body_size, id, flags, queue, reserved)
+    return _MESSAGE_HEADER.pack(_encode_fn_name(fn_name), len(body), 0, flags, wait, 0) + body
+
+
+def _decode_values(body: Buffer, ret: Sequence[RetType]) -> List[object]:
+    if ret.count("float") == len(ret) and ret:
+        return _unpack_floats(body, len(ret), to_end=True)[0]  # type: ignore[return-value]
+    out: List[object] = []
+    offset = 0
+    i = 0
+    while i < len(ret):
+        t = ret[i]
+        if t == "int":
+            v, offset = _unpack_int(body, offset)
+            out.append(v)
+        elif t == "uint":
+            v, offset = _unpack_uint(body, offset)
+            out.append(v)
+        elif t == "float":
+            # Decode a run of floats (e.g. StgGetPosition's five axes) in one pass.
+            run = 1
+            while i + run < len(ret) and ret[i + run] == "float":
+                run += 1
+            values, offset = _unpack_floats(body, run, offset, to_end=i + run == len(ret))
+            out.extend(values)
+            i += run
+            continue
+        else:
+            raise SharkSemError(f"Unsupported return type: {t}")
+        i += 1
+    return out
+
+
 @dataclass
 class SharkSemClient:
     host: str
@@ -98,9 +312,13 @@ class SharkSemClient:
 
     _sock_c: Optional[socket.socket] = None
     _sock_d: Optional[socket.socket] = None
+    _rx_c: Optional[_RecvBuffer] = None
+    _rx_d: Optional[_RecvBuffer] = None
 
     def connect(self) -> None:
         self.close()
+        sock_c: Optional[socket.socket] = None
+        sock_d: Optional[socket.socket] = None
         try:
             sock_c = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock_c.settimeout(self.timeout_s)
@@ -114,12 +332,19 @@ class SharkSemClient:
 
             # Register local data port over control channel, then connect to port+1.
             self._sock_c = sock_c
+            self._rx_c = _RecvBuffer(sock_c)
             self.recv("TcpRegDataPort", ["int"], args=[("int", local_port)])
             sock_d.connect((self.host, self.port + 1))
 
             self._sock_d = sock_d
+            # Small on purpose: pixel payloads bypass it via `read_into`.
+            self._rx_d = _RecvBuffer(sock_d, size=4096)
         except Exception as e:
             self.close()
+            # Sockets not yet handed to `self` are not closed by `close()`.
+            for s in (sock_c, sock_d):
+                if s is not None:
+                    s.close()
             raise SharkSemError(f"Failed to connect to SharkSEM at {self.host}:{self.port}") from e
 
     def close(self) -> None:
@@ -131,66 +356,173 @@ class SharkSemClient:
                 pass
         self._sock_c = None
         self._sock_d = None
+        self._rx_c = None
+        self._rx_d = None
 
     def is_connected(self) -> bool:
         return self._sock_c is not None and self._sock_d is not None
 
+    def peer_closed(self) -> bool:
+        """
+        Return True if the server has closed either socket.
+
+        Non-blocking: a socket only counts as closed when it is readable and a
+        peek returns EOF, so pending unread data is left in place.
+        """
+        socks = [s for s in (self._sock_c, self._sock_d) if s is not None]
+        if len(socks) < 2:
+            return True
+        try:
+            readable, _, _ = select.select(socks, [], [], 0)
+            return any(s.recv(1, socket.MSG_PEEK) == b"" for s in readable)
+        except OSError:
+            return True
+
     def _ensure_connected(self) -> socket.socket:
         if self._sock_c is None:
             raise SharkSemError("Not connected")
         return self._sock_c
 
-    def send(self, fn_name: str, *, args: Sequence[Arg] = ()) -> None:
+    def send(self, fn_name: str, *, args: Sequence[Arg] = (), wait: int = 0) -> None:
+        """
+        Send a request without reading a response (setters such as HVBeamOn have none).
+
+        With `wait` (WAIT_* bits) the server queues the request until those
+        conditions clear, e.g. a stage move issued with WAIT_STAGE runs after the
+        current move finishes, while this call returns immediately.
+        """
         sock = self._ensure_connected()
+        sock.sendall(_encode_request(fn_name, args, flags=FLAG_WAIT if wait else 0, wait=wait))
 
-        body = b""
-        for t, v in args:
-            if t == "int":
-                body += _pack_int(int(v))  # type: ignore[arg-type]
-            elif t == "uint":
-                body += _pack_uint(int(v))  # type: ignore[arg-type]
-            elif t == "float":
-                body += _pack_float(float(v))  # type: ignore[arg-type]
-            else:
-                raise SharkSemError(f"Unsupported arg type: {t}")
+    def _read_response(self, fn_name: str) -> memoryview:
+        """Read the next control-channel response; the body view is valid until the next read."""
+        rx = self._rx_c
+        if rx is None:
+            raise SharkSemError("Not connected")
+        fn_recv, body_size = rx.read_message()
+        body = rx.take(body_size)
 
-        # Header format: <IIHHI> (body_size, id, flags, queue, reserved)
-        # We keep all flags at 0 (no waits).
-        hdr = _encode_fn_name(fn_name) + struct.pack("<IIHHI", len(body), 0, 0, 0, 0)
-        sock.sendall(hdr + body)
+        # Some servers may send unrelated messages; reject mismatched responses.
+        # The examples assume request/response ordering; we keep it simple here.
+        if fn_recv != _encode_fn_name(fn_name).split(b"\x00", 1)[0]:
+            raise SharkSemError(f"Unexpected response function name: {fn_recv!r} (expected {fn_name!r})")
+        return body
 
     def recv(self, fn_name: str, ret: Sequence[RetType], *, args: Sequence[Arg] = ()) -> List[object]:
-        sock = self._ensure_connected()
         self.send(fn_name, args=args)
+        return _decode_values(self._read_response(fn_name), ret)
 
-        fn_recv = _recv_fully(sock, 16)
-        _hdr = _recv_fully(sock, 16)
-        (body_size, _id, _flags, _queue, _reserved) = struct.unpack("<IIHHI", _hdr)
-        body = _recv_fully(sock, body_size)
+    def batch(self, calls: Sequence[SharkSemCall]) -> List[List[object]]:
+        """
+        Pipeline `calls`: write every request in one send, then read the responses in order.
 
-        # Some servers may send unrelated messages; reject mismatched responses.
-        # The examples assume request/response ordering; we keep it simple here.
-        if fn_recv.split(b"\x00", 1)[0] != _encode_fn_name(fn_name).split(b"\x00", 1)[0]:
-            raise SharkSemError(f"Unexpected response function name: {fn_recv!r} (expected {fn_name!r})")
+        If anything goes wrong mid-batch, unread responses would desynchronize the
+        control channel, so the connection is closed and the caller must reconnect.
 
-        out: List[object] = []
-        offset = 0
-        for t in ret:
-            if t == "int":
-                v, offset = _unpack_int(body, offset)
-                out.append(v)
-            elif t == "uint":
-                v, offset = _unpack_uint(body, offset)
-                out.append(v)
-            elif t == "float":
-                v, offset = _unpack_float(body, offset)
-                out.append(v)
-            else:
-                raise SharkSemError(f"Unsupported return type: {t}")
-        return out
+        Returns:
+            One decoded value list per call, in call order
+        """
+        sock = self._ensure_connected()
+        try:
+            sock.sendall(b"".join(_encode_request(c.fn_name, c.args) for c in calls))
+            return [_decode_values(self._read_response(c.fn_name), c.ret) for c in calls]
+        except Exception:
+            self.close()
+            raise
+
+    def fetch_image(
+        self,
+        *,
+        channel: int,
+        width: int,
+        height: int,
+        bpp: int = 8,
+        frame_id: int = 0,
+        out: Optional[bytearray] = None,
+    ) -> SemFrame:
+        """
+        Scan one frame on detector `channel` and read it from the data channel.
+
+        Equivalent to TESCAN's FetchImage: enable the detector, start a single
+        ScScanXY over the full field, then collect `ScData` messages until every
+        pixel has arrived. Pixel payloads are received directly into `out` (or a
+        new buffer), so no per-message bytes objects are created.
+
+        Args:
+            channel: Detector channel index
+            width: Image width in pixels
+            height: Image height in pixels
+            bpp: 8 or 16 bits per pixel
+            frame_id: Frame id to tag the scan with
+            out: Optional buffer to reuse (must hold width*height*bpp/8 bytes)
+
+        Returns:
+            SemFrame backed by `out` (or a new bytearray)
+        """
+        if bpp not in (8, 16):
+            raise SharkSemError(f"Unsupported bits per pixel: {bpp}")
+        if self._rx_d is None:
+            raise SharkSemError("Data channel not connected")
+        size = width * height * (bpp // 8)
+        buf = out if out is not None and len(out) >= size else bytearray(size)
+        view = memoryview(buf)[:size]
+
+        t0 = time.perf_counter()
+        self.send("DtEnable", args=[("int", channel), ("int", 1), ("int", bpp)])
+        (rc,) = self.recv(
+            "ScScanXY",
+            ["int"],
+            args=[
+                ("uint", frame_id),
+                ("uint", width),
+                ("uint", height),
+                ("uint", 0),
+                ("uint", 0),
+                ("uint", width - 1),
+                ("uint", height - 1),
+                ("int", 1),  # single frame
+            ],
+        )
+        if rc != 0:
+            # No data will arrive for a rejected scan (e.g. scanning locked by the GUI).
+            raise SharkSemError(f"ScScanXY rejected the scan (code {rc})")
+        try:
+            self._read_frame_data(view, frame_id=frame_id, channel=channel)
+        except Exception:
+            # Half-read data messages would desynchronize the data channel.
+            self.close()
+            raise
+        return SemFrame(
+            frame_id=frame_id,
+            channel=channel,
+            width=width,
+            height=height,
+            bpp=bpp,
+            data=buf,
+            fetch_ms=round((time.perf_counter() - t0) * 1000.0, 2),
+        )
+
+    def _read_frame_data(self, view: memoryview, *, frame_id: int, channel: int) -> None:
+        rx = self._rx_d
+        assert rx is not None
+        received = 0
+        while received < view.nbytes:
+            fn_name, body_size = rx.read_message()
+            if fn_name != b"ScData":
+                rx.skip(body_size)
+                continue
+            msg_frame, msg_channel, index, _bpp, length = _SCDATA_FIELDS.unpack_from(rx.take(_SCDATA_FIELDS.size))
+            rest = body_size - _SCDATA_FIELDS.size
+            if msg_frame != frame_id or msg_channel != channel or index + length > view.nbytes:
+                rx.skip(rest)
+                continue
+            rx.read_into(view[index : index + length])
+            rx.skip(rest - length)  # array padding
+            received += length
 
     def recv_int(self, fn_name: str, *, args: Sequence[Arg] = ()) -> int:
         return int(self.recv(fn_name, ["int"], args=args)[0])
 
     def recv_float(self, fn_name: str, *, args: Sequence[Arg] = ()) -> float:
         return float(self.recv(fn_name, ["float"], args=args)[0])
+
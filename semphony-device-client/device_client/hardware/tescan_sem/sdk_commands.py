@@ -0,0 +1,126 @@
+"""
+TESCAN SEM write commands via SharkSEM SDK.
+
+These are the fast path for actions otherwise done by clicking the TESCAN GUI:
+a SharkSEM request takes a few milliseconds where a click costs the mouse
+animation plus confirmation waits. Setters have no response, so a command
+returns as soon as it is written; with `queued` the server holds it until the
+relevant subsystem (e.g. the stage) is idle.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from .sdk_client import WAIT_STAGE, Arg, SharkSemClient, SharkSemError
+from .supervisor import SharkSemSupervisor
+
+logger = logging.getLogger(__name__)
+
+
+class TescanSdkCommands:
+    """Typed SharkSEM commands with environment-based configuration."""
+
+    def __init__(self):
+        """Initialize SDK commands with environment configuration."""
+        # Set TESCAN_SDK_COMMANDS=0 to always click the GUI.
+        self.enabled = (os.getenv("TESCAN_SDK_COMMANDS") or "1").strip() not in {"0", "false", "FALSE", "no", "NO"}
+        # Separate connection from the metrics reader: commands never wait behind a poll.
+        # While the SEM is down the supervisor fails calls at once (backoff), so
+        # clicks fall back to the GUI without waiting for a connect timeout.
+        self.supervisor = SharkSemSupervisor.from_env(name="commands")
+
+    def _run(self, fn: Callable[[SharkSemClient], Any]) -> Any:
+        if not self.enabled:
+            raise SharkSemError("TESCAN SDK commands disabled")
+        # A setter whose send failed never reached the server, so one retry is safe.
+        return self.supervisor.call(fn)
+
+    def _send(self, fn_name: str, args: Sequence[Arg] = (), *, wait: int = 0) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        self._run(lambda c: c.send(fn_name, args=args, wait=wait))
+        return {
+            "transport": "sharksem",
+            "function": fn_name,
+            "queued": bool(wait),
+            "sdk_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+        }
+
+    def beam_on(self) -> Dict[str, Any]:
+        return self._send("HVBeamOn")
+
+    def beam_off(self) -> Dict[str, Any]:
+        return self._send("HVBeamOff")
+
+    def beam_toggle(self) -> Dict[str, Any]:
+        """Switch the beam to the opposite of its current state."""
+        beam_on = self._run(lambda c: c.recv_int("HVGetBeam")) != 0
+        return self.beam_off() if beam_on else self.beam_on()
+
+    def stage_move_to(
+        self,
+        x: float,
+        y: float,
+        z: Optional[float] = None,
+        r: Optional[float] = None,
+        t: Optional[float] = None,
+        *,
+        queued: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Move the stage (same units as `get_metrics` stage: mm, degrees).
+
+        Axes left as None keep their position. With `queued`, the move starts
+        once the current stage motion has finished.
+        """
+        axes = [x, y, z, r, t]
+        while axes[-1] is None:
+            axes.pop()
+        if any(v is None for v in axes):
+            # StgMoveTo takes positional axes; fill gaps with the current position.
+            current = self._run(lambda c: c.recv("StgGetPosition", ["float"] * 5))
+            axes = [current[i] if v is None else v for i, v in enumerate(axes)]
+        return self._send("StgMoveTo", [("float", float(v)) for v in axes], wait=WAIT_STAGE if queued else 0)
+
+    def stage_stop(self) -> Dict[str, Any]:
+        return self._send("StgStop")
+
+    def set_working_distance(self, wd: float) -> Dict[str, Any]:
+        """Set the working distance (same units as `get_metrics` working_distance.wd)."""
+        return self._send("SetWD", [("float", float(wd))])
+
+    def select_detector(self, channel: int, detector: int) -> Dict[str, Any]:
+        """Assign `detector` (SharkSEM detector index) to scan `channel`."""
+        return self._send("DtSelect", [("int", int(channel)), ("int", int(detector))])
+
+    def vacuum_pump(self) -> Dict[str, Any]:
+        return self._send("VacPump")
+
+    def vacuum_vent(self) -> Dict[str, Any]:
+        return self._send("VacVent")
+
+    # GUI buttons with an SDK equivalent, so clicking them can skip the mouse.
+    BUTTON_ACTIONS: Dict[str, str] = {
+        "beam_on_off_toggle": "beam_toggle",
+        "stage_control_stop": "stage_stop",
+        "vacuum_pump": "vacuum_pump",
+        "vacuum_vent": "vacuum_vent",
+    }
+
+    def press_button(self, button_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Perform a GUI button's action over the SDK.
+
+        Returns:
+            Result dict, or None if the button has no SDK equivalent
+
+        Raises:
+            SharkSemError: If the SDK is disabled or unreachable (caller falls back to clicking)
+        """
+        action = self.BUTTON_ACTIONS.get(button_name)
+        if action is None:
+            return None
+        return getattr(self, action)()
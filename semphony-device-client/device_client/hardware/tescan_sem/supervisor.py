@@ -0,0 +1,240 @@
+"""
+SharkSEM connection supervision.
+
+A SEM restart (or a SharkSEM server restart) silently invalidates open sockets.
+`SharkSemSupervisor` owns one connection and keeps it usable: a background
+thread probes it when idle and reconnects with exponential backoff while the
+server is down, and a call that finds the socket stale reconnects once and
+retries, so the first command after a restart succeeds instead of failing.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from .sdk_client import SharkSemClient, SharkSemError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+STATE_CONNECTED = "connected"
+STATE_CONNECTING = "connecting"
+STATE_DISCONNECTED = "disconnected"
+
+
+class SharkSemSupervisor:
+    """Thread-safe owner of one SharkSEM connection with keepalive and auto-reconnect."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        timeout_s: float = 2.0,
+        *,
+        name: str = "sharksem",
+        keepalive_s: float = 5.0,
+        backoff_min_s: float = 0.5,
+        backoff_max_s: float = 10.0,
+    ):
+        self.host = host
+        self.port = port
+        self.timeout_s = timeout_s
+        self.name = name
+        self.keepalive_s = keepalive_s
+        self.backoff_min_s = backoff_min_s
+        self.backoff_max_s = backoff_max_s
+
+        self._client: Optional[SharkSemClient] = None
+        # Held for every use of the connection (calls, probes, reconnects).
+        self._lock = threading.Lock()
+        self._state = STATE_DISCONNECTED
+        self._state_since = time.time()
+        self._last_error = ""
+        self._failures = 0  # consecutive failed connects
+        self._connects = 0
+        self._next_attempt_at = 0.0  # time.monotonic()
+        self._last_ok_at = 0.0  # time.monotonic() of the last successful exchange
+        self._probe_ms: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls, *, name: str, timeout_s: Optional[float] = None) -> "SharkSemSupervisor":
+        """
+        Build a supervisor from TESCAN_SDK_HOST/PORT/TIMEOUT_S plus
+        TESCAN_SDK_KEEPALIVE_SECONDS (default 5, 0 disables probes) and
+        TESCAN_SDK_RECONNECT_MAX_SECONDS (backoff cap, default 10).
+        """
+        return cls(
+            host=(os.getenv("TESCAN_SDK_HOST") or "127.0.0.1").strip(),
+            port=int(os.getenv("TESCAN_SDK_PORT") or "8300"),
+            timeout_s=float(os.getenv("TESCAN_SDK_TIMEOUT_S") or "2.0") if timeout_s is None else timeout_s,
+            name=name,
+            keepalive_s=float(os.getenv("TESCAN_SDK_KEEPALIVE_SECONDS") or "5.0"),
+            backoff_max_s=float(os.getenv("TESCAN_SDK_RECONNECT_MAX_SECONDS") or "10.0"),
+        )
+
+    # -- connection management (caller holds `_lock`) ------------------------
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            logger.info("SharkSEM %s connection: %s -> %s", self.name, self._state, state)
+            self._state = state
+            self._state_since = time.time()
+
+    def _mark_down(self, error: BaseException) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        self._last_error = str(error) or type(error).__name__
+        self._set_state(STATE_DISCONNECTED)
+
+    def _connect(self) -> SharkSemClient:
+        self._set_state(STATE_CONNECTING)
+        c = SharkSemClient(host=self.host, port=self.port, timeout_s=self.timeout_s)
+        try:
+            c.connect()
+        except SharkSemError as e:
+            self._failures += 1
+            delay = min(self.backoff_max_s, self.backoff_min_s * (2 ** (self._failures - 1)))
+            self._next_attempt_at = time.monotonic() + delay
+            self._mark_down(e.__cause__ or e)
+            raise
+        self._client = c
+        self._failures = 0
+        self._connects += 1
+        self._last_ok_at = time.monotonic()
+        self._last_error = ""
+        self._set_state(STATE_CONNECTED)
+        return c
+
+    def _usable_client(self, *, force: bool) -> SharkSemClient:
+        if self._client is not None and self._client.is_connected():
+            if not self._client.peer_closed():
+                return self._client
+            # The server went away since the last exchange. A setter written
+            # now would be accepted by the local socket and silently lost.
+            self._mark_down(SharkSemError("connection closed by server"))
+            force = True
+        wait_s = self._next_attempt_at - time.monotonic()
+        if wait_s > 0 and not force:
+            raise SharkSemError(
+                f"TESCAN SDK disconnected ({self._last_error or 'not connected'}); next reconnect in {wait_s:.1f}s"
+            )
+        return self._connect()
+
+    # -- public API -----------------------------------------------------------
+
+    def call(self, fn: Callable[[SharkSemClient], T], *, retry: bool = True) -> T:
+        """
+        Run `fn` with the connected client.
+
+        If `fn` fails on a connection that was already open (e.g. the server
+        restarted since), the connection is rebuilt at once and, with `retry`,
+        `fn` runs once more. Only pass `retry=True` for calls that are safe to
+        repeat.
+
+        Raises:
+            SharkSemError: If the SEM is unreachable (message includes the backoff)
+        """
+        self._ensure_thread()
+        with self._lock:
+            c = self._usable_client(force=False)
+            try:
+                result = fn(c)
+            except (OSError, SharkSemError) as e:
+                self._mark_down(e)
+                if not retry:
+                    raise
+                logger.info("SharkSEM %s call failed (%s); reconnecting and retrying once", self.name, e)
+                c = self._usable_client(force=True)
+                try:
+                    result = fn(c)
+                except (OSError, SharkSemError) as e2:
+                    self._mark_down(e2)
+                    raise
+            self._last_ok_at = time.monotonic()
+            return result
+
+    def probe(self) -> bool:
+        """
+        Check the connection with a cheap read (HVGetBeam), unless it is busy.
+
+        Returns:
+            False if the connection turned out to be dead
+        """
+        if not self._lock.acquire(blocking=False):
+            return True  # in use, hence alive enough
+        try:
+            c = self._client
+            if c is None:
+                return False
+            t0 = time.perf_counter()
+            try:
+                if c.peer_closed():
+                    raise SharkSemError("connection closed by server")
+                c.recv_int("HVGetBeam")
+            except (OSError, SharkSemError) as e:
+                self._failures = 0
+                self._next_attempt_at = 0.0  # reconnect right away
+                self._mark_down(e)
+                return False
+            self._probe_ms = round((time.perf_counter() - t0) * 1000.0, 2)
+            self._last_ok_at = time.monotonic()
+            return True
+        finally:
+            self._lock.release()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if self._client is not None:
+                if self.keepalive_s > 0 and now - self._last_ok_at >= self.keepalive_s:
+                    self.probe()
+            elif now >= self._next_attempt_at:
+                with self._lock:
+                    if self._client is None:
+                        try:
+                            self._connect()
+                        except SharkSemError as e:
+                            logger.debug("SharkSEM %s reconnect failed: %s", self.name, e)
+            self._stop.wait(min(1.0, self.keepalive_s) if self.keepalive_s > 0 else 1.0)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name=f"sharksem-{self.name}", daemon=True)
+                self._thread.start()
+
+    def state(self) -> Dict[str, Any]:
+        """Return the connection state as a JSON-friendly dict."""
+        now = time.monotonic()
+        out: Dict[str, Any] = {
+            "state": self._state,
+            "since": self._state_since,
+            "connects": self._connects,
+        }
+        if self._state == STATE_CONNECTED:
+            out["idle_s"] = round(now - self._last_ok_at, 3)
+            out["probe_ms"] = self._probe_ms
+        else:
+            out["last_error"] = self._last_error
+            out["next_attempt_in_s"] = round(max(0.0, self._next_attempt_at - now), 3)
+        return out
+
+    def close(self) -> None:
+        """Stop the background thread and close the connection."""
+        self._stop.set()
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+            self._set_state(STATE_DISCONNECTED)
@@ -29,6 +29,7 @@ Message types:
 
 Cloud-originated delivery to local clients uses:
 - {"type":"from_cloud","msg_id":"...","event":"server-command","data":{...}}
+  where `data` is the cloud's `data` without the `relay` envelope.
 """
 
 from __future__ import annotations
@@ -42,8 +43,16 @@ import uuid
 from dataclasses import dataclass
 from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
 
+from .core import json_codec
+
 logger = logging.getLogger(__name__)
 
+# Replies that never vary, encoded once.
+_ERR_NON_TEXT = json_codec.dumps({"type": "error", "code": "non_text", "message": "Text JSON required"})
+_ERR_INVALID_JSON = json_codec.dumps({"type": "error", "code": "invalid_json", "message": "Invalid JSON"})
+_ERR_INVALID_MESSAGE = json_codec.dumps({"type": "error", "code": "invalid_message", "message": "JSON object required"})
+_ERR_MISSING_MSG_ID = json_codec.dumps({"type": "error", "code": "missing_msg_id", "message": "msg_id required"})
+
 
 def _json_log(event: str, **fields: Any) -> None:
     payload = {"event": event, **fields}
@@ -179,16 +188,33 @@ class RelayGateway:
                 pass
 
     async def send_from_cloud(self, client_id: str, *, msg_id: str, event: str, data: Dict[str, Any]) -> bool:
+        return await self.forward_from_cloud(client_id, msg_id=msg_id, event=event, data_json=json_codec.dumps(data))
+
+    async def forward_from_cloud(self, client_id: str, *, msg_id: str, event: str, data_json: str) -> bool:
+        """
+        Deliver a cloud message whose `data` is already JSON text.
+
+        `data_json` is spliced into the `from_cloud` frame as is, so a large
+        command payload is never decoded and re-encoded on its way through.
+        """
         async with self._sessions_lock:
             sess = self._sessions.get(client_id)
         if not sess:
-            _json_log("local_relay_route_miss", client_id=client_id, event=event)
+            _json_log("local_relay_route_miss", client_id=client_id, relay_event=event)
             return False
 
         self._messages_from_cloud += 1
-        payload = {"type": "from_cloud", "msg_id": msg_id, "event": event, "data": data}
+        frame = (
+            '{"type":"from_cloud","msg_id":'
+            + json_codec.dumps(msg_id)
+            + ',"event":'
+            + json_codec.dumps(event)
+            + ',"data":'
+            + data_json
+            + "}"
+        )
         async with sess.send_lock:
-            await sess.ws.send(json.dumps(payload))
+            await sess.ws.send(frame)
         return True
 
     async def _handle_client(self, ws: Any) -> None:
@@ -247,7 +273,7 @@ class RelayGateway:
         try:
             async with sess.send_lock:
                 await ws.send(
-                    json.dumps(
+                    json_codec.dumps(
                         {
                             "type": "welcome",
                             "client_id": client_id,
@@ -271,19 +297,19 @@ class RelayGateway:
         if not isinstance(raw, str):
             # For now, require JSON text messages.
             async with sess.send_lock:
-                await sess.ws.send(json.dumps({"type": "error", "code": "non_text", "message": "Text JSON required"}))
+                await sess.ws.send(_ERR_NON_TEXT)
             return
 
         try:
-            msg = json.loads(raw)
+            msg = json_codec.loads(raw)
         except Exception:
             async with sess.send_lock:
-                await sess.ws.send(json.dumps({"type": "error", "code": "invalid_json", "message": "Invalid JSON"}))
+                await sess.ws.send(_ERR_INVALID_JSON)
             return
 
         if not isinstance(msg, dict):
             async with sess.send_lock:
-                await sess.ws.send(json.dumps({"type": "error", "code": "invalid_message", "message": "JSON object required"}))
+                await sess.ws.send(_ERR_INVALID_MESSAGE)
             return
 
         mtype = str(msg.get("type", "")).strip()
@@ -291,13 +317,13 @@ class RelayGateway:
 
         if mtype == "ping":
             async with sess.send_lock:
-                await sess.ws.send(json.dumps({"type": "pong", "msg_id": msg_id}))
+                await sess.ws.send(json_codec.dumps({"type": "pong", "msg_id": msg_id}))
             return
 
         if mtype == "status":
             async with sess.send_lock:
                 await sess.ws.send(
-                    json.dumps(
+                    json_codec.dumps(
                         {
                             "type": "status",
                             "client_id": sess.client_id,
@@ -312,7 +338,7 @@ class RelayGateway:
         if mtype != "to_cloud":
             async with sess.send_lock:
                 await sess.ws.send(
-                    json.dumps(
+                    json_codec.dumps(
                         {
                             "type": "error",
                             "msg_id": msg_id,
@@ -327,19 +353,19 @@ class RelayGateway:
         data = msg.get("data") or {}
         if not event:
             async with sess.send_lock:
-                await sess.ws.send(json.dumps({"type": "error", "msg_id": msg_id, "code": "missing_event"}))
+                await sess.ws.send(json_codec.dumps({"type": "error", "msg_id": msg_id, "code": "missing_event"}))
             return
         if not msg_id:
             async with sess.send_lock:
-                await sess.ws.send(json.dumps({"type": "error", "code": "missing_msg_id", "message": "msg_id required"}))
+                await sess.ws.send(_ERR_MISSING_MSG_ID)
             return
         if not isinstance(data, dict):
             async with sess.send_lock:
-                await sess.ws.send(json.dumps({"type": "error", "msg_id": msg_id, "code": "invalid_data"}))
+                await sess.ws.send(json_codec.dumps({"type": "error", "msg_id": msg_id, "code": "invalid_data"}))
             return
 
         resp = await self._enqueue_to_cloud(sess.client_id, msg_id, event, data)
         self._messages_to_cloud += 1
         async with sess.send_lock:
-            await sess.ws.send(json.dumps(resp))
+            await sess.ws.send(json_codec.dumps(resp))
 
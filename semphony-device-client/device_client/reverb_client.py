@@ -7,6 +7,7 @@ Protocol summary:
 - Call auth endpoint (HTTP POST) with X-Client-Key to get auth + channel_data.
 - Subscribe to presence channel.
 - Send "client-heartbeat" every 10 seconds.
+- Optionally publish "client-telemetry" when SEM metrics change beyond their deadbands.
 - Listen for "server-command" and respond with "client-command-result".
 
 Credentials are intended to be provided through environment variables.
@@ -15,26 +16,32 @@ Credentials are intended to be provided through environment variables.
 from __future__ import annotations
 
 import asyncio
+import collections
 import contextlib
+import dataclasses
+import functools
 import io
 import json
 import logging
 import os
 import random
+import re
 import ssl
 import time
-import urllib.error
-import urllib.request
 from dataclasses import dataclass
-from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
 from urllib.parse import urlparse, urlunparse
-from uuid import uuid4
 
 # GUI automation imports removed - now handled by hardware controllers
 
 from .version import CLIENT_VERSION
 from .hardware import create_hardware_controller
+from .core import http_transport, json_codec
 from .core.command_executor import CommandExecutor
+from .core.file_uploader import AcquisitionUploadConfig, AcquisitionUploader
+from .core.outbox_journal import OutboxJournal, get_outbox_journal_dir
+from .core.telemetry import TelemetryTracker
+from .core.http_transport import HttpError
 
 logger = logging.getLogger(__name__)
 
@@ -76,6 +83,16 @@ class ReverbClientConfig:
     max_message_bytes: int = DEFAULT_MAX_MESSAGE_BYTES
     relay_outbox_max_total: int = 1000
     relay_outbox_max_per_client: int = 100
+    relay_outbox_journal: bool = True
+    relay_outbox_fsync_ms: float = 50.0
+    relay_outbox_segment_bytes: int = 4 * 1024 * 1024
+    relay_outbox_send_batch: int = 64
+    command_gui_queue_max: int = 8
+    command_read_queue_max: int = 16
+    command_read_workers: int = 2
+    file_upload_url: str = ""
+    telemetry_enabled: bool = False
+    telemetry_check_seconds: float = 1.0
 
     @staticmethod
     def from_env() -> "ReverbClientConfig":
@@ -88,6 +105,7 @@ class ReverbClientConfig:
         - REVERB_AUTH_URL (required): HTTP auth endpoint
         - REVERB_META_URL (optional): HTTP client meta endpoint (defaults to derived from REVERB_AUTH_URL)
         - REVERB_SCREENSHOT_UPLOAD_URL (optional): HTTP screenshot upload endpoint (defaults to derived from REVERB_AUTH_URL)
+        - REVERB_FILE_UPLOAD_URL (optional): HTTP file upload endpoint (defaults to derived from REVERB_AUTH_URL)
         - REVERB_CLIENT_KEY (required): value for X-Client-Key header
         - REVERB_CHANNEL (optional): default presence-client.1
         - REVERB_HEARTBEAT_SECONDS (optional): default 10
@@ -98,6 +116,17 @@ class ReverbClientConfig:
         - REVERB_MAX_MESSAGE_BYTES (optional): max WS message size (default 1 MiB)
         - RELAY_OUTBOX_MAX_TOTAL (optional): max total queued local->cloud messages (default 1000)
         - RELAY_OUTBOX_MAX_PER_CLIENT (optional): max queued local->cloud messages per client (default 100)
+        - RELAY_OUTBOX_JOURNAL (optional): set to "0" to keep queued local->cloud messages in memory only
+        - RELAY_OUTBOX_JOURNAL_DIR (optional): journal location (default data/outbox)
+        - RELAY_OUTBOX_FSYNC_MS (optional): max interval between journal fsyncs (default 50)
+        - RELAY_OUTBOX_SEGMENT_BYTES (optional): journal segment file size (default 4 MiB)
+        - RELAY_OUTBOX_SEND_BATCH (optional): max local->cloud messages written per batch (default 64)
+        - COMMAND_GUI_QUEUE_MAX (optional): max queued GUI commands before rejecting as busy (default 8)
+        - COMMAND_READ_QUEUE_MAX (optional): max queued read-only commands before rejecting as busy (default 16)
+        - COMMAND_READ_WORKERS (optional): worker threads for read-only commands (default 2)
+        - TELEMETRY_ENABLED (optional): set to "1" to push "client-telemetry" events
+        - TELEMETRY_CHECK_SECONDS (optional): how often metrics are checked for changes (default 1)
+        - TELEMETRY_DEADBANDS (optional): per-field thresholds, e.g. "stage=0.001,working_distance.wd=1e-6"
         """
         ws_url = os.getenv("REVERB_WS_URL")
         if not ws_url:
@@ -133,6 +162,10 @@ class ReverbClientConfig:
         if not screenshot_upload_url:
             screenshot_upload_url = _infer_screenshot_upload_url(auth_url)
 
+        file_upload_url = (os.getenv("REVERB_FILE_UPLOAD_URL") or "").strip()
+        if not file_upload_url:
+            file_upload_url = _infer_file_upload_url(auth_url)
+
         client_key = (os.getenv("REVERB_CLIENT_KEY") or "").strip()
         if not client_key:
             raise ValueError("Missing REVERB_CLIENT_KEY (X-Client-Key header value).")
@@ -147,6 +180,15 @@ class ReverbClientConfig:
         max_message_bytes = int(os.getenv("REVERB_MAX_MESSAGE_BYTES", str(DEFAULT_MAX_MESSAGE_BYTES)))
         relay_outbox_max_total = int(os.getenv("RELAY_OUTBOX_MAX_TOTAL", "1000"))
         relay_outbox_max_per_client = int(os.getenv("RELAY_OUTBOX_MAX_PER_CLIENT", "100"))
+        relay_outbox_journal = (os.getenv("RELAY_OUTBOX_JOURNAL", "1").strip() not in {"0", "false", "FALSE", "no", "NO"})
+        relay_outbox_fsync_ms = float(os.getenv("RELAY_OUTBOX_FSYNC_MS", "50"))
+        relay_outbox_segment_bytes = int(os.getenv("RELAY_OUTBOX_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+        relay_outbox_send_batch = max(1, int(os.getenv("RELAY_OUTBOX_SEND_BATCH", "64")))
+        command_gui_queue_max = int(os.getenv("COMMAND_GUI_QUEUE_MAX", "8"))
+        command_read_queue_max = int(os.getenv("COMMAND_READ_QUEUE_MAX", "16"))
+        command_read_workers = int(os.getenv("COMMAND_READ_WORKERS", "2"))
+        telemetry_enabled = (os.getenv("TELEMETRY_ENABLED", "").strip() in {"1", "true", "TRUE", "yes", "YES"})
+        telemetry_check_seconds = float(os.getenv("TELEMETRY_CHECK_SECONDS", "1"))
 
         # Some Pusher/Reverb frontends (and some edge/WAF setups) require an Origin header
         # matching the browser UI host. Allow forcing it; otherwise infer for semphoni.
@@ -179,6 +221,16 @@ class ReverbClientConfig:
             max_message_bytes=max_message_bytes,
             relay_outbox_max_total=relay_outbox_max_total,
             relay_outbox_max_per_client=relay_outbox_max_per_client,
+            relay_outbox_journal=relay_outbox_journal,
+            relay_outbox_fsync_ms=relay_outbox_fsync_ms,
+            relay_outbox_segment_bytes=relay_outbox_segment_bytes,
+            relay_outbox_send_batch=relay_outbox_send_batch,
+            command_gui_queue_max=command_gui_queue_max,
+            command_read_queue_max=command_read_queue_max,
+            command_read_workers=command_read_workers,
+            file_upload_url=file_upload_url,
+            telemetry_enabled=telemetry_enabled,
+            telemetry_check_seconds=telemetry_check_seconds,
         )
 
 
@@ -189,26 +241,12 @@ def _http_post_json(
     *,
     insecure_ssl: bool = False,
 ) -> Dict[str, Any]:
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=body,
-        headers={"Content-Type": "application/json", **headers},
-        method="POST",
-    )
     try:
-        ctx = None
-        if insecure_ssl and urlparse(url).scheme == "https":
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-
-        with urllib.request.urlopen(req, timeout=30, context=ctx) as resp:
-            resp_body = resp.read().decode("utf-8", errors="replace")
-            return json.loads(resp_body) if resp_body else {}
-    except urllib.error.HTTPError as e:
-        raw = e.read().decode("utf-8", errors="replace") if e.fp else ""
-        raise RuntimeError(f"Auth HTTP error {e.code}: {raw}") from e
+        resp = http_transport.post_json(url, headers, payload, insecure_ssl=insecure_ssl)
+    except HttpError as e:
+        raise RuntimeError(f"Auth HTTP error {e.status}: {e.body}") from e
+    _json_log("http_auth_done", status=resp.status, **resp.timings.as_dict())
+    return resp.json()
 
 
 def _http_get_json(
@@ -217,20 +255,12 @@ def _http_get_json(
     *,
     insecure_ssl: bool = False,
 ) -> Dict[str, Any]:
-    req = urllib.request.Request(url, headers=headers, method="GET")
     try:
-        ctx = None
-        if insecure_ssl and urlparse(url).scheme == "https":
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-
-        with urllib.request.urlopen(req, timeout=30, context=ctx) as resp:
-            resp_body = resp.read().decode("utf-8", errors="replace")
-            return json.loads(resp_body) if resp_body else {}
-    except urllib.error.HTTPError as e:
-        raw = e.read().decode("utf-8", errors="replace") if e.fp else ""
-        raise RuntimeError(f"Meta HTTP error {e.code}: {raw}") from e
+        resp = http_transport.get_json(url, headers, insecure_ssl=insecure_ssl)
+    except HttpError as e:
+        raise RuntimeError(f"Meta HTTP error {e.status}: {e.body}") from e
+    _json_log("http_meta_done", status=resp.status, **resp.timings.as_dict())
+    return resp.json()
 
 
 def _http_post_multipart(
@@ -238,58 +268,16 @@ def _http_post_multipart(
     headers: Dict[str, str],
     *,
     fields: Dict[str, str],
-    files: Dict[str, Tuple[str, bytes, str]],
+    files: Dict[str, Tuple[str, Any, str]],
     insecure_ssl: bool = False,
 ) -> Dict[str, Any]:
-    boundary = "----semphony-" + uuid4().hex
-
-    body = bytearray()
-    crlf = b"\r\n"
-
-    def write_line(line: bytes) -> None:
-        body.extend(line)
-        body.extend(crlf)
-
-    for name, value in fields.items():
-        write_line(f"--{boundary}".encode("utf-8"))
-        write_line(f'Content-Disposition: form-data; name="{name}"'.encode("utf-8"))
-        write_line(b"")
-        write_line(value.encode("utf-8"))
-
-    for name, (filename, content, content_type) in files.items():
-        write_line(f"--{boundary}".encode("utf-8"))
-        write_line(
-            f'Content-Disposition: form-data; name="{name}"; filename="{filename}"'.encode("utf-8")
-        )
-        write_line(f"Content-Type: {content_type}".encode("utf-8"))
-        write_line(b"")
-        body.extend(content)
-        body.extend(crlf)
-
-    write_line(f"--{boundary}--".encode("utf-8"))
-
-    req = urllib.request.Request(
-        url,
-        data=bytes(body),
-        headers={
-            "Content-Type": f"multipart/form-data; boundary={boundary}",
-            **headers,
-        },
-        method="POST",
-    )
     try:
-        ctx = None
-        if insecure_ssl and urlparse(url).scheme == "https":
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-
-        with urllib.request.urlopen(req, timeout=60, context=ctx) as resp:
-            resp_body = resp.read().decode("utf-8", errors="replace")
-            return json.loads(resp_body) if resp_body else {}
-    except urllib.error.HTTPError as e:
-        raw = e.read().decode("utf-8", errors="replace") if e.fp else ""
-        raise RuntimeError(f"Upload HTTP error {e.code}: {raw}") from e
+        resp = http_transport.post_multipart(
+            url, headers, fields=fields, files=files, insecure_ssl=insecure_ssl, timeout_s=60
+        )
+    except HttpError as e:
+        raise RuntimeError(f"Upload HTTP error {e.status}: {e.body}") from e
+    return resp.json()
 
 
 def _infer_meta_url(auth_url: str) -> str:
@@ -332,6 +320,26 @@ def _infer_screenshot_upload_url(auth_url: str) -> str:
     return urlunparse((p.scheme, p.netloc, path, "", "", ""))
 
 
+def _infer_file_upload_url(auth_url: str) -> str:
+    """
+    Infer the Laravel file upload endpoint from the known auth endpoint.
+
+    Example:
+      /client/broadcasting/auth  ->  /client/files
+    """
+    p = urlparse(auth_url)
+    if not p.scheme or not p.netloc:
+        return auth_url
+
+    path = p.path or ""
+    if path.endswith("/client/broadcasting/auth"):
+        path = path[: -len("/client/broadcasting/auth")] + "/client/files"
+    else:
+        path = "/client/files"
+
+    return urlunparse((p.scheme, p.netloc, path, "", "", ""))
+
+
 def warn_if_client_version_mismatch(cfg: ReverbClientConfig) -> None:
     """
     Best-effort version check against the server-declared expected client version.
@@ -438,7 +446,7 @@ def _parse_pusher_data_field(data: Any) -> Any:
     # Pusher often encodes `data` as a JSON string.
     if isinstance(data, str):
         try:
-            return json.loads(data)
+            return json_codec.loads(data)
         except Exception:
             return data
     return data
@@ -447,22 +455,35 @@ def _parse_pusher_data_field(data: Any) -> Any:
 # _execute_command removed - now handled by CommandExecutor
 
 
-async def _send_json(ws, obj: Dict[str, Any]) -> None:
+def _encode_frame(obj: Dict[str, Any]) -> str:
     # Reverb/Pusher wire format commonly uses `data` as a JSON string.
     # Incoming messages may encode `data` as a string; we parse it via `_parse_pusher_data_field`.
     # For maximum compatibility (and to avoid "silent drops" on large payloads), encode
     # outgoing `data` when it is a dict/list.
+    data = obj.get("data")
+    if data is None or isinstance(data, str):
+        return json_codec.dumps(obj)
     out = dict(obj)
-    data = out.get("data")
-    if data is not None and not isinstance(data, str):
-        out["data"] = json.dumps(data, separators=(",", ":"))
-    await ws.send(json.dumps(out, separators=(",", ":")))
+    out["data"] = json_codec.dumps(data)
+    return json_codec.dumps(out)
+
+
+@functools.lru_cache(maxsize=64)
+def _frame_head(event: str, channel: str) -> json_codec.FrameHead:
+    return json_codec.FrameHead(event, channel)
+
+
+_PONG_FRAME = _encode_frame({"event": "pusher:pong", "data": {}})
+
+
+async def _send_json(ws, obj: Dict[str, Any]) -> None:
+    await ws.send(_encode_frame(obj))
 
 
 async def _await_connection_established(ws) -> str:
     while True:
         raw = await ws.recv()
-        msg = json.loads(raw)
+        msg = json_codec.loads(raw)
         if msg.get("event") == "pusher:connection_established":
             data = _parse_pusher_data_field(msg.get("data"))
             if isinstance(data, dict) and data.get("socket_id"):
@@ -476,7 +497,9 @@ async def _subscribe(ws, cfg: ReverbClientConfig, socket_id: str) -> None:
         try:
             if auth_url != cfg.auth_url:
                 logger.info("Retrying auth via %s", auth_url)
-            auth_resp = _http_post_json(
+            # Off the event loop: a busy connection pool must not stall pings and relay traffic.
+            auth_resp = await asyncio.to_thread(
+                _http_post_json,
                 auth_url,
                 headers={"X-Client-Key": cfg.client_key},
                 payload={"socket_id": socket_id, "channel_name": cfg.channel},
@@ -508,139 +531,285 @@ async def _subscribe(ws, cfg: ReverbClientConfig, socket_id: str) -> None:
     raise RuntimeError(f"Failed to authenticate/subscribe using {cfg.auth_url}") from last_err
 
 
-async def _heartbeat_loop(ws, cfg: ReverbClientConfig) -> None:
+async def _heartbeat_loop(ws, cfg: ReverbClientConfig, telemetry: Optional[TelemetryTracker] = None) -> None:
+    head = _frame_head("client-heartbeat", cfg.channel)
     while True:
         await asyncio.sleep(cfg.heartbeat_seconds)
         ts = int(time.time())
-        await _send_json(
-            ws,
-            {
-                "event": "client-heartbeat",
-                "channel": cfg.channel,
-                "data": {"ts": ts, "version": cfg.version},
-            },
-        )
+        data: Dict[str, Any] = {"ts": ts, "version": cfg.version}
+        if telemetry is not None:
+            # Fixed-cadence telemetry rides on the heartbeat instead of a separate event.
+            latest = telemetry.take_latest()
+            if latest is not None:
+                data["telemetry"] = latest
+        await ws.send(head.encode(data))
         if cfg.log_heartbeats:
             logger.info("Sent heartbeat ts=%s channel=%s", ts, cfg.channel)
 
 
+async def _telemetry_loop(
+    ws,
+    cfg: ReverbClientConfig,
+    command_executor: CommandExecutor,
+    telemetry: TelemetryTracker,
+) -> None:
+    """Publish `client-telemetry` whenever a metrics field moves beyond its deadband."""
+    head = _frame_head("client-telemetry", cfg.channel)
+    while True:
+        await asyncio.sleep(cfg.telemetry_check_seconds)
+        try:
+            # Served from the hardware's polled snapshot; only blocks if that is stale.
+            metrics = await asyncio.to_thread(command_executor.hardware.get_metrics)
+        except Exception as e:
+            _json_log("telemetry_read_failed", error=str(e))
+            continue
+        if not metrics.get("supported", False):
+            continue
+        publish, changed = telemetry.observe(metrics)
+        if not publish:
+            continue
+        await ws.send(head.encode({"ts": time.time(), "changed": changed, "metrics": metrics}))
+
+
 def _inject_relay(data: Dict[str, Any], *, client_id: str, msg_id: str) -> Dict[str, Any]:
     out = dict(data)
     out["relay"] = {"client_id": client_id, "msg_id": msg_id}
     return out
 
 
-def _extract_and_strip_relay(data: Dict[str, Any]) -> Tuple[Optional[str], str, Dict[str, Any]]:
-    relay = data.get("relay")
+def _relay_route(relay: Any) -> Tuple[Optional[str], str]:
     if not isinstance(relay, dict):
-        return None, "", data
+        return None, ""
     client_id = str(relay.get("client_id", "")).strip() or None
     msg_id = str(relay.get("msg_id", "")).strip()
-    stripped = dict(data)
-    stripped.pop("relay", None)
-    return client_id, msg_id, stripped
+    return client_id, msg_id
 
 
-async def _cloud_message_loop(ws, cfg: ReverbClientConfig, relay_gateway: Optional[Any]) -> None:
-    async for raw in ws:
-        try:
-            msg = json.loads(raw)
-        except Exception:
-            logger.warning("Non-JSON WS message: %r", raw)
-            continue
+def _extract_and_strip_relay(data: Dict[str, Any]) -> Tuple[Optional[str], str, Dict[str, Any]]:
+    # `data` was just decoded from the frame and has no other owner: strip in place.
+    relay = data.get("relay")
+    client_id, msg_id = _relay_route(relay)
+    if isinstance(relay, dict):
+        del data["relay"]
+    return client_id, msg_id, data
 
-        event = msg.get("event")
 
-        # Keep-alive (Pusher protocol)
-        if event == "pusher:ping":
-            await _send_json(ws, {"event": "pusher:pong", "data": {}})
-            continue
+_RELAY_FIRST_RE = re.compile(r'\s*\{\s*"relay"\s*:\s*')
+_COLON_RE = re.compile(r"\s*:\s*")
+_raw_decode = json.JSONDecoder().raw_decode
 
-        if event == "pusher:error":
-            logger.error("pusher:error: %s", msg.get("data"))
-            continue
 
-        if event != "server-command":
-            # Useful during early integration to see what's coming in.
-            logger.debug("WS event: %s", event)
-            continue
+def _split_relay_json(data_json: str) -> Optional[Tuple[Any, str]]:
+    """
+    Cut the top-level `relay` member out of a JSON object's text.
 
-        data = _parse_pusher_data_field(msg.get("data"))
-        if not isinstance(data, dict):
-            logger.warning("server-command with unexpected data: %r", data)
-            continue
+    The remaining text decodes to the same value as `_extract_and_strip_relay`
+    leaves, so LAN clients get the same `data` on the pass-through and decoding
+    paths. Only the relay value itself is decoded; the rest of the payload is
+    never turned into Python objects.
 
-        logger.info("Received server-command")
+    Returns:
+        (relay value, object text without `relay`), or None unless `relay` is
+        the object's first or last member (the caller then decodes the whole
+        object instead)
 
-        relay_client_id, relay_msg_id, stripped = _extract_and_strip_relay(data)
-        if relay_gateway is not None and relay_client_id:
-            routed = await relay_gateway.send_from_cloud(
-                relay_client_id,
-                msg_id=relay_msg_id,
-                event="server-command",
-                data=stripped,
-            )
-            if not routed:
-                _json_log(
-                    "cloud_to_local_route_failed",
-                    client_id=relay_client_id,
-                    relay_msg_id=relay_msg_id,
-                )
-                # Don't fail silently: report back to cloud so the UI can surface it.
-                correlation_id = str(stripped.get("correlation_id", ""))
-                command_name = str(stripped.get("command_name", ""))
-                await _send_json(
-                    ws,
-                    {
-                        "event": "client-command-result",
-                        "channel": cfg.channel,
-                        "data": {
-                            "correlation_id": correlation_id,
-                            "command_name": command_name,
-                            "ok": False,
-                            "message": f"Relay client not connected: {relay_client_id}",
-                        },
-                    },
-                )
-            continue
+    Raises:
+        ValueError: If the relay value is not valid JSON
+    """
+    m = _RELAY_FIRST_RE.match(data_json)
+    if m:
+        relay, end = _raw_decode(data_json, m.end())
+        rest = data_json[end:].lstrip()
+        if rest.startswith(","):
+            return relay, "{" + rest[1:]
+        return (relay, "{" + rest) if rest.startswith("}") else None
+
+    start = data_json.rfind('"relay"')
+    head = data_json[:start].rstrip()
+    # After a comma the quote is unescaped, so this is a key; it is top-level
+    # when its value is followed only by the closing brace of the object.
+    if start < 0 or not head.endswith(",") or not head.lstrip().startswith("{"):
+        return None
+    m = _COLON_RE.match(data_json, start + len('"relay"'))
+    if not m:
+        return None
+    relay, end = _raw_decode(data_json, m.end())
+    if data_json[end:].strip() != "}":
+        return None
+    return relay, head[:-1] + "}"
+
+
+async def _report_relay_route_miss(ws, cfg: ReverbClientConfig, client_id: str, msg_id: str, data: Any) -> None:
+    _json_log(
+        "cloud_to_local_route_failed",
+        client_id=client_id,
+        relay_msg_id=msg_id,
+    )
+    # Don't fail silently: report back to cloud so the UI can surface it.
+    if not isinstance(data, dict):
+        data = {}
+    await ws.send(
+        _frame_head("client-command-result", cfg.channel).encode(
+            {
+                "correlation_id": str(data.get("correlation_id", "")),
+                "command_name": str(data.get("command_name", "")),
+                "ok": False,
+                "message": f"Relay client not connected: {client_id}",
+            }
+        )
+    )
 
-        correlation_id = str(stripped.get("correlation_id", ""))
-        command_name = str(stripped.get("command_name", ""))
-        payload = stripped.get("payload") or {}
-        if not isinstance(payload, dict):
-            payload = {}
 
-        ok, message, result_payload = command_executor.execute(
+async def _run_command_and_report(
+    ws,
+    cfg: ReverbClientConfig,
+    command_executor: CommandExecutor,
+    *,
+    correlation_id: str,
+    command_name: str,
+    payload: Dict[str, Any],
+) -> None:
+    # The command itself runs on the executor's worker thread; this task only awaits
+    # its future, so pings, heartbeats and relay routing keep flowing meanwhile.
+    outcome = await asyncio.wrap_future(
+        command_executor.submit(
             command_name,
             payload,
             screenshot_upload_url=cfg.screenshot_upload_url,
             client_key=cfg.client_key,
             insecure_ssl=cfg.insecure_ssl,
         )
-        result_data: Dict[str, Any] = {
-            "correlation_id": correlation_id,
-            "command_name": command_name,
-            "ok": bool(ok),
-            "message": message,
-        }
-        if result_payload is not None:
-            result_data["payload"] = result_payload
-        await _send_json(
-            ws,
-            {
-                "event": "client-command-result",
-                "channel": cfg.channel,
-                "data": {
-                    **result_data,
-                },
-            },
+    )
+    result_data: Dict[str, Any] = {
+        "correlation_id": correlation_id,
+        "command_name": command_name,
+        "ok": outcome.ok,
+        "message": outcome.message,
+        "timing": outcome.timing(),
+    }
+    if outcome.result is not None:
+        result_data["payload"] = outcome.result
+    try:
+        await ws.send(_frame_head("client-command-result", cfg.channel).encode(result_data))
+    except Exception as e:
+        _json_log(
+            "command_result_send_failed",
+            command=command_name,
+            correlation_id=correlation_id,
+            error=str(e),
         )
-        logger.info("Sent client-command-result ok=%s command=%s", bool(ok), command_name)
+        return
+    _json_log(
+        "command_done",
+        command=command_name,
+        correlation_id=correlation_id,
+        ok=outcome.ok,
+        queue_ms=outcome.queue_ms,
+        run_ms=outcome.run_ms,
+    )
+
 
-    # If we reach here, the websocket iterator ended, meaning the connection closed.
-    # Treat this as a disconnect so the outer retry loop applies backoff instead of
-    # reconnecting in a tight loop (e.g. during Reverb restarts).
-    raise RuntimeError("Cloud WebSocket closed")
+async def _cloud_message_loop(
+    ws,
+    cfg: ReverbClientConfig,
+    relay_gateway: Optional[Any],
+    command_executor: CommandExecutor,
+) -> None:
+    command_tasks: Set[asyncio.Task] = set()
+    try:
+        async for raw in ws:
+            try:
+                msg = json_codec.loads(raw)
+            except Exception:
+                logger.warning("Non-JSON WS message: %r", raw)
+                continue
+
+            event = msg.get("event")
+
+            # Keep-alive (Pusher protocol)
+            if event == "pusher:ping":
+                await ws.send(_PONG_FRAME)
+                continue
+
+            if event == "pusher:error":
+                logger.error("pusher:error: %s", msg.get("data"))
+                continue
+
+            if event != "server-command":
+                # Useful during early integration to see what's coming in.
+                logger.debug("WS event: %s", event)
+                continue
+
+            raw_data = msg.get("data")
+            if relay_gateway is not None and isinstance(raw_data, str) and '"relay"' in raw_data:
+                # Pass-through: read only the routing envelope and forward the
+                # payload text with the envelope cut out, without decoding it here.
+                try:
+                    split = _split_relay_json(raw_data)
+                except ValueError:
+                    split = None
+                relay_client_id, relay_msg_id = _relay_route(split[0]) if split else (None, "")
+                if split and relay_client_id:
+                    data_json = split[1]
+                    logger.info("Received server-command")
+                    routed = await relay_gateway.forward_from_cloud(
+                        relay_client_id,
+                        msg_id=relay_msg_id,
+                        event="server-command",
+                        data_json=data_json,
+                    )
+                    if not routed:
+                        await _report_relay_route_miss(
+                            ws, cfg, relay_client_id, relay_msg_id, _parse_pusher_data_field(raw_data)
+                        )
+                    continue
+
+            data = _parse_pusher_data_field(raw_data)
+            if not isinstance(data, dict):
+                logger.warning("server-command with unexpected data: %r", data)
+                continue
+
+            logger.info("Received server-command")
+
+            relay_client_id, relay_msg_id, stripped = _extract_and_strip_relay(data)
+            if relay_gateway is not None and relay_client_id:
+                routed = await relay_gateway.send_from_cloud(
+                    relay_client_id,
+                    msg_id=relay_msg_id,
+                    event="server-command",
+                    data=stripped,
+                )
+                if not routed:
+                    await _report_relay_route_miss(ws, cfg, relay_client_id, relay_msg_id, stripped)
+                continue
+
+            correlation_id = str(stripped.get("correlation_id", ""))
+            command_name = str(stripped.get("command_name", ""))
+            payload = stripped.get("payload") or {}
+            if not isinstance(payload, dict):
+                payload = {}
+
+            task = asyncio.create_task(
+                _run_command_and_report(
+                    ws,
+                    cfg,
+                    command_executor,
+                    correlation_id=correlation_id,
+                    command_name=command_name,
+                    payload=payload,
+                )
+            )
+            command_tasks.add(task)
+            task.add_done_callback(command_tasks.discard)
+
+        # If we reach here, the websocket iterator ended, meaning the connection closed.
+        # Treat this as a disconnect so the outer retry loop applies backoff instead of
+        # reconnecting in a tight loop (e.g. during Reverb restarts).
+        raise RuntimeError("Cloud WebSocket closed")
+    finally:
+        # Results for in-flight commands can no longer be delivered on this socket.
+        for task in list(command_tasks):
+            task.cancel()
 
 
 @dataclass(frozen=True)
@@ -648,67 +817,184 @@ class CloudOutboxItem:
     client_id: str
     msg_id: str
     frame: Dict[str, Any]
+    seq: int = 0  # journal sequence number (0 when not journaled)
 
 
 class CloudOutbox:
-    def __init__(self, *, max_total: int, max_per_client: int) -> None:
-        self.queue: asyncio.Queue[CloudOutboxItem] = asyncio.Queue(maxsize=max_total)
+    """
+    Local->cloud relay messages, queued per client and sent round-robin.
+
+    Each client has its own FIFO and its own limit, and the sender takes one
+    message per client in turn: a client flooding the relay only delays its
+    own messages, never another worker's command results.
+
+    All state is touched from the event loop only and no method awaits while
+    changing it, so no lock is needed.
+    """
+
+    def __init__(self, *, max_total: int, max_per_client: int, journal: Optional[OutboxJournal] = None) -> None:
+        self._max_total = max_total
         self._max_per_client = max_per_client
+        self._queues: Dict[str, Deque[CloudOutboxItem]] = {}
+        self._ready: Deque[str] = collections.deque()  # clients with queued messages, in send order
+        self._queued = 0
+        # Counts queued plus in-flight messages (until `mark_done`).
         self._pending_by_client: Dict[str, int] = {}
-        self._lock = asyncio.Lock()
-
-    async def try_put(self, item: CloudOutboxItem) -> Tuple[bool, str]:
-        async with self._lock:
-            if self.queue.full():
-                return False, "queue_full"
-            pending = self._pending_by_client.get(item.client_id, 0)
-            if pending >= self._max_per_client:
-                return False, "client_queue_full"
-            self.queue.put_nowait(item)
-            self._pending_by_client[item.client_id] = pending + 1
-            return True, "ok"
-
-    async def mark_done(self, client_id: str) -> None:
-        async with self._lock:
-            pending = self._pending_by_client.get(client_id, 0)
-            if pending <= 1:
-                self._pending_by_client.pop(client_id, None)
+        self._not_empty = asyncio.Event()
+        self.journal = journal
+
+    def qsize(self) -> int:
+        return self._queued
+
+    def _enqueue(self, item: CloudOutboxItem, *, front: bool = False) -> None:
+        q = self._queues.get(item.client_id)
+        if q is None:
+            q = self._queues[item.client_id] = collections.deque()
+        elif front:
+            # Requeued messages go out first, so their client moves to the head too.
+            self._ready.remove(item.client_id)
+        if front:
+            q.appendleft(item)
+            self._ready.appendleft(item.client_id)
+        else:
+            if not q:
+                self._ready.append(item.client_id)
+            q.append(item)
+        self._queued += 1
+        self._not_empty.set()
+
+    async def get(self) -> CloudOutboxItem:
+        """Wait for the next message, taking clients in turn."""
+        while not self._ready:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        client_id = self._ready.popleft()
+        q = self._queues[client_id]
+        item = q.popleft()
+        if q:
+            self._ready.append(client_id)
+        else:
+            del self._queues[client_id]
+        self._queued -= 1
+        return item
+
+    def get_ready(self, limit: int) -> List[CloudOutboxItem]:
+        """Take up to `limit` queued messages without waiting, in the same order as `get`."""
+        items: List[CloudOutboxItem] = []
+        while self._ready and len(items) < limit:
+            client_id = self._ready.popleft()
+            q = self._queues[client_id]
+            items.append(q.popleft())
+            if q:
+                self._ready.append(client_id)
             else:
-                self._pending_by_client[client_id] = pending - 1
+                del self._queues[client_id]
+        self._queued -= len(items)
+        return items
 
-    async def drop(self, client_id: str) -> None:
-        # Alias for mark_done, but semantically used when we discard a queued item.
-        await self.mark_done(client_id)
+    def restore(self) -> int:
+        """
+        Queue the messages left in the journal by a previous run.
 
-    async def requeue_existing(self, item: CloudOutboxItem) -> bool:
-        # Re-queue without touching per-client counters (already accounted for).
+        Returns:
+            Number of messages restored
+        """
+        if self.journal is None:
+            return 0
         try:
-            self.queue.put_nowait(item)
-            return True
-        except Exception:
-            return False
+            messages = self.journal.replay()
+        except OSError as e:
+            self._journal_failed(e)
+            return 0
+        restored = 0
+        for msg in messages:
+            if self._queued >= self._max_total:
+                # RELAY_OUTBOX_MAX_TOTAL was lowered since; the oldest messages win.
+                _json_log("cloud_outbox_replay_drop", client_id=msg.client_id, msg_id=msg.msg_id)
+                self._journal_ack(msg.seq)
+                continue
+            item = CloudOutboxItem(client_id=msg.client_id, msg_id=msg.msg_id, frame=msg.frame, seq=msg.seq)
+            self._enqueue(item)
+            self._pending_by_client[item.client_id] = self._pending_by_client.get(item.client_id, 0) + 1
+            restored += 1
+        if messages:
+            _json_log("cloud_outbox_replayed", restored=restored, **self.journal.stats())
+        return restored
+
+    def _journal_failed(self, error: BaseException) -> None:
+        # Keep relaying from memory rather than rejecting messages.
+        _json_log("cloud_outbox_journal_disabled", error=str(error))
+        journal, self.journal = self.journal, None
+        if journal is not None:
+            with contextlib.suppress(Exception):
+                journal.close()
+
+    def _journal_ack(self, seq: int) -> None:
+        if self.journal is None or not seq:
+            return
+        try:
+            self.journal.ack(seq)
+        except OSError as e:
+            self._journal_failed(e)
+
+    def try_put(self, item: CloudOutboxItem) -> Tuple[bool, str]:
+        pending = self._pending_by_client.get(item.client_id, 0)
+        if pending >= self._max_per_client:
+            return False, "client_queue_full"
+        if self._queued >= self._max_total:
+            return False, "queue_full"
+        if self.journal is not None:
+            try:
+                item = dataclasses.replace(item, seq=self.journal.append(item.client_id, item.msg_id, item.frame))
+            except OSError as e:
+                self._journal_failed(e)
+        self._enqueue(item)
+        self._pending_by_client[item.client_id] = pending + 1
+        return True, "ok"
+
+    def mark_done(self, item: CloudOutboxItem) -> None:
+        self._journal_ack(item.seq)
+        pending = self._pending_by_client.get(item.client_id, 0)
+        if pending <= 1:
+            self._pending_by_client.pop(item.client_id, None)
+        else:
+            self._pending_by_client[item.client_id] = pending - 1
+
+    def drop(self, item: CloudOutboxItem) -> None:
+        # Alias for mark_done, but semantically used when we discard a queued item.
+        self.mark_done(item)
+
+    def requeue_existing(self, item: CloudOutboxItem) -> None:
+        # Back to the head of its client's queue, and that client to the head of
+        # the rotation, without touching per-client counters (already accounted
+        # for). Requeueing a batch in reverse restores its original send order.
+        self._enqueue(item, front=True)
+
+    def close(self) -> None:
+        if self.journal is not None:
+            self.journal.close()
 
 
-async def _cloud_sender_loop(ws: Any, outbox: CloudOutbox) -> None:
+async def _cloud_sender_loop(ws: Any, outbox: CloudOutbox, *, batch_max: int = 64) -> None:
     while True:
-        item = await outbox.queue.get()
+        # A relay burst is sent as one batch: everything ready is encoded in one
+        # pass, then written back to back (Pusher allows one event per frame).
+        batch = [await outbox.get()]
+        batch.extend(outbox.get_ready(batch_max - 1))
+        sent = 0
         try:
-            await _send_json(ws, item.frame)
-            await outbox.mark_done(item.client_id)
-        except Exception as e:
-            # Best-effort requeue of the in-flight item (so reconnect can deliver it).
-            requeued = await outbox.requeue_existing(item)
-            if not requeued:
-                await outbox.drop(item.client_id)
-                _json_log(
-                    "cloud_outbox_drop_inflight",
-                    client_id=item.client_id,
-                    msg_id=item.msg_id,
-                    error=str(e),
-                )
+            payloads = [_encode_frame(item.frame) for item in batch]
+            for payload in payloads:
+                await ws.send(payload)
+                sent += 1
+        except BaseException:
+            # Requeue the unsent items so the reconnected session delivers them first.
+            for item in reversed(batch[sent:]):
+                outbox.requeue_existing(item)
             raise
         finally:
-            outbox.queue.task_done()
+            for item in batch[:sent]:
+                outbox.mark_done(item)
 
 
 async def _connect_and_run_cloud_session(
@@ -767,14 +1053,24 @@ async def _connect_and_run_cloud_session(
                 await _subscribe(ws, cfg, socket_id)
                 _json_log("cloud_ws_subscribed", channel=cfg.channel)
 
-                hb_task = asyncio.create_task(_heartbeat_loop(ws, cfg))
-                sender_task = asyncio.create_task(_cloud_sender_loop(ws, outbox))
+                telemetry = TelemetryTracker.from_env() if cfg.telemetry_enabled else None
+                hb_task = asyncio.create_task(_heartbeat_loop(ws, cfg, telemetry))
+                sender_task = asyncio.create_task(
+                    _cloud_sender_loop(ws, outbox, batch_max=cfg.relay_outbox_send_batch)
+                )
+                telemetry_task: Optional[asyncio.Task] = None
+                if telemetry is not None:
+                    telemetry_task = asyncio.create_task(_telemetry_loop(ws, cfg, command_executor, telemetry))
                 try:
-                    await _cloud_message_loop(ws, cfg, relay_gateway)
+                    await _cloud_message_loop(ws, cfg, relay_gateway, command_executor)
                 finally:
                     cloud_connected.clear()
                     hb_task.cancel()
                     sender_task.cancel()
+                    if telemetry_task is not None:
+                        telemetry_task.cancel()
+                        with contextlib.suppress(Exception, asyncio.CancelledError):
+                            await telemetry_task
                     with contextlib.suppress(Exception):
                         await hb_task
                     with contextlib.suppress(Exception):
@@ -828,13 +1124,31 @@ async def _run_reverb_client_with_local_relay(cfg: ReverbClientConfig) -> None:
     try:
         hardware_controller = create_hardware_controller()
         hardware_controller.initialize()
-        command_executor = CommandExecutor(hardware_controller)
+        command_executor = CommandExecutor(
+            hardware_controller,
+            gui_queue_max=cfg.command_gui_queue_max,
+            read_queue_max=cfg.command_read_queue_max,
+            read_workers=cfg.command_read_workers,
+        )
         logger.info("Hardware controller initialized: %s", hardware_controller.hardware_name)
     except Exception as e:
         logger.error("Failed to initialize hardware controller: %s", e)
         raise
     cloud_connected = asyncio.Event()
-    outbox = CloudOutbox(max_total=cfg.relay_outbox_max_total, max_per_client=cfg.relay_outbox_max_per_client)
+    journal: Optional[OutboxJournal] = None
+    if cfg.relay_outbox_journal:
+        journal = OutboxJournal(
+            get_outbox_journal_dir(),
+            segment_bytes=cfg.relay_outbox_segment_bytes,
+            fsync_interval_s=cfg.relay_outbox_fsync_ms / 1000.0,
+        )
+    outbox = CloudOutbox(
+        max_total=cfg.relay_outbox_max_total,
+        max_per_client=cfg.relay_outbox_max_per_client,
+        journal=journal,
+    )
+    # Messages relayed before a crash or restart go out first once the cloud is back.
+    outbox.restore()
 
     relay_gateway: Optional[Any] = None
     try:
@@ -848,7 +1162,7 @@ async def _run_reverb_client_with_local_relay(cfg: ReverbClientConfig) -> None:
                 "channel": cfg.channel,
                 "data": _inject_relay(data, client_id=client_id, msg_id=msg_id),
             }
-            ok, reason = await outbox.try_put(CloudOutboxItem(client_id=client_id, msg_id=msg_id, frame=frame))
+            ok, reason = outbox.try_put(CloudOutboxItem(client_id=client_id, msg_id=msg_id, frame=frame))
             if not ok:
                 return {
                     "type": "error",
@@ -880,13 +1194,35 @@ async def _run_reverb_client_with_local_relay(cfg: ReverbClientConfig) -> None:
         relay_gateway = None
         _json_log("local_relay_start_failed", error=str(e))
 
-    await _cloud_connect_forever(
-        cfg,
-        relay_gateway=relay_gateway,
-        outbox=outbox,
-        cloud_connected=cloud_connected,
-        command_executor=command_executor,
-    )
+    acquisition_uploader: Optional[AcquisitionUploader] = None
+    upload_cfg = AcquisitionUploadConfig.from_env()
+    if upload_cfg.watch_dirs:
+        try:
+            acquisition_uploader = AcquisitionUploader(
+                upload_cfg,
+                upload_url=cfg.file_upload_url,
+                client_key=cfg.client_key,
+                insecure_ssl=cfg.insecure_ssl,
+            )
+            acquisition_uploader.start()
+        except Exception as e:
+            acquisition_uploader = None
+            _json_log("acquisition_uploader_start_failed", error=str(e))
+
+    try:
+        await _cloud_connect_forever(
+            cfg,
+            relay_gateway=relay_gateway,
+            outbox=outbox,
+            cloud_connected=cloud_connected,
+            command_executor=command_executor,
+        )
+    finally:
+        if acquisition_uploader is not None:
+            acquisition_uploader.stop()
+        command_executor.shutdown()
+        outbox.close()
+        http_transport.get_transport().close()
 
 
 def run_reverb_client_forever() -> None:
@@ -1,6 +1,8 @@
 """
 Mouse and keyboard control API routes.
 """
+import time
+
 from flask import Blueprint, request, jsonify, current_app
 import pyautogui
 from ..auth import require_password
@@ -52,7 +54,29 @@ def metrics():
     if not hardware_controller:
         return jsonify({"error": "Hardware controller not initialized"}), 500
     
-    m = hardware_controller.get_metrics()
+    max_age_s = request.args.get("max_age_s", type=float)
+    m = hardware_controller.get_metrics(max_age_s=max_age_s)
     status = 200 if m.get("supported", False) else 503
     return jsonify(m), status
 
+
+@bp.route("/metrics/history", methods=["GET"])
+@require_password
+def metrics_history():
+    """
+    Return downsampled metric history (min/max/mean buckets).
+
+    This mirrors the Reverb "get_metrics_history" server-command.
+    """
+    hardware_controller = current_app.config.get('hardware_controller')
+    if not hardware_controller:
+        return jsonify({"error": "Hardware controller not initialized"}), 500
+
+    end = request.args.get("end", type=float) or time.time()
+    start = request.args.get("start", type=float) or end - (request.args.get("since_s", type=float) or 600.0)
+    buckets = max(1, min(1000, request.args.get("buckets", default=120, type=int)))
+    fields = request.args.getlist("field") or None
+    h = hardware_controller.get_metrics_history(start, end, buckets=buckets, fields=fields)
+    status = 200 if h.get("supported", False) else 503
+    return jsonify(h), status
+
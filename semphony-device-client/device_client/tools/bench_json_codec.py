@@ -0,0 +1,145 @@
+"""
+Micro-benchmark for the WebSocket JSON codec.
+
+Usage:
+  python -m device_client.tools.bench_json_codec [--number 20000]
+  JSON_CODEC=stdlib python -m device_client.tools.bench_json_codec
+
+Times the per-frame JSON work on the hot paths, previous code (stdlib
+`json.loads`/`json.dumps`, dict copies) against `core.json_codec` with the
+backend it selected (orjson or msgspec when installed):
+- decoding a relayed `server-command` and stripping its relay envelope
+- encoding a `client-command-result`
+- decoding a LAN relay `to_cloud` message and encoding its ack
+- relaying a `server-command` with a large payload to a LAN client
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+from typing import Any, Dict
+
+from ..core import json_codec
+from ..reverb_client import (
+    _extract_and_strip_relay,
+    _frame_head,
+    _parse_pusher_data_field,
+    _relay_route,
+    _split_relay_json,
+)
+
+_CHANNEL = "presence-client.1"
+
+
+def _reference_inbound(raw: str) -> Dict[str, Any]:
+    msg = json.loads(raw)
+    data = msg.get("data")
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except Exception:
+            pass
+    relay = data.get("relay")
+    if not isinstance(relay, dict):
+        return data
+    str(relay.get("client_id", "")).strip()
+    str(relay.get("msg_id", "")).strip()
+    stripped = dict(data)
+    stripped.pop("relay", None)
+    return stripped
+
+
+def _codec_inbound(raw: str) -> Dict[str, Any]:
+    data = _parse_pusher_data_field(json_codec.loads(raw).get("data"))
+    return _extract_and_strip_relay(data)[2]
+
+
+def _reference_outbound(data: Dict[str, Any]) -> str:
+    out = dict({"event": "client-command-result", "channel": _CHANNEL, "data": {**data}})
+    out["data"] = json.dumps(out["data"], separators=(",", ":"))
+    return json.dumps(out, separators=(",", ":"))
+
+
+def _codec_outbound(data: Dict[str, Any]) -> str:
+    return _frame_head("client-command-result", _CHANNEL).encode(data)
+
+
+def _reference_relay(raw: str) -> str:
+    stripped = _reference_inbound(raw)
+    return json.dumps({"type": "from_cloud", "msg_id": "m-42", "event": "server-command", "data": stripped})
+
+
+def _codec_relay(raw: str) -> str:
+    # What `_cloud_message_loop` and `RelayGateway.forward_from_cloud` do.
+    data_json = json_codec.loads(raw)["data"]
+    relay, data_json = _split_relay_json(data_json)
+    _relay_route(relay)
+    return '{"type":"from_cloud","msg_id":' + json_codec.dumps("m-42") + ',"event":"server-command","data":' + data_json + "}"
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="WebSocket JSON codec micro-benchmark")
+    p.add_argument("--number", type=int, default=20000, help="iterations per timing")
+    p.add_argument("--repeat", type=int, default=5, help="timings per case (best is reported)")
+    args = p.parse_args()
+
+    result = {
+        "correlation_id": "4b1f0c1e-8d7e-4a53-9d0a-2c2e55b0f1a4",
+        "command_name": "get_metrics",
+        "ok": True,
+        "message": "ok",
+        "timing": {"queue_ms": 0.12, "run_ms": 3.4},
+        "payload": {
+            "supported": True,
+            "stage": {"x": 12.345678, "y": -3.5, "z": 7.25, "r": 0.0, "t": 0.0},
+            "beam": {"kv": 15.0, "on": True, "current_pa": 128.5},
+            "vacuum": {"status": "ready", "pressure_pa": 0.00041},
+            "working_distance": {"wd": 9.87},
+        },
+    }
+    command = {
+        "correlation_id": result["correlation_id"],
+        "command_name": "clickButton",
+        "payload": {"button_name": "stage_control_stop"},
+        "relay": {"client_id": "pc1", "msg_id": "m-42"},
+    }
+    inbound = json.dumps({"event": "server-command", "channel": _CHANNEL, "data": json.dumps(command)})
+    to_cloud = json.dumps({"type": "to_cloud", "msg_id": "m-42", "event": "client-command-result", "data": result})
+    ack = {"type": "ack", "msg_id": "m-42", "status": "queued", "cloud_connected": True}
+    recipe = {
+        "correlation_id": result["correlation_id"],
+        "command_name": "run_recipe",
+        "payload": {"steps": [{"op": "stage_move_to", "x": i * 0.01, "y": -i * 0.02, "label": f"p{i}"} for i in range(1500)]},
+        "relay": {"client_id": "pc1", "msg_id": "m-42"},
+    }
+    large = json.dumps({"event": "server-command", "channel": _CHANNEL, "data": json.dumps(recipe)})
+
+    assert _reference_inbound(inbound) == _codec_inbound(inbound)
+    assert json.loads(_reference_outbound(result)) == json.loads(_codec_outbound(result))
+    assert json.loads(json.loads(_codec_outbound(result))["data"]) == result
+    assert json.loads(_codec_relay(large)) == json.loads(_reference_relay(large))
+
+    cases = [
+        ("inbound server-command", lambda: _reference_inbound(inbound), lambda: _codec_inbound(inbound), 1),
+        ("outbound command result", lambda: _reference_outbound(result), lambda: _codec_outbound(result), 1),
+        (
+            "relay to_cloud + ack",
+            lambda: (json.loads(to_cloud), json.dumps(ack)),
+            lambda: (json_codec.loads(to_cloud), json_codec.dumps(ack)),
+            1,
+        ),
+        # A few hundred times slower per call than the small frames.
+        (f"relay {len(large) // 1024} KiB command", lambda: _reference_relay(large), lambda: _codec_relay(large), 200),
+    ]
+    print(f"backend: {json_codec.BACKEND}")
+    for name, reference, codec, scale in cases:
+        number = max(1, args.number // scale)
+        ref = min(timeit.repeat(reference, number=number, repeat=args.repeat)) / number * 1e6
+        new = min(timeit.repeat(codec, number=number, repeat=args.repeat)) / number * 1e6
+        print(f"{name:<26} reference {ref:7.2f} us   codec {new:7.2f} us   {ref / new:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
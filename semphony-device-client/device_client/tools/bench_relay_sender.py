@@ -0,0 +1,136 @@
+"""
+Throughput benchmark for the local->cloud relay sender.
+
+Usage:
+  python -m device_client.tools.bench_relay_sender [--messages 20000] [--batch 64]
+
+Starts a stand-in Reverb server (a separate process on localhost that only
+counts messages), queues a burst of relayed `client-command-result` frames
+from a few clients, and times how long the sender takes until the server has
+received them all. The previous one-message-at-a-time sender (dict copy,
+`json.dumps` twice, send) is timed as the baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from typing import Any, Awaitable, Callable
+
+from ..reverb_client import CloudOutbox, CloudOutboxItem, _cloud_sender_loop, _inject_relay
+
+
+async def _reference_sender_loop(ws: Any, outbox: CloudOutbox) -> None:
+    """The original sender, kept here as the baseline."""
+    while True:
+        item = await outbox.get()
+        out = dict(item.frame)
+        data = out.get("data")
+        if data is not None and not isinstance(data, str):
+            out["data"] = json.dumps(data, separators=(",", ":"))
+        await ws.send(json.dumps(out, separators=(",", ":")))
+        outbox.mark_done(item)
+
+
+def _fill(outbox: CloudOutbox, messages: int, clients: int) -> None:
+    for i in range(messages):
+        client_id = f"pc1-{i % clients}"
+        msg_id = f"m{i}"
+        data = {
+            "command_id": 1000 + i,
+            "ok": True,
+            "message": "done",
+            "payload": {"stage": {"x": 12.345678, "y": -3.5, "z": 7.25}, "beam_kv": 15.0, "ms": 3.2},
+        }
+        frame = {
+            "event": "client-command-result",
+            "channel": "presence-client.1",
+            "data": _inject_relay(data, client_id=client_id, msg_id=msg_id),
+        }
+        ok, reason = outbox.try_put(CloudOutboxItem(client_id=client_id, msg_id=msg_id, frame=frame))
+        assert ok, reason
+
+
+def _stand_in_reverb(port_queue: Any) -> None:
+    """Server process: counts messages and answers "done" once it saw the expected number."""
+    import websockets  # type: ignore
+
+    async def handler(ws: Any, *_: Any) -> None:
+        target = count = 0
+        async for msg in ws:
+            if isinstance(msg, str) and msg.startswith("expect:"):
+                target, count = int(msg[7:]), 0
+                continue
+            count += 1
+            if count == target:
+                await ws.send("done")
+
+    async def serve() -> None:
+        async with websockets.serve(handler, "127.0.0.1", 0, max_size=None) as server:
+            port_queue.put(next(iter(server.sockets)).getsockname()[1])
+            await asyncio.Future()
+
+    asyncio.run(serve())
+
+
+async def _run_case(
+    port: int,
+    messages: int,
+    clients: int,
+    sender: Callable[[Any, CloudOutbox], Awaitable[None]],
+) -> float:
+    import websockets  # type: ignore
+
+    outbox = CloudOutbox(max_total=messages, max_per_client=messages)
+    async with websockets.connect(f"ws://127.0.0.1:{port}", ping_interval=None) as ws:
+        await ws.send(f"expect:{messages}")
+        _fill(outbox, messages, clients)
+        t0 = time.perf_counter()
+        task = asyncio.create_task(sender(ws, outbox))
+        assert await ws.recv() == "done"
+        elapsed = time.perf_counter() - t0
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    return elapsed
+
+
+async def _main(args: argparse.Namespace, port: int) -> None:
+    cases = [
+        ("one at a time (reference)", _reference_sender_loop),
+        (f"batched (batch_max={args.batch})", lambda ws, ob: _cloud_sender_loop(ws, ob, batch_max=args.batch)),
+    ]
+    results = {}
+    for name, sender in cases:
+        best = min([await _run_case(port, args.messages, args.clients, sender) for _ in range(args.repeat)])
+        results[name] = args.messages / best
+        print(f"{name:<32} {results[name]:10.0f} msg/s  ({best * 1000:.1f} ms for {args.messages})")
+    ref, new = results.values()
+    print(f"speedup: {new / ref:.2f}x")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Relay sender throughput benchmark")
+    p.add_argument("--messages", type=int, default=20000, help="messages per burst")
+    p.add_argument("--clients", type=int, default=4, help="relay clients the burst comes from")
+    p.add_argument("--batch", type=int, default=64, help="batch_max for the batched sender")
+    p.add_argument("--repeat", type=int, default=3, help="bursts per case (best is reported)")
+    args = p.parse_args()
+
+    # The server runs in its own process so its parsing does not eat into the sender's time.
+    port_queue: Any = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_stand_in_reverb, args=(port_queue,), daemon=True)
+    server.start()
+    try:
+        asyncio.run(_main(args, port_queue.get(timeout=10)))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Micro-benchmark for the SharkSEM value codec.
+
+Usage:
+  python -m device_client.tools.bench_sharksem_codec [--number 100000]
+
+Compares the run decoder used by `_decode_values` with the previous per-field
+float parsing (slice, split at NUL, decode, float) on a `StgGetPosition`-shaped
+response, and times encoding of the same values.
+"""
+
+from __future__ import annotations
+
+import argparse
+import struct
+import timeit
+from typing import List, Tuple
+
+from ..hardware.tescan_sem.sdk_client import _decode_values, _encode_request, _pack_float
+
+
+def _reference_unpack_float(body: bytes, offset: int) -> Tuple[float, int]:
+    """The original per-field decoder, kept here as the baseline."""
+    (l,) = struct.unpack_from("<I", body, offset)
+    offset += 4
+    raw = body[offset : offset + l]
+    offset += l
+    raw = raw.split(b"\x00", 1)[0]
+    return float(raw.decode("ascii", errors="replace")), offset
+
+
+def _reference_decode(body: bytes, count: int) -> List[float]:
+    out = []
+    offset = 0
+    for _ in range(count):
+        v, offset = _reference_unpack_float(body, offset)
+        out.append(v)
+    return out
+
+
+def _reference_pack_float(value: float) -> bytes:
+    s = str(float(value)).encode("ascii", errors="replace")
+    l = ((len(s) + 3) // 4) * 4
+    return struct.pack("<I", l) + s.ljust(l, b"\x00")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="SharkSEM codec micro-benchmark")
+    p.add_argument("--number", type=int, default=100000, help="iterations per timing")
+    p.add_argument("--repeat", type=int, default=5, help="timings per case (best is reported)")
+    args = p.parse_args()
+
+    position = [12.345678, -3.5, 0.00725, 0.0, 359.99]  # x, y, z, rot, tilt
+    body = memoryview(_encode_request("StgGetPosition", [("float", v) for v in position])[32:])
+    ret = ["float"] * len(position)
+    assert _decode_values(body, ret) == _reference_decode(bytes(body), len(position)) == position
+
+    cases = [
+        ("decode StgGetPosition (reference)", lambda: _reference_decode(bytes(body), len(position))),
+        ("decode StgGetPosition (_decode_values)", lambda: _decode_values(body, ret)),
+        ("encode 5 floats (reference)", lambda: [_reference_pack_float(v) for v in position]),
+        ("encode 5 floats (_pack_float)", lambda: [_pack_float(v) for v in position]),
+    ]
+    results = {}
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=args.number, repeat=args.repeat))
+        results[name] = best / args.number * 1e6
+        print(f"{name:<42} {results[name]:8.3f} us/op")
+
+    for what in ("decode StgGetPosition", "encode 5 floats"):
+        ref = results[f"{what} (reference)"]
+        new = [v for k, v in results.items() if k.startswith(what) and "reference" not in k][0]
+        print(f"{what}: {ref / new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+`CloudOutbox` keeps one FIFO per local client and serves them round-robin,
+so a client at its limit only delays its own messages. When the cloud
+connection drops in the middle of a batch, `_cloud_sender_loop` puts the
+unsent messages back, in order, for the next session.
+
+Run from `semphony-device-client/`: `python -m pytest tests` or
+`python -m unittest discover tests`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import unittest
+from typing import List, Optional
+
+from device_client.reverb_client import CloudOutbox, CloudOutboxItem, _cloud_sender_loop
+
+
+def _item(client_id: str, n: int) -> CloudOutboxItem:
+    return CloudOutboxItem(client_id=client_id, msg_id=f"{client_id}-{n}", frame={"event": "client-relay", "n": n})
+
+
+def _ids(items: List[CloudOutboxItem]) -> List[str]:
+    return [item.msg_id for item in items]
+
+
+class CloudOutboxTest(unittest.IsolatedAsyncioTestCase):
+    async def test_client_at_its_limit_only_delays_itself(self) -> None:
+        outbox = CloudOutbox(max_total=100, max_per_client=3)
+        for n in range(3):
+            self.assertEqual(outbox.try_put(_item("flood", n)), (True, "ok"))
+        self.assertEqual(outbox.try_put(_item("flood", 3)), (False, "client_queue_full"))
+        # Other clients are still accepted, and sent before the flood's backlog.
+        self.assertEqual(outbox.try_put(_item("pc1", 0)), (True, "ok"))
+        self.assertEqual(outbox.try_put(_item("pc2", 0)), (True, "ok"))
+        self.assertEqual(_ids(outbox.get_ready(3)), ["flood-0", "pc1-0", "pc2-0"])
+
+    async def test_in_flight_messages_count_against_the_client_limit(self) -> None:
+        outbox = CloudOutbox(max_total=100, max_per_client=2)
+        outbox.try_put(_item("pc1", 0))
+        outbox.try_put(_item("pc1", 1))
+        first = await outbox.get()
+        # Taken by the sender but not yet delivered: the slot is still used.
+        self.assertEqual(outbox.try_put(_item("pc1", 2)), (False, "client_queue_full"))
+        outbox.mark_done(first)
+        self.assertEqual(outbox.try_put(_item("pc1", 2)), (True, "ok"))
+
+    async def test_clients_are_served_round_robin(self) -> None:
+        outbox = CloudOutbox(max_total=100, max_per_client=10)
+        for n in range(3):
+            outbox.try_put(_item("pc1", n))
+        outbox.try_put(_item("pc2", 0))
+        for n in range(2):
+            outbox.try_put(_item("pc3", n))
+
+        order = [(await outbox.get()).msg_id]
+        order += _ids(outbox.get_ready(2))
+        order.append((await outbox.get()).msg_id)
+        order += _ids(outbox.get_ready(10))
+        self.assertEqual(order, ["pc1-0", "pc2-0", "pc3-0", "pc1-1", "pc3-1", "pc1-2"])
+        self.assertEqual(outbox.qsize(), 0)
+
+    async def test_client_that_empties_rejoins_at_the_back(self) -> None:
+        outbox = CloudOutbox(max_total=100, max_per_client=10)
+        outbox.try_put(_item("pc1", 0))
+        outbox.try_put(_item("pc2", 0))
+        outbox.try_put(_item("pc2", 1))
+        self.assertEqual(_ids(outbox.get_ready(2)), ["pc1-0", "pc2-0"])
+        outbox.try_put(_item("pc1", 1))
+        self.assertEqual(_ids(outbox.get_ready(10)), ["pc2-1", "pc1-1"])
+
+    async def test_total_limit_rejects_until_a_slot_frees(self) -> None:
+        # The outbox never evicts queued messages: at the total limit new ones are
+        # rejected, and the relay reports `queue_full` back to the sender.
+        outbox = CloudOutbox(max_total=3, max_per_client=10)
+        for n, client_id in enumerate(("pc1", "pc2", "pc3")):
+            self.assertEqual(outbox.try_put(_item(client_id, n)), (True, "ok"))
+        self.assertEqual(outbox.try_put(_item("pc4", 0)), (False, "queue_full"))
+        self.assertEqual(outbox.qsize(), 3)
+
+        # The total limit counts queued messages: the slot frees as soon as the
+        # sender takes one (in-flight messages count per client, until `mark_done`).
+        item = await outbox.get()
+        self.assertEqual(outbox.try_put(_item("pc4", 0)), (True, "ok"))
+        self.assertEqual(outbox.try_put(_item("pc5", 0)), (False, "queue_full"))
+        outbox.mark_done(item)
+        self.assertEqual(_ids(outbox.get_ready(10)), ["pc2-1", "pc3-2", "pc4-0"])
+
+    async def test_get_waits_for_a_message(self) -> None:
+        outbox = CloudOutbox(max_total=10, max_per_client=10)
+        getter = asyncio.create_task(outbox.get())
+        await asyncio.sleep(0)
+        self.assertFalse(getter.done())
+        outbox.try_put(_item("pc1", 0))
+        self.assertEqual((await asyncio.wait_for(getter, 1.0)).msg_id, "pc1-0")
+
+
+class _FakeCloud:
+    """Cloud websocket whose `send` fails on call number `fail_at` (1-based)."""
+
+    def __init__(self, fail_at: Optional[int] = None):
+        self.fail_at = fail_at
+        self.calls = 0
+        self.sent: List[str] = []
+
+    async def send(self, payload: str) -> None:
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise ConnectionError("connection lost")
+        # Let the event loop run between frames, as a real socket write would.
+        await asyncio.sleep(0)
+        self.sent.append(json.loads(payload)["msg_id"])
+
+
+def _relay_item(client_id: str, n: int) -> CloudOutboxItem:
+    msg_id = f"{client_id}-{n}"
+    return CloudOutboxItem(client_id=client_id, msg_id=msg_id, frame={"event": "client-relay", "msg_id": msg_id})
+
+
+class CloudSenderLoopTest(unittest.IsolatedAsyncioTestCase):
+    async def _drain(self, outbox: CloudOutbox, cloud: _FakeCloud, count: int) -> None:
+        sender = asyncio.create_task(_cloud_sender_loop(cloud, outbox))
+        try:
+            for _ in range(200):
+                if len(cloud.sent) >= count:
+                    break
+                await asyncio.sleep(0)
+        finally:
+            sender.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await sender
+
+    async def test_send_failure_midway_requeues_the_rest_in_order(self) -> None:
+        outbox = CloudOutbox(max_total=100, max_per_client=10)
+        expected = []
+        for n in range(4):
+            for client_id in ("pc1", "pc2", "pc3"):
+                outbox.try_put(_relay_item(client_id, n))
+                expected.append(f"{client_id}-{n}")
+
+        cloud = _FakeCloud(fail_at=5)
+        with self.assertRaises(ConnectionError):
+            await _cloud_sender_loop(cloud, outbox)
+        self.assertEqual(cloud.sent, expected[:4])
+        self.assertEqual(outbox.qsize(), len(expected) - 4)
+        # Only delivered messages released their per-client slots.
+        self.assertEqual(outbox._pending_by_client, {"pc1": 2, "pc2": 3, "pc3": 3})
+
+        retry = _FakeCloud()
+        await self._drain(outbox, retry, len(expected) - 4)
+        delivered = cloud.sent + retry.sent
+        self.assertEqual(sorted(delivered), sorted(expected))
+        self.assertEqual(len(set(delivered)), len(delivered))
+        for client_id in ("pc1", "pc2", "pc3"):
+            own = [msg_id for msg_id in delivered if msg_id.startswith(client_id)]
+            self.assertEqual(own, [f"{client_id}-{n}" for n in range(4)])
+        # The next session picks up exactly where the failed one stopped.
+        self.assertEqual(retry.sent, expected[4:])
+        self.assertEqual(outbox.qsize(), 0)
+        self.assertEqual(outbox._pending_by_client, {})
+
+    async def test_failure_on_first_send_loses_nothing(self) -> None:
+        outbox = CloudOutbox(max_total=100, max_per_client=10)
+        for n in range(3):
+            outbox.try_put(_relay_item("pc1", n))
+        with self.assertRaises(ConnectionError):
+            await _cloud_sender_loop(_FakeCloud(fail_at=1), outbox)
+        self.assertEqual(outbox.qsize(), 3)
+        self.assertEqual(_ids(outbox.get_ready(10)), ["pc1-0", "pc1-1", "pc1-2"])
+
+    async def test_cancelled_mid_batch_requeues_the_rest(self) -> None:
+        outbox = CloudOutbox(max_total=100, max_per_client=10)
+        for n in range(5):
+            outbox.try_put(_relay_item("pc1", n))
+        cloud = _FakeCloud()
+        await self._drain(outbox, cloud, 2)
+        self.assertEqual(cloud.sent, ["pc1-0", "pc1-1"])
+        self.assertEqual(_ids(outbox.get_ready(10)), ["pc1-2", "pc1-3", "pc1-4"])
+        self.assertEqual(outbox._pending_by_client, {"pc1": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
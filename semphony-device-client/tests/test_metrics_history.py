@@ -0,0 +1,146 @@
+"""
+`MetricsHistory` downsamples recorded SEM metrics into min/max/mean buckets;
+the TESCAN metrics poller records only the groups it actually read.
+
+Run from `semphony-device-client/`: `python -m pytest tests` or
+`python -m unittest discover tests`.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import time
+import unittest
+from typing import Any, Dict, List
+from unittest import mock
+
+from device_client.core import metrics_history
+from device_client.core.metrics_history import MetricsHistory
+from device_client.hardware.tescan_sem import metrics as tescan_metrics
+
+# Unix time = monotonic time + 1_000_000 while a test runs.
+_OFFSET = 1_000_000.0
+
+
+def _clock(mono: float = 500.0) -> Any:
+    clock = mock.Mock()
+    clock.monotonic.return_value = mono
+    clock.time.return_value = mono + _OFFSET
+    return clock
+
+
+def _history(samples: List[Dict[str, Any]], *, capacity: int = 100, t0: float = 100.0) -> MetricsHistory:
+    history = MetricsHistory(("beam_kv", "stage.x", "beam_on"), capacity=capacity)
+    for i, metrics in enumerate(samples):
+        history.append(t0 + i, metrics)
+    return history
+
+
+class MetricsHistoryQueryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch.object(metrics_history, "time", _clock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_samples_fall_into_equal_width_buckets(self) -> None:
+        history = _history([{"beam_kv": float(i)} for i in range(10)])
+        # Samples at t=100..109 (monotonic), queried as 100..110 in unix time in 5 buckets of 2 s.
+        result = history.query(100 + _OFFSET, 110 + _OFFSET, buckets=5, fields=["beam_kv"])
+        self.assertEqual(result["bucket_s"], 2.0)
+        self.assertEqual(result["t"], [100 + _OFFSET + 2 * b for b in range(5)])
+        self.assertEqual(result["count"], [2, 2, 2, 2, 2])
+        self.assertEqual(result["samples"], 10)
+        series = result["series"]["beam_kv"]
+        self.assertEqual(series["min"], [0.0, 2.0, 4.0, 6.0, 8.0])
+        self.assertEqual(series["max"], [1.0, 3.0, 5.0, 7.0, 9.0])
+        self.assertEqual(series["mean"], [0.5, 2.5, 4.5, 6.5, 8.5])
+
+    def test_range_excludes_samples_outside_it(self) -> None:
+        history = _history([{"beam_kv": float(i)} for i in range(10)])
+        result = history.query(103 + _OFFSET, 106 + _OFFSET, buckets=1)
+        self.assertEqual(result["samples"], 4)  # t=103..106, both ends included
+        self.assertEqual(result["series"]["beam_kv"]["min"], [3.0])
+        self.assertEqual(result["series"]["beam_kv"]["max"], [6.0])
+
+    def test_empty_buckets_and_missing_fields_are_none(self) -> None:
+        history = _history([{"beam_kv": 1.0}, {"stage": {"x": 0.5}}, {"beam_kv": 3.0, "stage": {"x": 0.7}}])
+        result = history.query(100 + _OFFSET, 106 + _OFFSET, buckets=2)
+        self.assertEqual(result["count"], [3, 0])
+        self.assertEqual(result["series"]["beam_kv"]["mean"], [2.0, None])
+        self.assertEqual(result["series"]["stage.x"]["min"], [0.5, None])
+        self.assertEqual(result["series"]["stage.x"]["max"], [0.7, None])
+        self.assertEqual(result["series"]["beam_on"]["mean"], [None, None])
+
+    def test_bools_are_recorded_as_zero_and_one(self) -> None:
+        history = _history([{"beam_on": True}, {"beam_on": False}, {"beam_on": True}, {"beam_on": True}])
+        result = history.query(100 + _OFFSET, 104 + _OFFSET, buckets=1, fields=["beam_on"])
+        self.assertEqual(result["series"]["beam_on"], {"min": [0.0], "max": [1.0], "mean": [0.75]})
+
+    def test_field_filter_ignores_unknown_fields(self) -> None:
+        history = _history([{"beam_kv": 1.0, "stage": {"x": 2.0}}])
+        result = history.query(_OFFSET, 200 + _OFFSET, fields=["stage.x", "nope"])
+        self.assertEqual(list(result["series"]), ["stage.x"])
+        self.assertEqual(list(history.query(_OFFSET, 200 + _OFFSET)["series"]), ["beam_kv", "stage.x", "beam_on"])
+
+    def test_ring_keeps_the_newest_samples_in_order(self) -> None:
+        history = _history([{"beam_kv": float(i)} for i in range(13)], capacity=5)
+        self.assertEqual(len(history), 5)
+        result = history.query(100 + _OFFSET, 113 + _OFFSET, buckets=13, fields=["beam_kv"])
+        self.assertEqual(result["samples"], 5)
+        self.assertEqual(result["count"], [0] * 8 + [1] * 5)
+        self.assertEqual(result["series"]["beam_kv"]["mean"][8:], [8.0, 9.0, 10.0, 11.0, 12.0])
+
+        # After the wrap, a range bisects correctly across the seam of the ring.
+        result = history.query(109 + _OFFSET, 111 + _OFFSET, buckets=1, fields=["beam_kv"])
+        self.assertEqual(result["samples"], 3)
+        self.assertEqual(result["series"]["beam_kv"]["mean"], [10.0])
+
+    def test_empty_history(self) -> None:
+        result = MetricsHistory(("beam_kv",), capacity=3).query(_OFFSET, 10 + _OFFSET, buckets=2)
+        self.assertEqual(result["samples"], 0)
+        self.assertEqual(result["count"], [0, 0])
+        self.assertEqual(result["series"]["beam_kv"]["min"], [None, None])
+
+
+class TescanMetricsHistoryTest(unittest.TestCase):
+    def _reader(self, reads: List[Dict[str, Any]]) -> tescan_metrics.TescanMetricsReader:
+        with mock.patch.dict(os.environ, {"TESCAN_METRICS_POLL_SECONDS": "0"}):
+            reader = tescan_metrics.TescanMetricsReader()
+        reader.reader = mock.Mock()
+        reader.reader.get_metrics.side_effect = reads
+        return reader
+
+    def test_only_the_groups_read_are_recorded(self) -> None:
+        reader = self._reader(
+            [
+                {"beam_kv": 10.0, "stage": {"x": 1.0}, "pump": {"status_code": 1}},
+                {"beam_kv": 11.0, "stage": {"x": 2.0}},
+            ]
+        )
+        reader._read()
+        reader._read(["beam", "stage"])
+        result = reader.history.query(0, time.time() + 60, buckets=1)
+        # The snapshot still serves the vacuum status read earlier...
+        self.assertEqual(reader._snapshot["pump"], {"status_code": 1})
+        # ...but the second sample did not record it again.
+        self.assertEqual(result["samples"], 2)
+        self.assertEqual(result["series"]["pump.status_code"]["mean"], [1.0])
+        self.assertEqual(result["series"]["beam_kv"]["mean"], [10.5])
+        self.assertTrue(math.isnan(reader.history._columns[reader.history.fields.index("pump.status_code")][1]))
+
+
+class TescanControllerPollerTest(unittest.TestCase):
+    def test_initialize_starts_the_poller_in_sdk_mode(self) -> None:
+        from device_client.hardware.tescan_sem.controller import TescanSemController
+
+        for mode, started in (("tescan_mira3", True), ("gui", False)):
+            with mock.patch.dict(os.environ, {"HARDWARE_MODE": mode}), mock.patch.object(
+                tescan_metrics.TescanMetricsReader, "check_connectivity", return_value=False
+            ), mock.patch.object(tescan_metrics.TescanMetricsReader, "start") as start:
+                TescanSemController().initialize()
+            self.assertEqual(start.called, started, mode)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+"""
+The relay outbox journal replays every message that was queued but never
+acked, exactly once and with its `msg_id`, across crashes, torn writes and
+interrupted compaction; `CloudOutbox` keeps relaying from memory when the
+journal cannot be written.
+
+Run from `semphony-device-client/`: `python -m pytest tests` or
+`python -m unittest discover tests`.
+"""
+
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest import mock
+
+from device_client.core.outbox_journal import OutboxJournal
+from device_client.reverb_client import CloudOutbox, CloudOutboxItem
+
+
+def _frame(n: int, size: int = 0) -> Dict[str, Any]:
+    return {"event": "client-relay", "data": {"n": n, "pad": "x" * size}}
+
+
+class OutboxJournalTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.dir = Path(self._tmp.name)
+        self._journals: List[OutboxJournal] = []
+
+    def tearDown(self) -> None:
+        for journal in self._journals:
+            journal.close()
+
+    def _open(self, **kwargs: Any) -> OutboxJournal:
+        journal = OutboxJournal(self.dir, fsync_interval_s=0.01, **kwargs)
+        self._journals.append(journal)
+        return journal
+
+    def _segments(self) -> List[str]:
+        return sorted(p.name for p in self.dir.iterdir())
+
+    def test_unacked_messages_are_replayed_with_their_msg_id(self) -> None:
+        journal = self._open()
+        self.assertEqual(journal.replay(), [])
+        seqs = [journal.append("pc1", f"m-{n}", _frame(n)) for n in range(3)]
+        journal.ack(seqs[1])
+        # No close(): the process dies here.
+
+        replayed = self._open().replay()
+        self.assertEqual(
+            [(m.seq, m.client_id, m.msg_id) for m in replayed],
+            [(seqs[0], "pc1", "m-0"), (seqs[2], "pc1", "m-2")],
+        )
+        self.assertEqual(replayed[1].frame, _frame(2))
+
+    def test_replay_again_without_acks_sends_the_same_messages(self) -> None:
+        # At-least-once: a message replayed but not acked before the next crash comes back again.
+        journal = self._open()
+        journal.replay()
+        journal.append("pc1", "m-0", _frame(0))
+        first = self._open().replay()
+        second = self._open().replay()
+        self.assertEqual([m.msg_id for m in first], ["m-0"])
+        self.assertEqual(second, first)
+
+    def test_new_sequence_numbers_continue_after_replay(self) -> None:
+        journal = self._open()
+        journal.replay()
+        seq = journal.append("pc1", "m-0", _frame(0))
+        journal2 = self._open()
+        journal2.replay()
+        self.assertGreater(journal2.append("pc1", "m-1", _frame(1)), seq)
+
+    def test_torn_last_line_is_skipped(self) -> None:
+        journal = self._open()
+        journal.replay()
+        journal.append("pc1", "m-0", _frame(0))
+        journal.append("pc1", "m-1", _frame(1))
+        journal.close()
+        segment = self.dir / self._segments()[-1]
+        data = segment.read_bytes()
+        lines = data.splitlines(keepends=True)
+        # The last record was only partly written when the machine went down.
+        segment.write_bytes(b"".join(lines[:-1]) + lines[-1][: len(lines[-1]) // 2])
+
+        journal2 = self._open()
+        self.assertEqual([m.msg_id for m in journal2.replay()], ["m-0"])
+        # Nothing is ever appended after the torn line.
+        self.assertEqual(segment.read_bytes(), b"".join(lines[:-1]) + lines[-1][: len(lines[-1]) // 2])
+        journal2.append("pc1", "m-2", _frame(2))
+        self.assertEqual([m.msg_id for m in self._open().replay()], ["m-0", "m-2"])
+
+    def test_fully_acked_segments_are_deleted(self) -> None:
+        journal = self._open(segment_bytes=4096)
+        journal.replay()
+        seqs = [journal.append("pc1", f"m-{n}", _frame(n, 1000)) for n in range(12)]
+        self.assertGreater(len(self._segments()), 2)
+
+        for seq in seqs[:4]:
+            journal.ack(seq)
+        self.assertEqual(journal.stats()["pending"], 8)
+        for seq in seqs[4:]:
+            journal.ack(seq)
+        self.assertEqual(journal.stats()["pending"], 0)
+        self.assertEqual(len(self._segments()), 1)
+        self.assertEqual(journal.stats()["segments"], 1)
+        self.assertEqual(self._open().replay(), [])
+
+    def test_mostly_acked_segment_is_compacted(self) -> None:
+        journal = self._open(segment_bytes=4096)
+        journal.replay()
+        seqs = [journal.append("pc1", f"m-{n}", _frame(n, 1000)) for n in range(8)]
+        oldest = self._segments()[0]
+        for seq in seqs[1:4]:
+            journal.ack(seq)
+        # Only m-0 was left in the oldest segment: it was copied forward and the segment removed.
+        self.assertNotIn(oldest, self._segments())
+
+        replayed = self._open().replay()
+        self.assertEqual([m.msg_id for m in replayed], ["m-0", "m-4", "m-5", "m-6", "m-7"])
+        self.assertEqual(replayed[0].frame, _frame(0, 1000))
+
+    def test_crash_between_relocation_and_delete_replays_each_message_once(self) -> None:
+        journal = self._open(segment_bytes=4096)
+        journal.replay()
+        seqs = [journal.append("pc1", f"m-{n}", _frame(n, 1000)) for n in range(8)]
+        oldest = self._segments()[0]
+        for seq in seqs[1:3]:
+            journal.ack(seq)
+        with mock.patch.object(Path, "unlink", side_effect=RuntimeError("crash")):
+            with self.assertRaises(RuntimeError):
+                journal.ack(seqs[3])
+        # The survivor now exists twice: in the oldest segment and copied to the active one.
+        self.assertIn(oldest, self._segments())
+
+        journal2 = self._open(segment_bytes=4096)
+        replayed = journal2.replay()
+        self.assertEqual([m.msg_id for m in replayed], ["m-0", "m-4", "m-5", "m-6", "m-7"])
+        self.assertNotIn(oldest, self._segments())
+        # Acking the survivor cancels both copies.
+        journal2.ack(replayed[0].seq)
+        self.assertEqual([m.msg_id for m in self._open().replay()], ["m-4", "m-5", "m-6", "m-7"])
+
+    def test_crash_during_relocation_replays_each_message_once(self) -> None:
+        journal = self._open(segment_bytes=4096)
+        journal.replay()
+        seqs = [journal.append("pc1", f"m-{n}", _frame(n, 200)) for n in range(30)]
+        oldest = journal._index[seqs[0]][0]
+        in_oldest = [seq for seq in seqs if journal._index[seq][0] == oldest]
+        write = journal._write
+        acked: List[int] = []
+
+        # Ack the oldest segment front to back; the ack that starts its compaction
+        # dies after the ack record and the first copied put are written.
+        for seq in in_oldest[2:]:
+            calls: List[bytes] = []
+
+            def crashing_write(line: bytes) -> int:
+                calls.append(line)
+                if len(calls) == 3:
+                    raise RuntimeError("crash")
+                return write(line)
+
+            with mock.patch.object(journal, "_write", side_effect=crashing_write):
+                try:
+                    journal.ack(seq)
+                except RuntimeError:
+                    break
+                finally:
+                    acked.append(seq)
+        else:
+            self.fail("the oldest segment was never compacted")
+        self.assertGreaterEqual(len(in_oldest) - len(acked), 2)
+
+        replayed = self._open(segment_bytes=4096).replay()
+        expected = [f"m-{n}" for n, seq in enumerate(seqs) if seq not in acked]
+        self.assertEqual([m.msg_id for m in replayed], expected)
+
+    def test_closed_journal_rejects_appends(self) -> None:
+        journal = self._open()
+        journal.replay()
+        journal.close()
+        with self.assertRaises(OSError):
+            journal.append("pc1", "m-0", _frame(0))
+
+
+class CloudOutboxJournalTest(unittest.TestCase):
+    def test_disk_full_falls_back_to_memory(self) -> None:
+        journal = mock.Mock(spec=OutboxJournal)
+        journal.append.side_effect = OSError(28, "No space left on device")
+        outbox = CloudOutbox(max_total=10, max_per_client=10, journal=journal)
+
+        ok, reason = outbox.try_put(CloudOutboxItem("pc1", "m-0", _frame(0)))
+        self.assertEqual((ok, reason), (True, "ok"))
+        self.assertIsNone(outbox.journal)
+        journal.close.assert_called_once()
+        item = outbox.get_ready(10)[0]
+        self.assertEqual((item.msg_id, item.seq), ("m-0", 0))
+        # Later messages are not journaled at all.
+        self.assertEqual(outbox.try_put(CloudOutboxItem("pc1", "m-1", _frame(1))), (True, "ok"))
+        self.assertEqual(journal.append.call_count, 1)
+        outbox.mark_done(item)
+        journal.ack.assert_not_called()
+
+    def test_restore_replays_unacked_messages_and_acks_on_done(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = OutboxJournal(Path(tmp), fsync_interval_s=0.01)
+            outbox = CloudOutbox(max_total=10, max_per_client=10, journal=journal)
+            outbox.restore()
+            outbox.try_put(CloudOutboxItem("pc1", "m-0", _frame(0)))
+            outbox.try_put(CloudOutboxItem("pc2", "m-1", _frame(1)))
+            outbox.mark_done(outbox.get_ready(1)[0])
+            # Crash: m-1 was queued, never sent.
+
+            journal2 = OutboxJournal(Path(tmp), fsync_interval_s=0.01)
+            outbox2 = CloudOutbox(max_total=10, max_per_client=10, journal=journal2)
+            self.assertEqual(outbox2.restore(), 1)
+            item = outbox2.get_ready(10)[0]
+            self.assertEqual((item.client_id, item.msg_id, item.frame), ("pc2", "m-1", _frame(1)))
+            outbox2.mark_done(item)
+            outbox2.close()
+            journal.close()
+
+            journal3 = OutboxJournal(Path(tmp), fsync_interval_s=0.01)
+            self.assertEqual(journal3.replay(), [])
+            journal3.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
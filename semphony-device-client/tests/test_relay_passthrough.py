@@ -0,0 +1,143 @@
+"""
+Relayed cloud commands reach LAN clients with the same `data`, whether
+`_cloud_message_loop` forwards the payload text as is (pass-through) or
+decodes it and strips the relay envelope (fallback).
+
+Run from `semphony-device-client/`: `python -m pytest tests` or
+`python -m unittest discover tests`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import unittest
+from typing import Any, List, Optional
+from unittest import mock
+
+from device_client import reverb_client
+from device_client.relay_gateway import LocalClientSession, RelayConfig, RelayGateway
+
+_CHANNEL = "presence-client.1"
+_COMMAND = {
+    "correlation_id": "4b1f0c1e-8d7e-4a53-9d0a-2c2e55b0f1a4",
+    "command_name": "run_recipe",
+    "payload": {
+        "steps": [{"op": "stage_move_to", "x": 0.01, "label": "p,\"relay\":1}"}],
+        # A nested `relay` key belongs to the payload and must be kept.
+        "meta": {"relay": {"client_id": "elsewhere"}},
+        "unicode": "µm",
+    },
+}
+_RELAY = {"client_id": "pc1", "msg_id": "m-42"}
+
+
+class _FakeCloud:
+    def __init__(self, frames: List[str]):
+        self._frames = frames
+        self.sent: List[str] = []
+
+    def __aiter__(self) -> Any:
+        return self._iter()
+
+    async def _iter(self) -> Any:
+        for frame in self._frames:
+            yield frame
+
+    async def send(self, frame: str) -> None:
+        self.sent.append(frame)
+
+
+class _FakeLanClient:
+    def __init__(self) -> None:
+        self.received: List[str] = []
+
+    async def send(self, frame: str) -> None:
+        self.received.append(frame)
+
+
+def _server_command(data: Any) -> str:
+    return json.dumps({"event": "server-command", "channel": _CHANNEL, "data": data})
+
+
+class RelayPassThroughTest(unittest.IsolatedAsyncioTestCase):
+    async def _relay(self, frame: str, *, decodes: Optional[List[Any]] = None) -> dict:
+        """Feed one cloud frame through the message loop; return what PC1 received and which path ran."""
+        gateway = RelayGateway(
+            RelayConfig(token="t"),
+            enqueue_to_cloud=mock.AsyncMock(),
+            cloud_connected=lambda: True,
+        )
+        lan = _FakeLanClient()
+        gateway._sessions["pc1"] = LocalClientSession("pc1", "127.0.0.1", lan, asyncio.Lock())
+        cloud = _FakeCloud([frame])
+        cfg = mock.Mock(channel=_CHANNEL)
+        codec_loads = reverb_client.json_codec.loads
+
+        def loads(data: Any) -> Any:
+            if decodes is not None:
+                decodes.append(data)
+            return codec_loads(data)
+
+        with mock.patch.object(
+            reverb_client, "_extract_and_strip_relay", wraps=reverb_client._extract_and_strip_relay
+        ) as fallback, mock.patch.object(reverb_client.json_codec, "loads", side_effect=loads), mock.patch(
+            "json.loads", side_effect=loads
+        ):
+            with self.assertRaises(RuntimeError):
+                await reverb_client._cloud_message_loop(cloud, cfg, gateway, mock.Mock())
+        self.assertEqual(cloud.sent, [])
+        self.assertEqual(len(lan.received), 1)
+        delivered = json.loads(lan.received[0])
+        self.assertEqual(delivered["type"], "from_cloud")
+        self.assertEqual(delivered["msg_id"], "m-42")
+        delivered["fallback"] = fallback.called
+        return delivered
+
+    async def test_pass_through_and_fallback_deliver_identical_data(self) -> None:
+        relay_last = await self._relay(_server_command(json.dumps({**_COMMAND, "relay": _RELAY})))
+        relay_first = await self._relay(_server_command(json.dumps({"relay": _RELAY, **_COMMAND})))
+        # Pusher data as an object rather than a string always takes the decoding path.
+        decoded = await self._relay(_server_command({**_COMMAND, "relay": _RELAY}))
+
+        self.assertFalse(relay_last["fallback"])
+        self.assertFalse(relay_first["fallback"])
+        self.assertTrue(decoded["fallback"])
+        self.assertEqual(relay_last["data"], _COMMAND)
+        self.assertEqual(relay_first["data"], decoded["data"])
+        self.assertEqual(relay_last["data"], decoded["data"])
+
+    async def test_pass_through_never_decodes_the_payload(self) -> None:
+        data = json.dumps({**_COMMAND, "relay": _RELAY})
+        frame = _server_command(data)
+        decodes: List[Any] = []
+        delivered = await self._relay(frame, decodes=decodes)
+        self.assertFalse(delivered["fallback"])
+        # Only the outer Pusher frame is decoded; `data` (the command payload) never is.
+        self.assertEqual(decodes, [frame])
+
+    async def test_relay_between_members_falls_back_to_decoding(self) -> None:
+        items = list(_COMMAND.items())
+        data = dict(items[:1] + [("relay", _RELAY)] + items[1:])
+        delivered = await self._relay(_server_command(json.dumps(data)))
+        self.assertTrue(delivered["fallback"])
+        self.assertEqual(delivered["data"], _COMMAND)
+
+    def test_split_relay_json_matches_extract_and_strip_relay(self) -> None:
+        cases = [
+            {**_COMMAND, "relay": _RELAY},
+            {"relay": _RELAY, **_COMMAND},
+            {"relay": _RELAY},
+        ]
+        for data in cases:
+            for text in (json.dumps(data), json.dumps(data, indent=2), json.dumps(data, separators=(",", ":"))):
+                split = reverb_client._split_relay_json(text)
+                self.assertIsNotNone(split, text)
+                relay, stripped = split
+                expected = reverb_client._extract_and_strip_relay(json.loads(text))[2]
+                self.assertEqual(relay, _RELAY)
+                self.assertEqual(json.loads(stripped), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
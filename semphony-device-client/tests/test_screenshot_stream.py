@@ -0,0 +1,120 @@
+"""
+A visual-feed stream encodes a frame only when the screen changed since the
+last frame it queued, also while that frame's upload is in flight or failing;
+a failed upload is retried without re-encoding.
+
+Run from `semphony-device-client/`: `python -m pytest tests` or
+`python -m unittest discover tests`.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from typing import Any, Callable, List
+from unittest import mock
+
+from device_client.core.http_transport import HttpResponse
+from device_client.core.screenshot_manager import ScreenshotManager, _CaptureSpec, _ScreenshotStream
+
+_WIDTH, _HEIGHT = 32, 16
+
+
+class _FakeGrabber:
+    def __init__(self) -> None:
+        self.fill = 0
+
+    def grab(self, region: Any = None) -> Any:
+        return SimpleNamespace(
+            raw=bytes([self.fill]) * (_WIDTH * _HEIGHT * 4),
+            size=SimpleNamespace(width=_WIDTH, height=_HEIGHT),
+        )
+
+
+def _wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.01)
+
+
+class ScreenshotStreamTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.manager = ScreenshotManager(mock.Mock())
+        self.addCleanup(self.manager._encode_pool.shutdown)
+        self.grabber = _FakeGrabber()
+        self.manager._grabber = lambda monitor_nr: self.grabber  # type: ignore[method-assign]
+        self.encoded: List[int] = []
+        encode = self.manager._encode_frame
+
+        def counting_encode(*args: Any) -> Any:
+            self.encoded.append(args[0].raw[0])
+            return encode(*args)
+
+        self.manager._encode_frame = counting_encode  # type: ignore[method-assign]
+        self.uploads: List[Any] = []
+
+    def _stream(self, upload: Callable[[], None]) -> _ScreenshotStream:
+        def upload_frame(frame: Any, *args: Any) -> HttpResponse:
+            upload()
+            self.uploads.append(frame)
+            resp = mock.Mock(spec=HttpResponse)
+            resp.json.return_value = {"id": len(self.uploads)}
+            self.manager._remember_upload(frame, resp.json())
+            return resp
+
+        self.manager._upload_frame = upload_frame  # type: ignore[method-assign]
+        stream = _ScreenshotStream(
+            self.manager,
+            spec=_CaptureSpec(monitor_nr=1),
+            fps=100.0,
+            quality=70,
+            preset=self.manager._presets["live"],
+            ttl_s=60.0,
+            upload_url="http://localhost/upload",
+            client_key="k",
+            insecure_ssl=False,
+        )
+        stream.start()
+        self.addCleanup(stream.stop, "stop_command")
+        return stream
+
+    def test_unchanged_frames_are_not_reencoded_while_an_upload_is_in_flight(self) -> None:
+        release = threading.Event()
+        stream = self._stream(lambda: release.wait(5.0))
+        _wait_for(lambda: stream.frames_captured >= 20)
+        # The first frame is still uploading; nothing changed since it was queued.
+        self.assertEqual(len(self.encoded), 1)
+        self.assertEqual(self.uploads, [])
+
+        self.grabber.fill = 7
+        _wait_for(lambda: len(self.encoded) == 2)
+        release.set()
+        _wait_for(lambda: stream.frames_uploaded == 2)
+        frames = stream.frames_captured
+        _wait_for(lambda: stream.frames_captured >= frames + 20)
+        self.assertEqual(self.encoded, [0, 7])
+        self.assertEqual(stream.frames_uploaded, 2)
+
+    def test_failed_upload_is_retried_without_reencoding(self) -> None:
+        failures = [RuntimeError("server down")] * 3
+
+        def upload() -> None:
+            if failures:
+                raise failures.pop()
+
+        stream = self._stream(upload)
+        _wait_for(lambda: stream.frames_uploaded == 1)
+        self.assertEqual(stream.upload_errors, 3)
+        self.assertEqual(len(self.encoded), 1)
+        frames = stream.frames_captured
+        _wait_for(lambda: stream.frames_captured >= frames + 20)
+        self.assertEqual(len(self.encoded), 1)
+        self.assertEqual(stream.frames_uploaded, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
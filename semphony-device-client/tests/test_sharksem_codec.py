@@ -0,0 +1,198 @@
+"""
+SharkSEM wire codec: values survive an encode/decode roundtrip, `_RecvBuffer`
+copes with the socket returning data in arbitrary pieces, and `batch()`
+pipelines requests and matches responses in order.
+
+Run from `semphony-device-client/`: `python -m pytest tests` or
+`python -m unittest discover tests`.
+"""
+
+from __future__ import annotations
+
+import struct
+import unittest
+from typing import List, Sequence, Tuple
+
+from device_client.hardware.tescan_sem.sdk_client import (
+    _MESSAGE_HEADER,
+    SharkSemCall,
+    SharkSemClient,
+    SharkSemError,
+    _decode_values,
+    _encode_fn_name,
+    _encode_request,
+    _RecvBuffer,
+    _unpack_floats,
+)
+
+_FLOATS = [12.345678, -3.5, 0.00725, 0.0, 359.99, 1e-300, -2.5e17, 30000.0, 1.0]
+
+
+def _body(values: Sequence[Tuple[str, object]]) -> memoryview:
+    return memoryview(bytearray(_encode_request("X", values)[_MESSAGE_HEADER.size :]))
+
+
+def _response(fn_name: str, values: Sequence[Tuple[str, object]]) -> bytes:
+    body = _encode_request(fn_name, values)[_MESSAGE_HEADER.size :]
+    return _MESSAGE_HEADER.pack(_encode_fn_name(fn_name), len(body), 0, 0, 0, 0) + body
+
+
+class _FakeSocket:
+    """Socket that returns at most `chunk` bytes per receive."""
+
+    def __init__(self, data: bytes = b"", chunk: int = 1 << 30):
+        self.data = bytearray(data)
+        self.chunk = chunk
+        self.sent: List[bytes] = []
+        self.receives = 0
+        self.closed = False
+
+    def recv_into(self, view: memoryview) -> int:
+        self.receives += 1
+        n = min(len(view), len(self.data), self.chunk)
+        view[:n] = self.data[:n]
+        del self.data[:n]
+        return n
+
+    def sendall(self, data: bytes) -> None:
+        self.sent.append(bytes(data))
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _requests(data: bytes) -> List[Tuple[str, bytes]]:
+    out = []
+    while data:
+        fn_name, size, *_ = _MESSAGE_HEADER.unpack_from(data)
+        end = _MESSAGE_HEADER.size + size
+        out.append((fn_name.split(b"\x00", 1)[0].decode(), data[_MESSAGE_HEADER.size : end]))
+        data = data[end:]
+    return out
+
+
+class CodecRoundtripTest(unittest.TestCase):
+    def test_float_bodies(self) -> None:
+        for n in range(1, len(_FLOATS) + 1):
+            values = _FLOATS[:n]
+            self.assertEqual(_decode_values(_body([("float", v) for v in values]), ["float"] * n), values)
+
+    def test_mixed_bodies(self) -> None:
+        cases = [
+            [("int", -7), ("float", 2.5), ("uint", 4000000000)],
+            [("float", -3.5), ("float", 0.125), ("int", 1)],  # float run followed by an int
+            [("uint", 3), ("float", 1e-300), ("float", 12.345678)],  # float run at the end
+            [("int", 0), ("float", 30000.0), ("int", -1), ("float", -2.5e17), ("uint", 0)],
+        ]
+        for values in cases:
+            ret = [t for t, _ in values]
+            self.assertEqual(_decode_values(_body(values), ret), [v for _, v in values], values)
+
+    def test_body_may_be_bytes(self) -> None:
+        body = bytes(_body([("float", 1.5), ("int", 2)]))
+        self.assertEqual(_decode_values(body, ["float", "int"]), [1.5, 2])
+
+    def test_unpack_floats_returns_the_offset_after_the_run(self) -> None:
+        body = _body([("int", 9), ("float", 1.25), ("float", -0.5), ("int", 4)])
+        values, offset = _unpack_floats(body, 2, 4)
+        self.assertEqual(values, [1.25, -0.5])
+        self.assertEqual(struct.unpack_from("<i", body, offset), (4,))
+
+    def test_junk_after_the_nul_terminator_is_ignored(self) -> None:
+        body = struct.pack("<I", 8) + b"2.5\x00zz\x00\x00" + struct.pack("<I", 4) + b"-1.0"
+        self.assertEqual(_decode_values(memoryview(body), ["float", "float"]), [2.5, -1.0])
+
+    def test_malformed_float_raises(self) -> None:
+        body = struct.pack("<I", 4) + b"abc\x00"
+        with self.assertRaises(SharkSemError):
+            _decode_values(memoryview(body), ["float"])
+
+
+class RecvBufferTest(unittest.TestCase):
+    def test_short_reads_are_assembled(self) -> None:
+        payload = bytes(range(256)) * 3
+        for chunk in (1, 3, 7, 64):
+            sock = _FakeSocket(payload, chunk=chunk)
+            rx = _RecvBuffer(sock, size=100)  # smaller than the payload: `_fill` compacts and grows
+            got = bytearray()
+            for n in (5, 32, 1, 150, 300, 280):
+                got += rx.take(n)
+            self.assertEqual(bytes(got), payload, chunk)
+            self.assertEqual(rx.buffered(), 0)
+
+    def test_pipelined_messages_arrive_in_one_read(self) -> None:
+        data = _response("HVGetBeam", [("int", 1)]) + _response("GetWD", [("float", 0.0125)])
+        sock = _FakeSocket(data)
+        rx = _RecvBuffer(sock)
+        self.assertEqual(rx.read_message(), (b"HVGetBeam", 4))
+        rx.skip(4)
+        self.assertEqual(rx.read_message()[0], b"GetWD")
+        self.assertEqual(sock.receives, 1)
+
+    def test_read_into_and_skip_across_short_reads(self) -> None:
+        payload = bytes(range(200))
+        rx = _RecvBuffer(_FakeSocket(payload, chunk=9), size=32)
+        self.assertEqual(bytes(rx.take(10)), payload[:10])
+        rx.skip(70)  # more than the buffer holds
+        target = bytearray(100)
+        rx.read_into(memoryview(target))
+        self.assertEqual(bytes(target), payload[80:180])
+        self.assertEqual(bytes(rx.take(20)), payload[180:])
+
+    def test_closed_socket_raises(self) -> None:
+        rx = _RecvBuffer(_FakeSocket(b"abc"))
+        with self.assertRaises(SharkSemError):
+            rx.take(4)
+
+
+class BatchTest(unittest.TestCase):
+    def _client(self, sock: _FakeSocket) -> SharkSemClient:
+        client = SharkSemClient(host="127.0.0.1", port=8300)
+        client._sock_c = sock  # type: ignore[assignment]
+        client._sock_d = _FakeSocket()  # type: ignore[assignment]
+        client._rx_c = _RecvBuffer(sock)  # type: ignore[arg-type]
+        return client
+
+    def test_batch_pipelines_requests_and_decodes_in_order(self) -> None:
+        calls = [
+            SharkSemCall("HVGetVoltage", ["float"]),
+            SharkSemCall("StgGetPosition", ["float"] * 5),
+            SharkSemCall("DtGetGainBlack", ["float", "float"], args=[("int", 2)]),
+            SharkSemCall("VacGetStatus", ["int"]),
+        ]
+        responses = [
+            [("float", 30000.0)],
+            [("float", v) for v in _FLOATS[:5]],
+            [("float", 45.5), ("float", -2.0)],
+            [("int", 1)],
+        ]
+        sock = _FakeSocket(b"".join(_response(c.fn_name, r) for c, r in zip(calls, responses)), chunk=5)
+        client = self._client(sock)
+
+        self.assertEqual(client.batch(calls), [[30000.0], _FLOATS[:5], [45.5, -2.0], [1]])
+        # All requests went out in a single write.
+        self.assertEqual(len(sock.sent), 1)
+        self.assertEqual(
+            _requests(sock.sent[0]),
+            [
+                ("HVGetVoltage", b""),
+                ("StgGetPosition", b""),
+                ("DtGetGainBlack", struct.pack("<i", 2)),
+                ("VacGetStatus", b""),
+            ],
+        )
+        self.assertTrue(client.is_connected())
+
+    def test_mismatched_response_closes_the_connection(self) -> None:
+        calls = [SharkSemCall("HVGetBeam", ["int"]), SharkSemCall("GetWD", ["float"])]
+        sock = _FakeSocket(_response("HVGetBeam", [("int", 1)]) + _response("VacGetStatus", [("int", 1)]))
+        client = self._client(sock)
+        with self.assertRaises(SharkSemError):
+            client.batch(calls)
+        # The rest of the pipeline is unread, so the channel cannot be reused.
+        self.assertTrue(sock.closed)
+        self.assertFalse(client.is_connected())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+`SharkSemSupervisor` reconnects over and over while the SEM is down; a failed
+connect must not leave sockets behind.
+
+Run from `semphony-device-client/`: `python -m pytest tests` or
+`python -m unittest discover tests`.
+"""
+
+from __future__ import annotations
+
+import socket
+import threading
+import unittest
+from typing import Any, List
+from unittest import mock
+
+from device_client.hardware.tescan_sem.sdk_client import SharkSemError
+from device_client.hardware.tescan_sem.supervisor import STATE_DISCONNECTED, SharkSemSupervisor
+
+
+class _HangUpServer:
+    """Control channel that accepts and hangs up at once, like a SEM shutting down."""
+
+    def __init__(self) -> None:
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self._listener.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            conn.close()
+
+    def close(self) -> None:
+        self._listener.close()
+
+
+class SupervisorReconnectTest(unittest.TestCase):
+    def test_failed_connects_close_both_sockets(self) -> None:
+        server = _HangUpServer()
+        self.addCleanup(server.close)
+        created: List[socket.socket] = []
+
+        class _Tracked(socket.socket):
+            def __init__(self, *args: Any, **kwargs: Any) -> None:
+                super().__init__(*args, **kwargs)
+                if kwargs.get("fileno") is None:  # not a socket returned by accept()
+                    created.append(self)
+
+        supervisor = SharkSemSupervisor("127.0.0.1", server.port, timeout_s=1.0, keepalive_s=0, backoff_min_s=0)
+        self.addCleanup(supervisor.close)
+        attempts = 5
+        # Reconnect from the calls only (the background thread uses the same `_connect`),
+        # so every socket is accounted for when the test looks.
+        with mock.patch.object(supervisor, "_ensure_thread"), mock.patch.object(socket, "socket", _Tracked):
+            for _ in range(attempts):
+                # The control channel connects; registering the data port then fails.
+                with self.assertRaises(SharkSemError):
+                    supervisor.call(lambda c: c.recv("HVGetBeam", ["int"]))
+
+        self.assertEqual(supervisor.state()["state"], STATE_DISCONNECTED)
+        # Control and data socket per attempt, all closed again.
+        self.assertEqual(len(created), 2 * attempts)
+        self.assertEqual([s for s in created if s.fileno() != -1], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Telemetry deadbands apply per field path: the working distance (m) and the
+stage Z reported next to it (mm) each get a threshold in their own unit.
+
+Run from `semphony-device-client/`: `python -m pytest tests` or
+`python -m unittest discover tests`.
+"""
+
+from __future__ import annotations
+
+import unittest
+from typing import Any, Dict
+
+from device_client.core.telemetry import DEFAULT_DEADBANDS, TelemetryTracker, parse_deadbands
+
+
+def _metrics(*, wd: float = 0.0125, z: float = 10.0, x: float = 1.0, beam_on: bool = True) -> Dict[str, Any]:
+    return {
+        "beam_on": beam_on,
+        "stage": {"x": x, "z": z},
+        "working_distance": {"wd": wd, "z": z},
+        "sampled_at": 123.0,
+    }
+
+
+class TelemetryTrackerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tracker = TelemetryTracker()
+        self.assertEqual(self.tracker.observe(_metrics())[0], True)
+
+    def test_working_distance_moves_beyond_a_micrometre(self) -> None:
+        self.assertEqual(self.tracker.observe(_metrics(wd=0.0125005)), (False, []))
+        self.assertEqual(self.tracker.observe(_metrics(wd=0.012502)), (True, ["working_distance.wd"]))
+
+    def test_stage_z_jitter_below_a_micrometre_is_ignored(self) -> None:
+        # 0.5 um in mm: far above the WD deadband in m, but below the stage deadband.
+        self.assertEqual(self.tracker.observe(_metrics(z=10.0005)), (False, []))
+        published, changed = self.tracker.observe(_metrics(z=10.002))
+        self.assertTrue(published)
+        self.assertEqual(sorted(changed), ["stage.z", "working_distance.z"])
+
+    def test_non_numeric_fields_publish_on_any_change(self) -> None:
+        self.assertEqual(self.tracker.observe(_metrics(beam_on=False)), (True, ["beam_on"]))
+
+    def test_bookkeeping_fields_are_ignored(self) -> None:
+        self.assertEqual(self.tracker.observe({**_metrics(), "sampled_at": 456.0}), (False, []))
+
+
+class ParseDeadbandsTest(unittest.TestCase):
+    def test_empty_gives_the_defaults(self) -> None:
+        self.assertEqual(parse_deadbands(""), DEFAULT_DEADBANDS)
+
+    def test_leaf_override(self) -> None:
+        deadbands = parse_deadbands("working_distance.z=0.01, beam_kv=0.1")
+        self.assertEqual(deadbands["working_distance.z"], 0.01)
+        self.assertEqual(deadbands["working_distance.wd"], 1e-6)
+        self.assertEqual(deadbands["beam_kv"], 0.1)
+
+    def test_top_level_override_replaces_the_leaf_defaults(self) -> None:
+        tracker = TelemetryTracker(parse_deadbands("working_distance=0.5"))
+        self.assertEqual(tracker._deadband("working_distance.wd"), 0.5)
+        self.assertEqual(tracker._deadband("working_distance.z"), 0.5)
+        self.assertEqual(tracker._deadband("stage.z"), 0.001)
+
+
+if __name__ == "__main__":
+    unittest.main()